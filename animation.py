@@ -0,0 +1,69 @@
+"""
+Timed Animations
+This module describes animations, such as the flashing of cleared rows, as a sequence of named phases with a
+duration each. The main loop advances an Animation by the time that passed every tick and draws the current phase
+whenever it changes, so nothing blocks while an animation plays. A headless game has no animations at all and
+clears rows immediately (see GameState.auto_clear).
+Global Variables:
+    - ROW_CLEARED: The phases of the row clearing animation.
+    - GAME_OVER: The phases of the game over animation, which is played in a loop.
+Classes:
+    - Animation: The progress through the phases of one animation.
+"""
+
+ROW_CLEARED = (('rows', 350), ('board', 350), ('rows', 350), ('board', 350))
+GAME_OVER = (('game_over', 350), ('board', 350))
+
+class Animation:
+    """
+    Plays a sequence of (name, duration in milliseconds) phases.
+
+    The changed flag is set whenever a new phase starts, and a frontend may reset it after drawing.
+
+    Args:
+        phases (tuple): The (name, duration) pairs to play in order.
+        loop (bool): Whether to start over after the last phase instead of finishing.
+    """
+    def __init__(self, phases, loop=False):
+        self.phases = phases
+        self.loop = loop
+        self.index = 0
+        self.elapsed = 0
+        self.done = False
+        self.changed = True
+
+    @property
+    def phase(self):
+        # The name of the current phase, or None once the animation is done
+        if self.done:
+            return None
+        return self.phases[self.index][0]
+
+    def update(self, ms):
+        """
+        Advances the animation.
+
+        Args:
+            ms (float): The time that passed in milliseconds.
+
+        Returns:
+            bool: True once the animation is done.
+        """
+        if self.done:
+            return True
+        self.elapsed += ms
+        while self.elapsed >= self.phases[self.index][1]:
+            self.elapsed -= self.phases[self.index][1]
+            self.index += 1
+            self.changed = True
+            if self.index == len(self.phases):
+                if not self.loop:
+                    self.done = True
+                    return True
+                self.index = 0
+        return False
+
+    def skip(self):
+        # Finish the animation immediately
+        self.done = True
+        self.changed = True
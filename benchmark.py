@@ -0,0 +1,681 @@
+"""
+Benchmark Suite
+Times the hot paths of the game: the collision checks, the hard drop distance, rotation, line clearing, the block
+generator, game snapshots, drawing the board offscreen with SDL's dummy video driver, whole headless games on a
+set of fixed board fixtures, the heuristic bot choosing placements with and without lookahead, batches of games
+stepped in lockstep by the vector environment, the cold start of the game in a new process, writing and ranking
+games in the score database, the spectator wall, and writing and sampling the position dataset.
+The spectator wall is also drawn cell by cell with pygame.draw.rect as a reference.
+The original list-of-lists collision checks are kept here as a reference, and their answers are checked
+against the bitmask checks of Tetrominoe before anything is timed.
+
+Every benchmark reports the best of several runs, so results are repeatable on an idle machine. The results
+can be written as JSON and compared against a saved baseline, in which case every benchmark that got slower
+than the threshold is flagged as a regression and the exit status is 1. The exit status is also 1 when the cold
+start is slower than COLD_START_TARGET, or a bot choice without lookahead slower than BOT_CHOOSE_TARGET.
+Usage:
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+Modules:
+    - argparse: Parses the command line.
+    - copy: Keeps the positions the bot is timed on.
+    - json: Reads and writes the results.
+    - time: Provides the performance counter.
+    - bitboard, bot, game, simulate, tetrominoe, zobrist: The custom modules being benchmarked.
+    - draw: Imported by the rendering benchmarks only, so the rest runs without Pygame.
+    - numpy, vecenv: Imported by the vector environment benchmark only, so the rest runs without NumPy.
+    - scores, tempfile: Imported by the score database benchmarks only.
+    - dataset: Imported by the position dataset benchmarks only, which need NumPy.
+Global Variables:
+    - FIXTURES: Row masks of the boards the headless games start from, by name.
+    - BENCHMARKS: The benchmark functions, by name.
+    - COLD_START_TARGET: The longest acceptable time from starting the game to its first frame, in milliseconds.
+    - BOT_CHOOSE_TARGET: The longest acceptable time for the bot to choose a placement without lookahead, in
+      milliseconds.
+Functions:
+    - run_suite(names, scale): Runs benchmarks and returns their results.
+    - compare(results, baseline, threshold): Lists the regressions against a baseline.
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import bitboard
+import bot
+import game
+import simulate
+import tetrominoe
+import zobrist
+
+def list_is_obstructed_down(matrix, position, board):
+    for y, row in enumerate(matrix):
+        for x, cell in enumerate(row):
+            if cell > 0:
+                if position[1] + y + 1 >= 20:
+                    return True
+                elif board[position[1] + y + 1][position[0] + x] > 0:
+                    return True
+    return False
+
+def list_is_obstructed_right(matrix, position, board):
+    for y, row in enumerate(matrix):
+        for x, cell in enumerate(row):
+            if cell > 0:
+                if position[0] + x + 1 >= 10:
+                    return True
+                elif board[position[1] + y][position[0] + x + 1] > 0:
+                    return True
+    return False
+
+def list_is_obstructed_left(matrix, position, board):
+    for y, row in enumerate(matrix):
+        for x, cell in enumerate(row):
+            if cell > 0:
+                if position[0] + x - 1 < 0:
+                    return True
+                if board[position[1] + y][position[0] + x - 1] > 0:
+                    return True
+    return False
+
+def list_is_in_bounds(matrix, position):
+    for y, row in enumerate(matrix):
+        for x, cell in enumerate(row):
+            if cell > 0:
+                if position[0] + x < 0 or position[0] + x >= 10:
+                    return False
+                if position[1] + y >= 20 or position[1] + y < 0:
+                    return False
+    return True
+
+def random_board(rng):
+    # Fill the lower part of a board with random garbage, leaving a hole in every row
+    board = bitboard.Board()
+    for y in range(rng.randint(4, 16), bitboard.HEIGHT):
+        hole = rng.randrange(bitboard.WIDTH)
+        colors = list(board.colors[y])
+        for x in range(bitboard.WIDTH):
+            if x != hole and rng.random() < 0.7:
+                colors[x] = rng.randint(1, 7)
+                board.rows[y] |= 1 << x
+        board.colors[y] = tuple(colors)
+    # The rows were filled directly, so rebuild the skyline from the bottom of the board
+    board.heights[:] = [bitboard.HEIGHT] * bitboard.WIDTH
+    board.update_heights()
+    return board
+
+def make_cases(count, seed=0):
+    # Collect (block, board) pairs where the block is in bounds and not overlapping the board
+    rng = random.Random(seed)
+    cases = []
+    while len(cases) < count:
+        board = random_board(rng)
+        block = tetrominoe.Tetrominoe(rng.randint(1, 7), [4, 0], 1)
+        for _ in range(rng.randrange(4)):
+            block.rotate90()
+        block.position = [rng.randint(-2, 9), rng.randint(0, 19)]
+        if block.is_in_bounds() and not block.collides(board, *block.position):
+            cases.append((block, board, board.to_lists()))
+    return cases
+
+def make_board(rows, color=1, width=bitboard.WIDTH):
+    # Build a Board from row masks, with every filled cell in the given color
+    board = bitboard.Board(width, len(rows))
+    board.rows = list(rows)
+    board.colors = [tuple(color if row >> x & 1 else 0 for x in range(width)) if row else board.empty for row in rows]
+    board.heights = [len(rows)] * width
+    board.update_heights()
+    board.hash = zobrist.board_hash(board.rows)
+    return board
+
+def garbage(height, seed, density=1.0, width=bitboard.WIDTH, board_height=bitboard.HEIGHT):
+    # Row masks with the bottom rows filled, leaving a random hole in each of them
+    rng = random.Random(seed)
+    rows = [0] * board_height
+    for y in range(board_height - height, board_height):
+        for x in range(width):
+            if rng.random() < density:
+                rows[y] |= 1 << x
+        rows[y] &= ~(1 << rng.randrange(width))
+    return tuple(rows)
+
+FIXTURES = {
+    'empty': (0,) * bitboard.HEIGHT,
+    'low': garbage(4, 1),
+    'high': garbage(12, 2),
+    'holes': garbage(8, 3, 0.6),
+}
+
+def measure(run, setup=None, operations=1, repeat=7):
+    # Return the best time of run(setup()) over several repeats, in nanoseconds per operation
+    best = None
+    for _ in range(repeat):
+        argument = setup() if setup is not None else None
+        start = time.perf_counter_ns()
+        run(argument)
+        elapsed = time.perf_counter_ns() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / operations
+
+def bench_collision(scale):
+    # Time is_obstructed_down/left/right and is_in_bounds on random boards
+    cases = make_cases(1000 * scale)
+    for block, board, lists in cases:
+        assert block.is_obstructed_down(board) == list_is_obstructed_down(block.matrix, block.position, lists)
+        assert block.is_obstructed_left(board) == list_is_obstructed_left(block.matrix, block.position, lists)
+        assert block.is_obstructed_right(board) == list_is_obstructed_right(block.matrix, block.position, lists)
+        assert block.is_in_bounds() == list_is_in_bounds(block.matrix, block.position)
+
+    def run(_):
+        for block, board, lists in cases:
+            block.is_obstructed_down(board)
+            block.is_obstructed_left(board)
+            block.is_obstructed_right(board)
+            block.is_in_bounds()
+
+    return measure(run, operations=len(cases) * 4), 'ns/check'
+
+def bench_collision_lists(scale):
+    # Time the original list-of-lists checks on the same boards, as a reference for the bitmask checks
+    cases = make_cases(1000 * scale)
+
+    def run(_):
+        for block, board, lists in cases:
+            list_is_obstructed_down(block.matrix, block.position, lists)
+            list_is_obstructed_left(block.matrix, block.position, lists)
+            list_is_obstructed_right(block.matrix, block.position, lists)
+            list_is_in_bounds(block.matrix, block.position)
+
+    return measure(run, operations=len(cases) * 4), 'ns/check'
+
+def step_distance(block, board):
+    # Count the rows a block can fall by stepping it down one row at a time, as a reference for drop_distance
+    x, y = block.position
+    distance = 0
+    while y + distance + block.state.bottom + 1 < board.height and not block.collides(board, x, y + distance + 1):
+        distance += 1
+    return distance
+
+def bench_hard_drop(scale):
+    # Time the drop distance from the skyline and the bottom profile of the block
+    cases = make_cases(1000 * scale)
+    for block, board, lists in cases:
+        assert block.drop_distance(board) == step_distance(block, board)
+
+    def run(_):
+        for block, board, lists in cases:
+            block.drop_distance(board)
+
+    return measure(run, operations=len(cases)), 'ns/drop'
+
+def bench_hard_drop_steps(scale):
+    # Time the drop distance found by stepping down row by row on the same boards
+    cases = make_cases(1000 * scale)
+
+    def run(_):
+        for block, board, lists in cases:
+            step_distance(block, board)
+
+    return measure(run, operations=len(cases)), 'ns/drop'
+
+def bench_rotation(scale):
+    # Time rotate90 followed by check_rotation, restoring the block afterwards like Tetrominoe.rotate does
+    cases = make_cases(1000 * scale)
+
+    def run(_):
+        for block, board, lists in cases:
+            position = block.position
+            rotation = block.rotation
+            state = block.state
+            block.rotate90()
+            block.check_rotation(board)
+            block.position = position
+            block.rotation = rotation
+            block.state = state
+
+    return measure(run, operations=len(cases)), 'ns/rotation'
+
+def bench_line_clear(scale, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    # Time check_filled_rows and remove_rows on the rows covered by a landed block, with 1 to 4 filled rows
+    rng = random.Random(4)
+    cases = []
+    for i in range(250 * scale):
+        rows = list(garbage(rng.randint(6, 16), i, width=width, board_height=height))
+        bottom = rng.randint(height - 4, height - 1)
+        for y in rng.sample(range(bottom - 3, bottom + 1), i % 4 + 1):
+            rows[y] = (1 << width) - 1
+        cases.append((rows, range(bottom - 3, bottom + 1)))
+    state = game.GameState(0, width=width, height=height)
+
+    def setup():
+        return [(make_board(rows, width=width), covered) for rows, covered in cases]
+
+    def run(boards):
+        for board, covered in boards:
+            state.board = board
+            state.remove_rows(state.check_filled_rows(covered))
+
+    return measure(run, setup, operations=len(cases)), 'ns/clear'
+
+def bench_line_clear_tall(scale):
+    # The same on a board 64 columns wide and 2000 rows tall, which should cost about as much per clear
+    return bench_line_clear(scale, 64, 2000)
+
+def bench_random_block(scale):
+    # Time drawing the next block from the generator of a game
+    state = game.GameState(0)
+    count = 10000 * scale
+
+    def run(_):
+        for _ in range(count):
+            state.get_random_block()
+
+    return measure(run, operations=count), 'ns/block'
+
+def bench_snapshot(scale):
+    # Time taking a snapshot of a game in progress and restoring it
+    state = game.GameState(0)
+    state.board = make_board(FIXTURES['holes'])
+    player = simulate.ScriptedPolicy()
+    for _ in range(10):
+        player.play(state, None)
+    count = 2000 * scale
+
+    def run(_):
+        for _ in range(count):
+            state.restore(state.snapshot())
+
+    return measure(run, operations=count), 'ns/snapshot'
+
+def init_display():
+    # Open an offscreen display with SDL's dummy video driver and return its surface
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+    import pygame
+    pygame.init()
+    return pygame.display.set_mode((400, 360))
+
+def bench_draw_board(scale):
+    # Time a full draw of a board with draw.draw_board and the falling piece on top of it
+    screen = init_display()
+    import draw
+    state = game.GameState(0)
+    state.board = make_board(FIXTURES['holes'])
+    count = 20 * scale
+
+    def run(_):
+        for _ in range(count):
+            draw.draw_board(state.board, state.block_queue, screen, state.score)
+            draw.draw_tetrominoe(state.block, screen)
+
+    return measure(run, operations=count) / 1e6, 'ms/frame'
+
+def bench_render_frame(scale):
+    # Time the incremental Renderer.draw for frames where the falling piece moved by one row
+    screen = init_display()
+    import draw
+    renderer = draw.Renderer(screen)
+    state = game.GameState(0)
+    state.board = make_board(FIXTURES['holes'])
+    count = 200 * scale
+
+    def run(_):
+        for i in range(count):
+            state.block.position = [4, i % 8]
+            renderer.draw(state.board, state.block_queue, state.score, state.block)
+
+    return measure(run, operations=count) / 1e3, 'us/frame'
+
+def wall_frames(count, length):
+    # Play count games with the scripted policy, one move per game and frame, and return what every frame shows
+    states = [game.GameState(seed) for seed in range(count)]
+    player = simulate.ScriptedPolicy()
+    frames = []
+    for _ in range(length):
+        frame = []
+        for index, state in enumerate(states):
+            if state.lost:
+                state = states[index] = game.GameState(count + index)
+            player.play(state, None)
+            block = state.block
+            if block is not None:
+                block = tetrominoe.Tetrominoe(block.shape, list(block.position), block.rotation)
+            frame.append((tuple(state.board.colors), block, state.score))
+        frames.append(frame)
+    return frames
+
+def bench_spectator(scale):
+    # Time SpectatorRenderer.draw for 64 boards that all change in every frame
+    init_display()
+    import pygame
+    import draw
+    screen = pygame.display.set_mode((1280, 720))
+    renderer = draw.SpectatorRenderer(screen, 64)
+    frames = wall_frames(64, 30 * scale)
+    renderer.draw(frames[-1])
+
+    def run(_):
+        for frame in frames:
+            renderer.draw(frame)
+
+    return measure(run, operations=len(frames)) / 1e6, 'ms/frame'
+
+def bench_spectator_rects(scale):
+    # Time drawing the same 64 boards cell by cell with pygame.draw.rect, as draw_board does
+    init_display()
+    import pygame
+    import draw
+    screen = pygame.display.set_mode((1280, 720))
+    renderer = draw.SpectatorRenderer(screen, 64)
+    cell = renderer.cell
+    frames = wall_frames(64, 10 * scale)
+
+    def run(_):
+        for frame in frames:
+            for (ox, oy), (board, block, _) in zip(renderer.origins, frame):
+                cells = [list(row) for row in board]
+                for x, y, value in draw.block_cells(block, len(cells[0]), len(cells)):
+                    cells[y][x] = value
+                for y, row in enumerate(cells):
+                    for x, value in enumerate(row):
+                        color = draw.get_tetrominoe_color(value) if value else draw.get_empty_color(x + y)
+                        pygame.draw.rect(screen, color, (ox + x * cell, oy + y * cell, cell, cell), 0)
+
+    return measure(run, operations=len(frames)) / 1e6, 'ms/frame'
+
+def bench_games(scale):
+    # Play headless games with the scripted policy from every board fixture and return games per second
+    count = 25 * scale
+    max_pieces = 200
+
+    def run(_):
+        for name, rows in FIXTURES.items():
+            for seed in range(count):
+                state = game.GameState(seed)
+                state.board = make_board(rows)
+                player = simulate.ScriptedPolicy()
+                while not state.lost and state.pieces < max_pieces:
+                    player.play(state, None)
+
+    best = measure(run)
+    return len(FIXTURES) * count * 1e9 / best, 'games/s'
+
+# The longest acceptable bot choice without lookahead, in milliseconds
+BOT_CHOOSE_TARGET = 0.5
+
+def bot_positions(lookahead, count, max_pieces=200):
+    # Play games with the heuristic bot and keep a copy of every position it chose in, in order
+    positions = []
+    for seed in range(count):
+        state = game.GameState(seed)
+        player = bot.Bot(lookahead=lookahead)
+        while not state.lost and state.pieces < max_pieces:
+            positions.append(copy.deepcopy(state))
+            if not player.play(state):
+                break
+    return positions
+
+def bench_bot_choose(scale, lookahead=0):
+    # Time the bot choosing in the positions of its own games, in order, so the placements searched ahead
+    # are reused as in a game, and return milliseconds per choice
+    positions = bot_positions(lookahead, 2 * scale)
+
+    def run(_):
+        player = bot.Bot(lookahead=lookahead)
+        for state in positions:
+            player.choose(state)
+
+    return measure(run, operations=len(positions)) / 1e6, 'ms/choice'
+
+def bench_bot_lookahead(scale):
+    # Time bot choices looking ahead at the next block; not held to BOT_CHOOSE_TARGET
+    return bench_bot_choose(scale, lookahead=1)
+
+# The longest acceptable cold start, in milliseconds
+COLD_START_TARGET = 1000
+
+# Run in a fresh interpreter: import the game, open the window and draw the first frame
+COLD_START = '''
+import board
+import game
+renderer = board.open_window()
+state = game.GameState(0)
+renderer.draw(state.board, state.block_queue, state.score, state.block, state.landing_row())
+import pygame
+pygame.display.flip()
+'''
+
+def bench_cold_start(scale):
+    # Time starting the game in a new process until its first frame is on screen
+    directory = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, SDL_VIDEODRIVER='dummy', PYGAME_HIDE_SUPPORT_PROMPT='1')
+    # Importing the frontend must not import Pygame
+    subprocess.run([sys.executable, '-c', "import sys, board; assert 'pygame' not in sys.modules"],
+                   cwd=directory, check=True)
+
+    def run(_):
+        subprocess.run([sys.executable, '-c', COLD_START], cwd=directory, env=env, check=True)
+
+    return measure(run, repeat=3 + 2 * scale) / 1e6, 'ms/start'
+
+def bench_vector_env(scale):
+    # Step a batch of games in lockstep with random actions and return game steps per second
+    import numpy as np
+    import vecenv
+    envs = 1024
+    steps = 50 * scale
+    actions = np.random.default_rng(0).integers(0, game.HARD_DROP + 1, (steps, envs))
+
+    def run(_):
+        env = vecenv.VectorEnv(envs, 0)
+        for step in range(steps):
+            env.step(actions[step])
+
+    best = measure(run)
+    return envs * steps * 1e9 / best, 'steps/s'
+
+def fill_store(store, count, seed=0):
+    # Record count games with random scores across three policies and wait until they are written
+    rng = random.Random(seed)
+    for first in range(0, count, 1000):
+        games = [(first + i, rng.randrange(100000), rng.randrange(100), rng.randrange(1000), rng.randrange(60000),
+                  rng.random() * 100) for i in range(min(1000, count - first))]
+        store.record_many(games, ('random', 'scripted', 'heuristic')[first // 1000 % 3])
+    store.flush()
+
+def bench_score_store(scale):
+    # Record games in a new score database and return games written per second
+    import scores
+    import tempfile
+    count = 20000 * scale
+    with tempfile.TemporaryDirectory() as directory:
+        paths = iter(range(1000))
+
+        def setup():
+            return scores.ScoreStore(os.path.join(directory, f'{next(paths)}.db'))
+
+        def run(store):
+            fill_store(store, count)
+            store.close()
+
+        best = measure(run, setup, repeat=3)
+    return count * 1e9 / best, 'games/s'
+
+def bench_leaderboard(scale):
+    # Rank the top 10 games overall and of one policy, and read the policy statistics, in a database of games
+    import scores
+    import tempfile
+    count = 100
+    with tempfile.TemporaryDirectory() as directory:
+        with scores.ScoreStore(os.path.join(directory, 'scores.db')) as store:
+            fill_store(store, 50000 * scale)
+
+            def run(_):
+                for _ in range(count):
+                    store.leaderboard(10)
+                    store.leaderboard(10, 'heuristic')
+                    store.policy_stats()
+
+            best = measure(run, operations=count)
+    return best / 1e3, 'us/query'
+
+def bench_dataset_write(scale):
+    # Add the positions of scripted games to a position dataset and return positions written per second
+    import dataset
+    import tempfile
+    states = []
+    for seed in range(20):
+        state = game.GameState(seed)
+        player = simulate.ScriptedPolicy()
+        while not state.lost and state.pieces < 50:
+            player.play(state, None)
+        states.append(state)
+    count = 250 * scale
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'positions.tpos')
+
+        def run(_):
+            with dataset.DatasetWriter(path) as writer:
+                for _ in range(count):
+                    for state in states:
+                        writer.add(state)
+                    writer.end_game()
+
+        best = measure(run)
+    return count * len(states) * 1e9 / best, 'positions/s'
+
+def bench_dataset_sample(scale):
+    # Time drawing a random minibatch of 256 positions from a mapped dataset and unpacking their boards
+    import numpy as np
+    import dataset
+    import tempfile
+    count = 100 * scale
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'positions.tpos')
+        with dataset.DatasetWriter(path) as writer:
+            dataset.play(writer, 50, 'scripted')
+        with dataset.Dataset(path) as positions:
+            rng = np.random.default_rng(0)
+
+            def run(_):
+                for _ in range(count):
+                    positions.boards(positions.sample(256, rng)[1])
+
+            best = measure(run, operations=count)
+    return best / 1e3, 'us/batch'
+
+BENCHMARKS = {
+    'collision': bench_collision,
+    'collision_lists': bench_collision_lists,
+    'hard_drop': bench_hard_drop,
+    'hard_drop_steps': bench_hard_drop_steps,
+    'rotation': bench_rotation,
+    'line_clear': bench_line_clear,
+    'line_clear_tall': bench_line_clear_tall,
+    'random_block': bench_random_block,
+    'snapshot': bench_snapshot,
+    'draw_board': bench_draw_board,
+    'render_frame': bench_render_frame,
+    'spectator': bench_spectator,
+    'spectator_rects': bench_spectator_rects,
+    'games': bench_games,
+    'bot_choose': bench_bot_choose,
+    'bot_lookahead': bench_bot_lookahead,
+    'cold_start': bench_cold_start,
+    'vector_env': bench_vector_env,
+    'score_store': bench_score_store,
+    'leaderboard': bench_leaderboard,
+    'dataset_write': bench_dataset_write,
+    'dataset_sample': bench_dataset_sample,
+}
+
+def run_suite(names=None, scale=1):
+    """
+    Runs benchmarks.
+
+    Args:
+        names (list of str): The benchmarks to run, all of them by default.
+        scale (int): Multiplies the amount of work per benchmark, for steadier numbers.
+
+    Returns:
+        dict: The results by benchmark name, each with its value, unit and whether higher is better.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        value, unit = BENCHMARKS[name](scale)
+        results[name] = {'value': value, 'unit': unit, 'higher_is_better': unit.endswith('/s')}
+    return results
+
+def compare(results, baseline, threshold=0.15):
+    """
+    Compares results against a baseline.
+
+    Args:
+        results (dict): Results returned by run_suite().
+        baseline (dict): Results loaded from a previous run.
+        threshold (float): The relative slowdown above which a benchmark counts as a regression.
+
+    Returns:
+        list of tuple: The (name, change) of every regression, where change is the relative slowdown.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]['value']
+        new = result['value']
+        # Express the change as a slowdown, whichever direction is better for the unit
+        change = old / new - 1 if result['higher_is_better'] else new / old - 1
+        result['change'] = change
+        if change > threshold:
+            regressions.append((name, change))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the game.')
+    parser.add_argument('names', nargs='*', metavar='NAME', help=f"benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--scale', type=int, default=1, help='multiply the work per benchmark')
+    parser.add_argument('--output', metavar='FILE', help='write the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE', help='flag regressions against the results saved in FILE')
+    parser.add_argument('--threshold', type=float, default=0.15, help='slowdown counted as a regression (default 0.15)')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f'unknown benchmark: {name}')
+    results = run_suite(args.names, args.scale)
+    regressions = []
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file)['results'], args.threshold)
+    flagged = dict(regressions)
+    for name, result in results.items():
+        line = f"{name:<16}{result['value']:12.2f} {result['unit']:<12}"
+        if 'change' in result:
+            line += f"{-result['change']:+8.1%}"
+            if name in flagged:
+                line += '  REGRESSION'
+        print(line)
+    if 'collision' in results and 'collision_lists' in results:
+        print(f"bitmask collision speedup: {results['collision_lists']['value'] / results['collision']['value']:.2f}x")
+    if 'spectator' in results and 'spectator_rects' in results:
+        print(f"spectator blits speedup: {results['spectator_rects']['value'] / results['spectator']['value']:.2f}x")
+    over_target = False
+    if 'cold_start' in results and results['cold_start']['value'] > COLD_START_TARGET:
+        print(f'cold start is above the target of {COLD_START_TARGET:.0f} ms')
+        over_target = True
+    if 'bot_choose' in results and results['bot_choose']['value'] > BOT_CHOOSE_TARGET:
+        print(f'bot choice is above the target of {BOT_CHOOSE_TARGET} ms')
+        over_target = True
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'python': sys.version.split()[0], 'platform': platform.platform(), 'scale': args.scale,
+                       'results': results}, file, indent=2)
+    return 1 if regressions or over_target else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Bitboard Representation of the Tetris Board
+The board is stored as one integer bitmask per row, where bit x is set when column x is occupied, together with a
+color plane holding the tetrominoe shape of every cell. Collision tests are done on the masks with shifts and ANDs,
+while the color plane is what gets drawn. Indexing and iterating a Board yields the color rows, so code that reads
+the board as a list of lists, like draw.draw_board, keeps working.
+The number of filled cells of a row is the population count of its mask, and the board also keeps a skyline, the
+height of the highest filled cell of every column. Both are only updated when a tetrominoe is placed or rows are
+removed, so nothing ever rescans the whole board.
+The dimensions are set per board. Rows above the stack are never visited: removing rows deletes them from the
+lists and inserts empty rows at the top of the stack, so the cost of a clear depends on the height of the stack
+above the cleared rows rather than on the height of the board, and boards thousands of rows tall stay cheap.
+Every board also carries the Zobrist hash of its filled cells, updated incrementally by the same two operations.
+Rows are never modified in place: masks are integers and color rows are tuples, and a changed row is replaced by a
+new one. For snapshots, the board also keeps the rows grouped in chunks of CHUNK rows counted from the bottom, each
+an immutable pair of tuples that is only rebuilt after one of its rows changed. A snapshot holds the chunks of the
+stack, so snapshots taken a few pieces apart share every chunk those pieces did not touch, and only the changed
+chunks are new memory.
+Modules:
+    - bisect: Counts the removed rows below the top of each column.
+    - collections: Provides the namedtuple of snapshots.
+    - zobrist: Custom module for the Zobrist keys of the cells.
+Global Variables:
+    - WIDTH, HEIGHT: The default dimensions of a board in cells.
+    - FULL: The mask of a completely filled row of the default width (0x3FF).
+    - GARBAGE: The color of garbage cells, which come from no tetrominoe.
+    - CHUNK: The number of rows in a chunk shared between snapshots.
+Classes:
+    - Board: The row masks, color plane and skyline of a game board.
+    - Snapshot: The saved state of a board, to be restored with Board.restore.
+"""
+import bisect
+import collections
+import zobrist
+
+WIDTH = 10
+HEIGHT = 20
+FULL = (1 << WIDTH) - 1
+GARBAGE = 8
+CHUNK = 4
+
+# The chunks of the stack, bottom chunk first, each a tuple of row masks and a tuple of color rows
+Snapshot = collections.namedtuple('Snapshot', 'chunks heights hash')
+
+class Board:
+    """
+    The row masks, color plane, skyline and hash of a board.
+
+    Args:
+        width (int): The number of columns.
+        height (int): The number of rows.
+    """
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        # Start with an empty board
+        self.width = width
+        self.height = height
+        self.full = (1 << width) - 1
+        self.rows = [0] * height
+        # All empty rows share one color row
+        self.empty = (0,) * width
+        self.colors = [self.empty] * height
+        self.heights = [0] * width
+        self.hash = 0
+        # The chunks of rows by index from the bottom, None for a chunk changed since it was last built.
+        # Code writing to rows or colors directly must do so before taking the first snapshot, or call touch().
+        self.chunks = [None] * ((height + CHUNK - 1) // CHUNK)
+
+    def __getitem__(self, y):
+        return self.colors[y]
+
+    def __iter__(self):
+        return iter(self.colors)
+
+    def __len__(self):
+        return self.height
+
+    def place(self, block):
+        """
+        Writes a tetrominoe into both the row masks and the color plane.
+
+        Args:
+            block (Tetrominoe): The tetrominoe to write, at its current position.
+        """
+        px, py = block.position
+        shift = px + block.state.left
+        heights = self.heights
+        for dy, mask in block.state.masks:
+            # A block spawned onto the stack can overlap it, so only newly filled cells change the hash
+            self.hash ^= zobrist.row_hash(py + dy, mask << shift & ~self.rows[py + dy])
+            self.rows[py + dy] |= mask << shift
+            colors = list(self.colors[py + dy])
+            height = self.height - py - dy
+            for x, cell in enumerate(block.matrix[dy]):
+                if cell > 0:
+                    colors[px + x] = cell
+                    if heights[px + x] < height:
+                        heights[px + x] = height
+            self.colors[py + dy] = tuple(colors)
+            self.chunks[(self.height - 1 - py - dy) // CHUNK] = None
+
+    def filled_rows(self, rows=None):
+        """
+        Args:
+            rows (iterable of int): The indices of the rows to check, or None to check every row.
+
+        Returns:
+            list of int: The indices of the filled rows, bottom row first.
+        """
+        if rows is None:
+            rows = range(self.height - max(self.heights), self.height)
+        return sorted((y for y in rows if self.rows[y] == self.full), reverse=True)
+
+    def remove_rows(self, rows):
+        """
+        Removes the given rows and shifts the rows above them down. Only the part of the stack above the
+        lowest removed row is touched.
+
+        Args:
+            rows (list of int): The indices of the rows to remove.
+        """
+        if not rows:
+            return
+        removed = sorted(rows, reverse=True)
+        lowest = removed[0]
+        top = self.height - max(self.heights)
+        changed = self.rows[top:lowest + 1]
+        # Delete bottom up so the indices of the remaining removed rows stay valid, then refill the top of the stack
+        for y in removed:
+            del self.rows[y]
+            del self.colors[y]
+        self.rows[top:top] = [0] * len(removed)
+        self.colors[top:top] = [self.empty] * len(removed)
+        self.touch(top, lowest + 1)
+        # The hash is linear in the cells, so each row only needs the hash of the cells that flipped
+        for y in range(top, lowest + 1):
+            if changed[y - top] != self.rows[y]:
+                self.hash ^= zobrist.row_hash(y, changed[y - top] ^ self.rows[y])
+        # A column drops by the number of removed rows below its top cell, unless its top cell was removed
+        heights = self.heights
+        ascending = removed[::-1]
+        lost = 0
+        for x in range(self.width):
+            height = heights[x]
+            if height:
+                y = self.height - height
+                below = bisect.bisect_right(ascending, y)
+                if below and ascending[below - 1] == y:
+                    lost |= 1 << x
+                else:
+                    heights[x] = height - len(removed) + below
+        if lost:
+            self.update_heights(lost)
+
+    def add_garbage(self, count, hole):
+        """
+        Pushes the board up and fills the bottom rows with garbage, except for one column. Rows pushed
+        past the top of the board are lost.
+
+        Args:
+            count (int): The number of garbage rows.
+            hole (int): The column left empty in every garbage row.
+        """
+        row = self.full & ~(1 << hole)
+        del self.rows[:count]
+        self.rows.extend([row] * count)
+        del self.colors[:count]
+        self.colors.extend([tuple(0 if x == hole else GARBAGE for x in range(self.width))] * count)
+        self.touch()
+        heights = self.heights
+        clipped = 0
+        for x in range(self.width):
+            if heights[x] + count > self.height:
+                clipped |= 1 << x
+            elif heights[x]:
+                heights[x] += count
+            elif x != hole:
+                heights[x] = count
+        if clipped:
+            for x in range(self.width):
+                if clipped >> x & 1:
+                    heights[x] = self.height
+            self.update_heights(clipped)
+        # Every row of the stack moved, so it is rehashed
+        self.hash = zobrist.board_hash(self.rows, self.height - max(heights))
+
+    def update_heights(self, columns=None):
+        # Recompute the skyline of the given columns (a mask, every column by default) from the top of
+        # the stack downwards, stopping as soon as all of them have been seen
+        if columns is None:
+            columns = self.full
+        heights = self.heights
+        start = self.height - max(heights)
+        for x in range(self.width):
+            if columns >> x & 1:
+                heights[x] = 0
+        seen = 0
+        for y in range(start, self.height):
+            new = self.rows[y] & columns & ~seen
+            if new:
+                seen |= new
+                while new:
+                    low = new & -new
+                    heights[low.bit_length() - 1] = self.height - y
+                    new ^= low
+                if seen == columns:
+                    break
+
+    def touch(self, start=0, stop=None):
+        """
+        Marks rows as changed, so the next snapshot rebuilds their chunks.
+
+        Args:
+            start (int): The first changed row.
+            stop (int): The row after the last changed row, the bottom of the board by default.
+        """
+        stop = self.height if stop is None else stop
+        if start < stop:
+            first = (self.height - stop) // CHUNK
+            last = (self.height - 1 - start) // CHUNK
+            self.chunks[first:last + 1] = [None] * (last - first + 1)
+
+    def snapshot(self):
+        """
+        Saves the state of the board. The snapshot holds the chunks of the stack, and only the chunks changed
+        since the previous snapshot are built anew; the others are shared with it.
+
+        Returns:
+            Snapshot: The saved state.
+        """
+        chunks = self.chunks
+        height = self.height
+        count = (max(self.heights) + CHUNK - 1) // CHUNK
+        for k in range(count):
+            if chunks[k] is None:
+                start = max(0, height - (k + 1) * CHUNK)
+                stop = height - k * CHUNK
+                chunks[k] = (tuple(self.rows[start:stop]), tuple(self.colors[start:stop]))
+        return Snapshot(tuple(chunks[:count]), tuple(self.heights), self.hash)
+
+    def restore(self, snapshot):
+        """
+        Returns the board to a saved state. Rows above both the current and the saved stack are left alone.
+
+        Args:
+            snapshot (Snapshot): A state saved by snapshot() on a board of the same size.
+        """
+        height = self.height
+        # Empty the rows of the current stack above the saved chunks
+        bottom = max(0, height - len(snapshot.chunks) * CHUNK)
+        top = height - max(self.heights)
+        if top < bottom:
+            self.rows[top:bottom] = [0] * (bottom - top)
+            self.colors[top:bottom] = [self.empty] * (bottom - top)
+            self.touch(top, bottom)
+        for k, chunk in enumerate(snapshot.chunks):
+            start = max(0, height - (k + 1) * CHUNK)
+            stop = height - k * CHUNK
+            self.rows[start:stop], self.colors[start:stop] = chunk
+            self.chunks[k] = chunk
+        self.heights[:] = snapshot.heights
+        self.hash = snapshot.hash
+
+    def to_lists(self):
+        """
+        Returns:
+            list of list of int: A copy of the color plane as a plain list of lists.
+        """
+        return [list(row) for row in self.colors]
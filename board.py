@@ -1,234 +1,197 @@
 """
 Tetris Game Implementation
-This module implements the core functionality of a Tetris game using Pygame. It includes the game board, tetrominoes, 
-and game logic such as block generation, row clearing, and game over conditions.
+This module is the interactive Pygame frontend of the Tetris game. The game state and rules live in the headless
+game module, and the game runs on its own thread at a fixed tick rate (see simthread). This module stamps keyboard
+events with their arrival time and hands them to the simulation as actions, and draws the latest frame the
+simulation published, so a slow frame never delays input handling, gravity or animations.
+Importing the module has no side effects: Pygame and the drawing module are only imported once main() opens the
+window, so tools and worker processes can import it without paying for Pygame.
+Usage:
+    python board.py --record games.trpl
+    python board.py --db scores.db
 Modules:
-    - pygame: Used for game development.
+    - argparse: Parses the command line.
     - sys: Provides access to some variables used or maintained by the interpreter.
-    - draw: Custom module for drawing game elements.
-    - tetrominoe: Custom module for tetrominoe shapes and operations.
-    - copy: Provides shallow and deep copy operations.
-    - random: Implements pseudo-random number generators for various distributions.
+    - time: Sleeps until the next frame is due.
+    - bitboard: Custom module for the bitmask board representation.
+    - game: Custom module holding the headless game state and rules.
+    - profiler: Custom module timing the phases of the main loop.
+    - replay: Custom module recording the game for replays.
+    - scheduler: Custom module capping the frame rate.
+    - simthread: Custom module running the game on its own thread.
+    - pygame, draw: Imported by open_window() only.
+    - scores: Custom module storing the result of the game, imported with --db only.
 Global Variables:
-    - board: A 2D list representing the game board.
-    - O, L, J, S, Z, T, I: Lists representing different tetromino shapes.
-    - blocks: A list of Tetrominoe objects representing all possible tetrominoes.
-    - block_queue: A list to hold the next blocks to be played.
-    - screen: The Pygame display surface.
-    - score: The player's score.
-    - down: Counter for the number of times the down key is pressed.
-    - TIMEEVENT: Custom Pygame event for handling timed events.
+    - KEY_ACTIONS: Mapping of Pygame key names to game actions.
+    - TICK_RATE, FRAME_RATE: Simulation ticks per second and the cap on rendered frames per second.
+    - GRAVITY_TICKS: Number of ticks between two gravity steps.
+    - OVERLAY_INTERVAL: Milliseconds between two refreshes of the performance overlay.
+    - UNDO_LIMIT: Number of blocks that can be rewound with Backspace.
 Functions:
-    - get_random_block(): Returns a random tetromino, ensuring it is not the same as the last one.
-    - fill_block_queue(): Fills the block queue with random tetrominoes until it has at least 3 blocks.
-    - new_block(): Adds a new block to the queue and returns the next block to be played.
-    - check_filled_rows(): Checks for filled rows in the board and updates the score based on the number of rows cleared.
-    - remove_rows(rows): Removes the specified rows from the board and shifts the rows above down.
-    - is_lost(): Checks if the game is lost by looking for blocks in the top row.
-    - game_over(): Displays the game over screen and waits for a short period.
-    - row_cleared(): Animates the row clearing process and removes the filled rows from the board.
+    - open_window(): Initializes Pygame, opens the window and loads the assets.
+    - draw_frame(renderer, frame): Draws a frame published by the simulation, or the phase of its animation.
+    - main(argv): Plays the game.
 Main Loop:
-    - Initializes Pygame and sets up the game window.
-    - Runs the main game loop, handling events, updating game state, and drawing the game elements.
-    - Quits Pygame and exits the program when the game loop ends.
+    - Opens the window and starts the simulation thread.
+    - Handles the events as they arrive, stamping every action with its arrival time before queueing it.
+    - Draws the latest published frame whenever it is newer than the one on screen, at most FRAME_RATE times
+      per second, and otherwise waits for the next frame.
+    - Times the events, draw and display update phases of every pass and the time from the arrival of an input
+      to the frame showing it on screen; the simulation times the input, gravity and animation phases of its ticks.
+    - Queues the result of the game for the score database, if one was given, when the game is over.
+    - Stops the simulation, saves a replay and the profiler timings if requested, then quits Pygame when the game
+      loop ends.
 """
-import pygame
+import argparse
 import sys
-import draw
-import tetrominoe
-import copy
-import random
-    
-board = [
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-    [0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-]
-
-O = [[1, 1], 
-     [1, 1]]
-    
-L = [[0, 0, 2], 
-     [2, 2, 2], 
-     [0, 0, 0]]
-    
-J = [[3, 0, 0], 
-     [3, 3, 3], 
-     [0, 0, 0]]
-    
-S = [[0, 4, 4], 
-     [4, 4, 0], 
-     [0, 0, 0]]
-    
-Z = [[5, 5, 0], 
-     [0, 5, 5], 
-     [0, 0, 0]]
-    
-T = [[0, 6, 0], 
-     [6, 6, 6], 
-     [0, 0, 0]]
-    
-I = [[0, 0, 0, 0], 
-     [7, 7, 7, 7], 
-     [0, 0, 0, 0],
-     [0, 0, 0, 0]]
-
-blocks = [tetrominoe.Tetrominoe(1, [4, 0], 1, O), 
-          tetrominoe.Tetrominoe(2, [4, 0], 1, L), 
-          tetrominoe.Tetrominoe(3, [4, 0], 1, J), 
-          tetrominoe.Tetrominoe(4, [4, 0], 1, S), 
-          tetrominoe.Tetrominoe(5, [4, 0], 1, Z), 
-          tetrominoe.Tetrominoe(6, [4, 0], 1, T), 
-          tetrominoe.Tetrominoe(7, [4, 0], 1, I)]
-
-block_queue = []
-
-def get_random_block():
-    block = random.choice(blocks)
-    if len(block_queue) != 0:
-        while block.shape == block_queue[len(block_queue)-1].shape:
-            block = random.choice(blocks)
-    return copy.deepcopy(block)
-
-def fill_block_queue():
-    global block_queue
-    while len(block_queue) < 3:
-        block_queue.append(get_random_block())
-
-def new_block():
-    global block_queue
-    block_queue.append(get_random_block())
-    return block_queue.pop(0)
-    
-def check_filled_rows():
-    filled_rows = []
-    for i, row in enumerate(board):
-        if all(cell > 0 for cell in row):
-            filled_rows.insert(0, i)
-    global score
-    match len(filled_rows):
-        case 1:
-            score += 40
-        case 2:
-            score += 100
-        case 3:
-            score += 300
-        case 4:
-            score += 1200
-    return filled_rows
-
-def remove_rows(rows):
-    global board
-    for row_index in reversed(rows):
-        if row_index == 0:
-            board[0] = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+import time
+import bitboard
+import game
+import profiler
+import replay
+import scheduler
+import simthread
+
+TICK_RATE = 60
+FRAME_RATE = 60
+GRAVITY_TICKS = 60
+OVERLAY_INTERVAL = 250
+UNDO_LIMIT = 100
+
+KEY_ACTIONS = {
+    'left': game.LEFT,
+    'right': game.RIGHT,
+    'down': game.DOWN,
+    'r': game.ROTATE,
+    'space': game.HARD_DROP,
+    'backspace': simthread.UNDO,
+}
+
+def open_window():
+    """
+    Initializes the parts of Pygame the game uses, opens the window and creates the renderer, which loads
+    the fonts and renders the fixed parts of the screen once.
+
+    Returns:
+        draw.Renderer: The renderer of the window.
+    """
+    import pygame
+    import draw
+    # Only the display and fonts are used, so the audio and joystick subsystems are never started
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((400, 360))
+    pygame.display.set_caption('Tetris')
+    return draw.Renderer(screen)
+
+def draw_frame(renderer, frame):
+    # Draw a frame, or the current phase of its animation, and return the areas that changed
+    if frame.phase == 'rows':
+        return renderer.draw_filled_rows(frame.filled_rows)
+    if frame.phase == 'game_over':
+        return renderer.draw_game_over()
+    return renderer.draw(frame.board, frame.queue, frame.score, frame.block, frame.ghost)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play Tetris.')
+    parser.add_argument('--record', metavar='FILE', help='append a replay of the game to FILE on exit')
+    parser.add_argument('--width', type=int, default=bitboard.WIDTH, help='columns of the board')
+    parser.add_argument('--height', type=int, default=bitboard.HEIGHT, help='rows of the board; larger boards scroll')
+    parser.add_argument('--profile', metavar='FILE', help='write the frame timings to FILE (CSV, or JSON if it ends in .json) on exit')
+    parser.add_argument('--db', metavar='FILE', help='record the result of the game in the score database FILE')
+    args = parser.parse_args(argv)
+    store = None
+    if args.db:
+        import scores
+        store = scores.ScoreStore(args.db)
+
+    renderer = open_window()
+    import pygame
+    keys = {pygame.key.key_code(name): action for name, action in KEY_ACTIONS.items()}
+
+    # Main loop
+    running = True
+    state = game.GameState(auto_clear=False, width=args.width, height=args.height)
+    recorder = replay.Recorder(state)
+    simulation = simthread.Simulation(recorder, TICK_RATE, GRAVITY_TICKS, UNDO_LIMIT)
+    clock = scheduler.Scheduler(FRAME_RATE, FRAME_RATE)
+    prof = profiler.Profiler()
+    overlay = False
+    overlay_drawn = 0
+    version = None
+    shown_input = None
+    started_at = time.perf_counter()
+    recorded = False
+    pygame.key.set_repeat(350, 15)
+    simulation.start()
+
+    while running:
+        prof.begin_frame()
+        started = prof.start()
+        for event in pygame.event.get():
+            arrived = prof.clock()
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key in keys:
+                    simulation.send(keys[event.key], arrived)
+                elif event.key == pygame.K_F3:
+                    overlay = not overlay
+                    if not overlay:
+                        pygame.display.update(renderer.hide_overlay())
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_DOWN:
+                    simulation.send(game.RELEASE_DOWN, arrived)
+        prof.stop('events', started)
+        frame, latest = simulation.buffer.latest()
+        if store is not None:
+            if frame.phase != 'game_over':
+                # Undo can bring a lost game back, and it is recorded again if it is lost again
+                recorded = False
+            elif not recorded:
+                # Only queued here; the writer thread of the store does the disk work. The counters come from the
+                # frame, as the game itself belongs to the simulation thread; the seed never changes.
+                store.record(frame.score, frame.lines, frame.pieces, frame.ticks, time.perf_counter() - started_at,
+                             state.seed, 'human')
+                recorded = True
+        # Refresh the overlay by redrawing the frame, so it is drawn over an up to date board
+        refresh = overlay and pygame.time.get_ticks() - overlay_drawn >= OVERLAY_INTERVAL
+        dirty = None
+        if (latest != version or refresh) and clock.frame_due():
+            started = prof.start()
+            dirty = draw_frame(renderer, frame)
+            prof.stop('draw', started)
+            version = latest
+        if dirty is not None:
+            if overlay:
+                dirty += renderer.draw_overlay(prof.overlay_lines() + simulation.prof.overlay_lines())
+                overlay_drawn = pygame.time.get_ticks()
+            started = prof.start()
+            pygame.display.update(dirty)
+            prof.stop('update', started)
+            if frame.input_time != shown_input:
+                # The time from the arrival of the latest input to the frame showing it on screen
+                prof.stop('latency', frame.input_time)
+                shown_input = frame.input_time
+        prof.end_frame()
+        if latest != version:
+            # A newer frame is waiting for the frame rate cap
+            time.sleep(max(0.0, clock.next_frame - clock.clock()))
         else:
-            for i in reversed(range(len(board))):
-                if i <= row_index:
-                    board[i] = board[i-1]
-            board[0] = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-
-def is_lost():
-    if any(cell > 0 for cell in board[0]):
-        return True
-    return False
-
-def game_over():
-    draw.draw_game_over(screen)
-    pygame.display.flip()
-    pygame.time.wait(350)
-    draw.draw_board(board, block_queue, screen, score)
-    pygame.display.flip()
-    pygame.time.wait(350)
-
-def row_cleared():
-    draw.draw_filled_rows(screen, filled_rows)
-    pygame.display.flip()
-    pygame.time.wait(350)
-    draw.draw_board(board, block_queue, screen, score)
-    pygame.display.flip()
-    pygame.time.wait(350)
-    draw.draw_filled_rows(screen, filled_rows)
-    pygame.display.flip()
-    pygame.time.wait(350)
-    draw.draw_board(board, block_queue, screen, score)
-    pygame.display.flip()
-    pygame.time.wait(350)
-    remove_rows(filled_rows)
-    block.position = [4,1]
-
-# Initialize pygame
-pygame.init()
-screen = pygame.display.set_mode((400, 360))
-pygame.display.set_caption('Tetris')
-
-# Main loop
-running = True
-score = 0
-down = 0
-fill_block_queue()
-block = new_block()
-TIMEEVENT = pygame.USEREVENT + 1
-pygame.time.set_timer(TIMEEVENT, 1000)
-pygame.key.set_repeat(350, 15)
-
-
-while running:
-    events = pygame.event.get()
-    for event in events:
-        if event.type == pygame.QUIT:
-            running = False
-        if event.type == TIMEEVENT: 
-            if not block.is_obstructed_down(board):
-                block.position[1] += 1
-            else:
-                block.land(board)
-                score += down
-                down = 0
-                if not is_lost():
-                    del block
-                    block = new_block()
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_r:
-                prior = copy.deepcopy(block)
-                block.rotate90() 
-                if not block.check_rotation(board):
-                    block = prior
-            else:
-                block.move(event.key, board)
-            if event.key == pygame.K_DOWN:
-                down += 1
-        if event.type == pygame.KEYUP:
-            if event.key == pygame.K_DOWN and block.position[1] < 17:
-                down = 0
-    if is_lost():
-        game_over()
-    if filled_rows := check_filled_rows():
-        row_cleared()
-    draw.draw_board(board, block_queue, screen, score)
-    draw.draw_tetrominoe(block, screen)
-    pygame.display.flip()
-
-# Quit pygame
-pygame.quit()
-sys.exit()
-
-
-
+            simulation.buffer.wait(version, 1 / FRAME_RATE)
+
+    simulation.stop()
+    if store is not None:
+        store.close()
+    if args.record:
+        recorder.save(args.record)
+    if args.profile:
+        # Export the phases of the simulation ticks along with those of the render loop
+        prof.phases.update(simulation.prof.phases)
+        prof.export(args.profile)
+
+    # Quit pygame
+    pygame.quit()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""
+Heuristic Tetris Bot
+This module enumerates every final placement of a tetrominoe that is reachable with the game's moves and rotations,
+including tucks under overhangs, and picks the placement with the best weighted score of the resulting board.
+Everything works directly on the row masks of a bitboard.Board, using the orientation and kick tables of the
+tetrominoe module.
+The search packs the stack into one integer and looks up the cells of every orientation already shifted to every
+column, so a collision test is a single shift and AND; the results of rotations and the hashes of placed blocks
+are cached as well. The skyline and holes of the board are measured once per search, and a placement that clears
+no line is scored from them by updating only the columns it covers, so only the placements that clear lines have
+their board scanned.
+Modules:
+    - collections: Provides the namedtuple of placements.
+    - functools: Caches the move tables.
+    - bitboard: Custom module for the bitmask board representation.
+    - game: Custom module holding the headless game state and rules.
+    - tetrominoe: Custom module for tetrominoe shapes and operations.
+    - zobrist: Custom module for the Zobrist hashes keying the caches.
+Global Variables:
+    - WEIGHTS: Default weights of the aggregate height, cleared lines, holes and bumpiness.
+Functions:
+    - surface(rows, width): Measures the skyline and holes of a board.
+    - evaluate(rows, lines, weights): Scores a board.
+Classes:
+    - Placement: A reachable final position of a tetrominoe and the board it leaves behind.
+    - Bot: Searches for and plays the best placement.
+"""
+import collections
+import functools
+import bitboard
+import game
+import tetrominoe
+import zobrist
+
+WEIGHTS = (-0.510066, 0.760666, -0.35663, -0.184483)
+
+# value is the score of the board after the placement, without the cleared lines
+Placement = collections.namedtuple('Placement', 'x y rotation rows lines key value')
+
+def fits(rows, state, x, y, width=bitboard.WIDTH):
+    # Check if an orientation is inside the board and does not overlap the rows at the given position
+    if x + state.left < 0 or x + state.right >= width or y + state.top < 0 or y + state.bottom >= len(rows):
+        return False
+    shift = x + state.left
+    for dy, mask in state.masks:
+        if rows[y + dy] & (mask << shift):
+            return False
+    return True
+
+@functools.lru_cache(maxsize=None)
+def rotate(shape, rotation, x, y, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    # Apply Tetrominoe.rotate90 to a (rotation, x, y) state without checking collisions
+    kicks = tetrominoe.KICKS[shape][rotation - 1]
+    rotation = rotation % 4 + 1
+    state = tetrominoe.ORIENTATIONS[shape][rotation - 1]
+    for dx, dy in kicks:
+        if (x + dx + state.left >= 0 and x + dx + state.right < width
+                and y + dy + state.top >= 0 and y + dy + state.bottom < height):
+            return rotation, x + dx, y + dy
+    return rotation, x, y
+
+@functools.lru_cache(maxsize=None)
+def shifted_masks(shape, width=bitboard.WIDTH):
+    # For every rotation, map each column an orientation fits in to its (dy, mask) pairs shifted into place
+    tables = []
+    for state in tetrominoe.ORIENTATIONS[shape]:
+        tables.append({x: tuple((dy, mask << x + state.left) for dy, mask in state.masks)
+                       for x in range(-state.left, width - state.right)})
+    return tuple(tables)
+
+@functools.lru_cache(maxsize=None)
+def packed_masks(shape, width=bitboard.WIDTH):
+    # For every rotation, map each column an orientation fits in to its cells as one mask over the rows of a
+    # packed board, where row y + dy holds bits (y + dy) * width upwards, relative to the top row of the cells
+    tables = []
+    for state, shifted in zip(tetrominoe.ORIENTATIONS[shape], shifted_masks(shape, width)):
+        tables.append({x: sum(mask << (dy - state.top) * width for dy, mask in placed)
+                       for x, placed in shifted.items()})
+    return tuple(tables)
+
+@functools.lru_cache(maxsize=1 << 16)
+def placement_hash(shape, rotation, x, y, width=bitboard.WIDTH):
+    # The XOR of the Zobrist keys of the cells of an orientation placed at a position
+    value = 0
+    for dy, mask in shifted_masks(shape, width)[rotation - 1][x]:
+        value ^= zobrist.row_hash(y + dy, mask)
+    return value
+
+@functools.lru_cache(maxsize=None)
+def column_spans(shape):
+    # For every rotation, the (dx, top, bottom) of the filled cells of every column of the orientation
+    spans = []
+    for state in tetrominoe.ORIENTATIONS[shape]:
+        cells = [(x, y) for y, row in enumerate(state.matrix) for x, cell in enumerate(row) if cell > 0]
+        columns = sorted({x for x, _ in cells})
+        spans.append(tuple((dx, min(y for x, y in cells if x == dx), max(y for x, y in cells if x == dx))
+                           for dx in columns))
+    return tuple(spans)
+
+def surface(rows, width=bitboard.WIDTH):
+    """
+    Measures the skyline of a board and the empty cells below it.
+
+    Args:
+        rows (tuple of int): The row masks of the board.
+        width (int): The number of columns of the board.
+
+    Returns:
+        tuple: The height of every column as a list, and the number of holes.
+    """
+    height = len(rows)
+    heights = [0] * width
+    seen = 0
+    holes = 0
+    top = 0
+    while top < height and rows[top] == 0:
+        top += 1
+    for y in range(top, height):
+        row = rows[y]
+        holes += (seen & ~row).bit_count()
+        new = row & ~seen
+        while new:
+            low = new & -new
+            heights[low.bit_length() - 1] = height - y
+            new ^= low
+        seen |= row
+    return heights, holes
+
+def weigh(heights, lines, holes, weights=WEIGHTS):
+    # Combine the features of a board into its score
+    bumpiness = 0
+    for x in range(len(heights) - 1):
+        bumpiness += abs(heights[x] - heights[x + 1])
+    return weights[0] * sum(heights) + weights[1] * lines + weights[2] * holes + weights[3] * bumpiness
+
+def evaluate(rows, lines, weights=WEIGHTS, width=bitboard.WIDTH):
+    """
+    Scores a board after its filled rows have been removed.
+
+    Args:
+        rows (tuple of int): The row masks of the board.
+        lines (int): The number of rows cleared to reach it.
+        weights (tuple of float): The weights of aggregate height, lines, holes and bumpiness.
+        width (int): The number of columns of the board.
+
+    Returns:
+        float: The score of the board, higher is better.
+    """
+    heights, holes = surface(rows, width)
+    return weigh(heights, lines, holes, weights)
+
+class Bot:
+    """
+    Picks placements by a weighted heuristic, optionally looking ahead at the next block in the queue.
+
+    The placements of a (board, shape) pair, with their scores, and the scores of boards reached by clearing
+    lines are cached in transposition tables keyed by Zobrist hash, so the lookahead done for the next block is
+    reused when that block comes into play, and boards reached by different placement orders are only
+    evaluated once.
+
+    Without lookahead, a choice is held to the budget of benchmark.BOT_CHOOSE_TARGET. Looking ahead also
+    searches the next block from each of the beam best boards, so it costs several times as much and is
+    meant for batch runs rather than for choosing under that budget.
+
+    Args:
+        weights (tuple of float): The weights passed to evaluate().
+        lookahead (int): The number of queued blocks to look ahead at, 0 or 1.
+        beam (int): The number of best placements that are looked ahead from.
+        cache_size (int): The number of entries kept in each cache.
+        width (int): The number of columns of the boards played on.
+    """
+    def __init__(self, weights=WEIGHTS, lookahead=0, beam=4, cache_size=4096, width=bitboard.WIDTH):
+        self.weights = weights
+        self.lookahead = lookahead
+        self.beam = beam
+        self.cache_size = cache_size
+        self.width = width
+        self.full = (1 << width) - 1
+        self.placement_cache = zobrist.TranspositionTable(cache_size)
+        self.score_cache = zobrist.TranspositionTable(cache_size)
+
+    def placements(self, rows, shape, start=None, key=None):
+        """
+        Lists the distinct final placements of a tetrominoe.
+
+        Args:
+            rows (tuple of int): The row masks of the board.
+            shape (int): The shape of the tetrominoe.
+            start (tuple of int): The (rotation, x, y) the tetrominoe starts from, spawn by default.
+            key (int): The Zobrist hash of the board, computed from rows if not given.
+
+        Returns:
+            list of Placement: The placements, each with the board after clearing its filled rows and its hash.
+        """
+        return self.explore(rows, shape, start, key)[0]
+
+    def explore(self, rows, shape, start, key=None):
+        # Search the placements of a (board, shape, start) and cache them with the parent links
+        if start is None:
+            start = (1, tetrominoe.spawn_column(shape, self.width), 0)
+        if key is None:
+            key = zobrist.board_hash(rows)
+        position = key ^ zobrist.piece_key(shape, *start)
+        cached = self.placement_cache.get(position)
+        if cached is not None:
+            return cached
+        result = []
+        seen_boards = set()
+        parents, landed = self.search(rows, shape, start)
+        masks = shifted_masks(shape, self.width)
+        spans = column_spans(shape)
+        full = self.full
+        height = len(rows)
+        heights, holes = surface(rows, self.width)
+        for rotation, x, y in landed:
+            placed = masks[rotation - 1][x]
+            after_key = key ^ placement_hash(shape, rotation, x, y, self.width)
+            lines = 0
+            overlap = 0
+            for dy, mask in placed:
+                overlap |= rows[y + dy] & mask
+                if rows[y + dy] | mask == full:
+                    lines += 1
+            if after_key in seen_boards:
+                continue
+            seen_boards.add(after_key)
+            after = list(rows)
+            for dy, mask in placed:
+                after[y + dy] |= mask
+            if lines:
+                after = [0] * lines + [row for row in after if row != full]
+                after_key = zobrist.board_hash(after)
+                value = self.evaluate(after, after_key)
+            elif overlap:
+                # A block spawned onto the stack lands where it is, overlapping it
+                value = self.evaluate(after, after_key)
+            else:
+                # Only the columns covered by the block change: a column the block lands on grows to its top
+                # cell and gains the empty cells between, and a column it is tucked into loses holes
+                covered = heights[:]
+                gaps = holes
+                for dx, top, bottom in spans[rotation - 1]:
+                    surface_row = height - heights[x + dx]
+                    if y + bottom < surface_row:
+                        covered[x + dx] = height - y - top
+                        gaps += surface_row - y - bottom - 1
+                    else:
+                        gaps -= bottom - top + 1
+                value = weigh(covered, 0, gaps, self.weights)
+            result.append(Placement(x, y, rotation, tuple(after), lines, after_key, value))
+        self.placement_cache.put(position, (result, parents))
+        return result, parents
+
+    def search(self, rows, shape, start):
+        # Breadth-first search over the (rotation, x, y) states reachable from start. Returns
+        # the parent links of every visited state and the states that cannot move down.
+        # States above the stack are seeded directly, since in open air every rotation and
+        # column is reachable; only the band around the surface of the stack is searched.
+        orientations = tetrominoe.ORIENTATIONS[shape]
+        masks = packed_masks(shape, self.width)
+        tops = [state.top for state in orientations]
+        bottoms = [state.bottom for state in orientations]
+        width = self.width
+        height = len(rows)
+        parents = {start: None}
+        queue = []
+        empty = 0
+        while empty < height and rows[empty] == 0:
+            empty += 1
+        r0, x0, y0 = start
+        if empty >= 4 and all(empty - 1 - state.bottom >= y0 for state in orientations):
+            for rotation in range(1, 5):
+                state = orientations[rotation - 1]
+                y = empty - 1 - state.bottom
+                for x in range(-state.left, width - state.right):
+                    node = (rotation, x, y)
+                    if node not in parents:
+                        parents[node] = start
+                        queue.append(node)
+        else:
+            queue.append(start)
+        # Pack the stack into one integer, so a collision test is a single shift and AND against the packed
+        # cells of an orientation. The packed masks only exist for the columns inside the board.
+        packed = 0
+        for y in range(height - 1, empty - 1, -1):
+            packed = packed << width | rows[y]
+        packed <<= empty * width
+        landed = []
+        for node in queue:
+            rotation, x, y = node
+            cells = masks[rotation - 1][x]
+            top = tops[rotation - 1]
+            if y + 1 + bottoms[rotation - 1] < height and not packed >> (y + 1 + top) * width & cells:
+                nxt = (rotation, x, y + 1)
+                if nxt not in parents:
+                    parents[nxt] = node
+                    queue.append(nxt)
+            else:
+                landed.append(node)
+            for nxt in ((rotation, x - 1, y), (rotation, x + 1, y)):
+                if nxt not in parents:
+                    cells = masks[rotation - 1].get(nxt[1])
+                    if cells is not None and not packed >> (y + top) * width & cells:
+                        parents[nxt] = node
+                        queue.append(nxt)
+            nxt = rotate(shape, rotation, x, y, width, height)
+            if nxt not in parents:
+                r, nx, ny = nxt
+                cells = masks[r - 1].get(nx)
+                if (cells is not None and ny + tops[r - 1] >= 0 and ny + bottoms[r - 1] < height
+                        and not packed >> (ny + tops[r - 1]) * width & cells):
+                    parents[nxt] = node
+                    queue.append(nxt)
+        return parents, landed
+
+    def evaluate(self, rows, key):
+        # Evaluate a board without its cleared lines, caching the result by its hash
+        value = self.score_cache.get(key)
+        if value is None:
+            value = evaluate(rows, 0, self.weights, self.width)
+            self.score_cache.put(key, value)
+        return value
+
+    def score(self, placement):
+        # Score a placement by its board and the lines it cleared
+        return placement.value + self.weights[1] * placement.lines
+
+    def choose(self, state):
+        """
+        Picks the best placement for the current block of a game.
+
+        Args:
+            state (GameState): The game to play.
+
+        Returns:
+            Placement: The best placement, or None if the block cannot be placed.
+        """
+        block = state.block
+        rows = tuple(state.board.rows)
+        start = (block.rotation, block.position[0], block.position[1])
+        candidates = [(self.score(placement), placement)
+                      for placement in self.placements(rows, block.shape, start, state.board.hash)]
+        if not candidates:
+            return None
+        if self.lookahead and state.block_queue:
+            # Only the best few candidates are worth looking ahead from
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            shape = state.block_queue[0].shape
+            rescored = []
+            for value, placement in candidates[:self.beam]:
+                following = self.placements(placement.rows, shape, key=placement.key)
+                if following:
+                    value = self.weights[1] * placement.lines + max(self.score(after) for after in following)
+                rescored.append((value, placement))
+            candidates = rescored
+        return max(candidates, key=lambda candidate: candidate[0])[1]
+
+    def actions(self, state, placement):
+        """
+        Lists the actions that move the current block of a game to a placement and lock it there. The
+        placement has landed, so the final straight fall is a single HARD_DROP.
+
+        Args:
+            state (GameState): The game to play.
+            placement (Placement): A placement returned by choose() for the same game.
+
+        Returns:
+            list of int: The actions to pass to GameState.step, in order.
+        """
+        block = state.block
+        rows = tuple(state.board.rows)
+        start = (block.rotation, block.position[0], block.position[1])
+        parents = self.explore(rows, block.shape, start, state.board.hash)[1]
+        path = []
+        node = (placement.rotation, placement.x, placement.y)
+        while node != start:
+            parent = parents[node]
+            path.append(parent)
+            node = parent
+        path.reverse()
+        path.append((placement.rotation, placement.x, placement.y))
+        actions = []
+        for (r1, x1, y1), (r2, x2, y2) in zip(path, path[1:]):
+            actions.extend(self.steps(block.shape, r1, x1, y1, r2, x2, y2, len(rows)))
+        while actions and actions[-1] == game.DOWN:
+            actions.pop()
+        actions.append(game.HARD_DROP)
+        return actions
+
+    def steps(self, shape, r1, x1, y1, r2, x2, y2, height=bitboard.HEIGHT):
+        # List the actions between two linked states of the search. Seeded states are linked
+        # straight to the start, so they are reached by rotating, sliding and dropping in open air.
+        actions = []
+        while r1 != r2:
+            r1, x1, y1 = rotate(shape, r1, x1, y1, self.width, height)
+            actions.append(game.ROTATE)
+        while x1 > x2:
+            x1 -= 1
+            actions.append(game.LEFT)
+        while x1 < x2:
+            x1 += 1
+            actions.append(game.RIGHT)
+        actions.extend([game.DOWN] * (y2 - y1))
+        return actions
+
+    def play(self, state):
+        """
+        Plays the current block of a game to the best placement and lands it.
+
+        Args:
+            state (GameState): The game to play.
+
+        Returns:
+            bool: False if no placement was found.
+        """
+        placement = self.choose(state)
+        if placement is None:
+            return False
+        for action in self.actions(state, placement):
+            state.step(action)
+        return True
@@ -0,0 +1,415 @@
+"""
+Position Dataset
+This module stores positions of played games as training samples for board evaluators, in a file of fixed-width
+records that is read back through a memory map. Every record holds the board as one bit per cell (200 bits, 25
+bytes, for a 10 by 20 board), the shape, rotation and position of the falling tetrominoe, the shapes of the queue,
+the score at the position, the outcome, which is the number of points the game still scored after the position, and
+the index of the game. A 10 by 20 record takes 46 bytes.
+Cells are stored as filled or empty only. The colors of the cells can be kept in a side file of four bits per cell
+next to the dataset, which restores the color plane exactly.
+DatasetWriter is fed by the game engine one position at a time and writes the positions of a game once the game is
+over, when their outcome is known. Dataset maps the file into memory without reading it: indexing it with a slice
+and taking a field return views on the map, and a random minibatch only reads the records it picks.
+Usage:
+    python dataset.py positions.tpos --games 1000 --policy heuristic --colors
+    python dataset.py --check
+Modules:
+    - argparse: Parses the command line.
+    - numpy: Maps the records into memory and unpacks the boards.
+    - struct: Packs the file header.
+    - tempfile: Holds the dataset written by cross_check().
+    - bitboard: Custom module for the board representation positions are converted to and from.
+    - game: Custom module holding the headless game state and rules.
+    - simulate: Custom module with the policies playing the games.
+    - tetrominoe: Custom module for the tetrominoes of a position.
+    - zobrist: Custom module for the hash of a restored board.
+Global Variables:
+    - HEADER: The struct of the file header.
+    - COLORS: The header flag of a dataset with a color side file.
+Classes:
+    - DatasetError: Raised for malformed dataset files.
+    - DatasetWriter: Streams positions of played games into a dataset file.
+    - Dataset: A memory-mapped dataset file.
+Functions:
+    - record_dtype(width, height, queue): The NumPy dtype of a record.
+    - pack_board(rows, width): Packs the row masks of a board into one bit per cell.
+    - unpack_board(data, width, height, colors): Restores a bitboard.Board from its packed cells.
+    - play(writer, games, policy, seed, max_pieces, mode): Feeds the positions of played games to a writer.
+    - cross_check(games, seed): Writes played positions and checks that they read back unchanged.
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import numpy as np
+import bitboard
+import game
+import simulate
+import tetrominoe
+import zobrist
+
+# magic, version, flags, width, height, queue length, record size
+HEADER = struct.Struct('<4sBBHHBH3x')
+MAGIC = b'TPOS'
+VERSION = 1
+COLORS = 1
+
+class DatasetError(ValueError):
+    pass
+
+def record_dtype(width, height, queue):
+    """
+    Args:
+        width (int): The number of columns of the boards.
+        height (int): The number of rows of the boards.
+        queue (int): The number of queued shapes stored.
+
+    Returns:
+        numpy.dtype: The packed structured type of a record.
+    """
+    return np.dtype([
+        ('board', np.uint8, ((width * height + 7) // 8,)),
+        ('shape', np.uint8),
+        ('rotation', np.uint8),
+        ('x', '<i2'),
+        ('y', '<i2'),
+        ('queue', np.uint8, (queue,)),
+        ('score', '<u4'),
+        ('outcome', '<u4'),
+        ('game', '<u4'),
+    ])
+
+def pack_board(rows, width):
+    """
+    Packs a board into one bit per cell, cell (x, y) being bit y * width + x in little-endian order.
+
+    Args:
+        rows (sequence of int): The row masks of the board.
+        width (int): The number of columns of the board.
+
+    Returns:
+        bytes: The packed cells.
+    """
+    value = 0
+    for mask in reversed(rows):
+        value = value << width | mask
+    return value.to_bytes((width * len(rows) + 7) // 8, 'little')
+
+def unpack_board(data, width, height, colors=None):
+    """
+    Restores a board, with its skyline and hash, from its packed cells.
+
+    Args:
+        data (bytes): The cells packed by pack_board().
+        width (int): The number of columns of the board.
+        height (int): The number of rows of the board.
+        colors (array of int): The colors of the cells, of shape (height, width), or None to give every
+            filled cell the color bitboard.GARBAGE.
+
+    Returns:
+        bitboard.Board: The board.
+    """
+    board = bitboard.Board(width, height)
+    value = int.from_bytes(bytes(data), 'little')
+    full = board.full
+    for y in range(height):
+        mask = value >> (y * width) & full
+        if mask:
+            board.rows[y] = mask
+            if colors is not None:
+                board.colors[y] = tuple(int(cell) for cell in colors[y])
+            else:
+                board.colors[y] = tuple(bitboard.GARBAGE if mask >> x & 1 else 0 for x in range(width))
+    # The skyline is rebuilt from the top of the board down
+    board.heights[:] = [height] * width
+    board.update_heights()
+    board.hash = zobrist.board_hash(board.rows)
+    return board
+
+class DatasetWriter:
+    """
+    Streams positions into a new dataset file. The positions of a game are kept until end_game() and then
+    written in one go, with the points the game scored after each of them as their outcome.
+
+    Args:
+        path (str): The dataset file, replaced if it exists.
+        width (int): The number of columns of the boards.
+        height (int): The number of rows of the boards.
+        queue (int): The number of queued shapes stored.
+        colors (bool): Whether to also write the colors of the cells to the side file path + '.colors'.
+    """
+    def __init__(self, path, width=bitboard.WIDTH, height=bitboard.HEIGHT, queue=3, colors=False):
+        self.width = width
+        self.height = height
+        self.queue = queue
+        self.dtype = record_dtype(width, height, queue)
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, COLORS if colors else 0, width, height, queue, self.dtype.itemsize))
+        self.color_file = open(path + '.colors', 'wb') if colors else None
+        self.games = 0
+        self.count = 0
+        self.positions = []
+        self.cells = []
+
+    def add(self, state):
+        """
+        Adds the current position of a game.
+
+        Args:
+            state (GameState): The game, with a falling tetrominoe, on a board of the size of the dataset.
+        """
+        board = state.board
+        block = state.block
+        top = board.height - max(board.heights)
+        queue = bytes(queued.shape for queued in state.block_queue)[:self.queue]
+        self.positions.append((pack_board(board.rows, self.width), block.shape, block.rotation, block.position[0],
+                               block.position[1], queue.ljust(self.queue, b'\0'), state.score))
+        if self.color_file is not None:
+            # The rows above the stack are empty and left out
+            self.cells.append((top, b''.join(bytes(row) for row in board.colors[top:])))
+
+    def end_game(self, score=None):
+        """
+        Writes the positions of the current game.
+
+        Args:
+            score (int): The final score of the game, by default the score of its last position.
+        """
+        positions = self.positions
+        if not positions:
+            return
+        count = len(positions)
+        boards, shapes, rotations, xs, ys, queues, scores = zip(*positions)
+        records = np.zeros(count, self.dtype)
+        records['board'] = np.frombuffer(b''.join(boards), np.uint8).reshape(count, -1)
+        records['shape'] = shapes
+        records['rotation'] = rotations
+        records['x'] = xs
+        records['y'] = ys
+        records['queue'] = np.frombuffer(b''.join(queues), np.uint8).reshape(count, self.queue)
+        records['score'] = scores
+        records['outcome'] = (scores[-1] if score is None else score) - records['score']
+        records['game'] = self.games
+        self.file.write(records.tobytes())
+        if self.color_file is not None:
+            cells = np.zeros((count, self.height * self.width + 1), np.uint8)
+            for i, (top, colors) in enumerate(self.cells):
+                cells[i, top * self.width:self.height * self.width] = np.frombuffer(colors, np.uint8)
+            # Two cells per byte, the first in the low four bits
+            self.color_file.write((cells[:, 0:-1:2] | cells[:, 1::2] << 4).tobytes())
+        self.positions = []
+        self.cells = []
+        self.games += 1
+        self.count += count
+
+    def close(self):
+        # Write the positions of an unfinished game, then close the files
+        self.end_game()
+        self.file.close()
+        if self.color_file is not None:
+            self.color_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Dataset:
+    """
+    A dataset file mapped into memory. Nothing is read until records are accessed; slices and fields of
+    records are views on the map, and gathering a minibatch only reads the records it picks.
+
+    Args:
+        path (str): The dataset file.
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            header = file.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise DatasetError(f'{path} is not a position dataset')
+        magic, version, flags, self.width, self.height, self.queue, size = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise DatasetError(f'{path} is not a version {VERSION} position dataset')
+        self.dtype = record_dtype(self.width, self.height, self.queue)
+        if size != self.dtype.itemsize:
+            raise DatasetError(f'{path} has records of {size} bytes instead of {self.dtype.itemsize}')
+        # A record cut short by an interrupted write is left out
+        count = (os.path.getsize(path) - HEADER.size) // size
+        self.records = self.map(path, self.dtype, HEADER.size, count)
+        self.color_planes = None
+        if flags & COLORS:
+            cells = (self.width * self.height + 1) // 2
+            self.color_planes = self.map(path + '.colors', np.dtype((np.uint8, cells)), 0, count)
+
+    @staticmethod
+    def map(path, dtype, offset, count):
+        # Map count records of a file, or return an empty array, which cannot be mapped
+        if not count:
+            return np.zeros(0, dtype)
+        return np.memmap(path, dtype, 'r', offset, (count,))
+
+    def close(self):
+        # Drop the maps; a file is unmapped once no view of its records is left either
+        self.records = np.zeros(0, self.dtype)
+        self.color_planes = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def sample(self, size, rng=None):
+        """
+        Picks a random minibatch.
+
+        Args:
+            size (int): The number of records.
+            rng (numpy.random.Generator): The random generator, a new one by default.
+
+        Returns:
+            tuple: The sorted indices of the records and the records, read in file order.
+        """
+        rng = rng or np.random.default_rng()
+        indices = np.sort(rng.integers(0, len(self.records), size))
+        return indices, self.records[indices]
+
+    def boards(self, records):
+        """
+        Args:
+            records (numpy.ndarray): Records of this dataset.
+
+        Returns:
+            numpy.ndarray: The cells of their boards, 1 where filled, of shape (N, height, width).
+        """
+        cells = np.unpackbits(records['board'], axis=-1, count=self.width * self.height, bitorder='little')
+        return cells.reshape(-1, self.height, self.width)
+
+    def colors(self, indices):
+        """
+        Args:
+            indices: The indices of records, as accepted by NumPy indexing.
+
+        Returns:
+            numpy.ndarray: The colors of the cells of their boards, of shape (N, height, width).
+
+        Raises:
+            DatasetError: If the dataset was written without colors.
+        """
+        if self.color_planes is None:
+            raise DatasetError('the dataset was written without colors')
+        packed = np.atleast_2d(self.color_planes[indices])
+        cells = np.empty((len(packed), packed.shape[1] * 2), np.uint8)
+        cells[:, 0::2] = packed & 15
+        cells[:, 1::2] = packed >> 4
+        return cells[:, :self.width * self.height].reshape(-1, self.height, self.width)
+
+    def position(self, index):
+        """
+        Converts a record back into the structures of the game.
+
+        Args:
+            index (int): The index of the record.
+
+        Returns:
+            tuple: The bitboard.Board, with its colors if the dataset has them, the falling Tetrominoe, the
+                list of queued Tetrominoes, the score and the outcome.
+        """
+        record = self.records[index]
+        colors = self.colors(index)[0] if self.color_planes is not None else None
+        board = unpack_board(record['board'].tobytes(), self.width, self.height, colors)
+        block = tetrominoe.Tetrominoe(int(record['shape']), [int(record['x']), int(record['y'])],
+                                      int(record['rotation']))
+        # Queued tetrominoes wait at the spawn position, as in GameState.restore
+        queue = [tetrominoe.Tetrominoe(int(shape), [4, 0], 1) for shape in record['queue'] if shape]
+        return board, block, queue, int(record['score']), int(record['outcome'])
+
+def play(writer, games, policy='heuristic', seed=0, max_pieces=1000, mode='random', expected=None):
+    # Play games with a policy, adding the position at the spawn of every tetrominoe to the writer, and
+    # append what every position should read back as to expected if given
+    player = simulate.load_policy(policy)()
+    for seed in range(seed, seed + games):
+        state = game.GameState(seed, mode=mode, width=writer.width, height=writer.height)
+        rng = random.Random(seed)
+        added = None
+        while not state.lost and state.pieces < max_pieces:
+            if state.pieces != added and state.block is not None:
+                writer.add(state)
+                added = state.pieces
+                if expected is not None:
+                    block = state.block
+                    expected.append((list(state.board.rows), state.board.to_lists(), block.shape, block.rotation,
+                                     list(block.position), [queued.shape for queued in state.block_queue],
+                                     state.score))
+            player.play(state, rng)
+        writer.end_game(state.score)
+
+def cross_check(games=20, seed=0, policy='heuristic', width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    """
+    Writes the positions of played games with colors, reads them back and compares every position with the
+    game it was taken from.
+
+    Returns:
+        int: The number of positions compared.
+
+    Raises:
+        AssertionError: If a position does not read back unchanged.
+    """
+    expected = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'positions.tpos')
+        with DatasetWriter(path, width, height, colors=True) as writer:
+            play(writer, games, policy, seed, expected=expected)
+        with Dataset(path) as dataset:
+            assert len(dataset) == len(expected), f'{len(dataset)} positions instead of {len(expected)}'
+            cells = dataset.boards(dataset[:])
+            colors = dataset.colors(slice(None))
+            for i, (rows, lists, shape, rotation, position, queue, score) in enumerate(expected):
+                board, block, queued, actual_score, outcome = dataset.position(i)
+                assert board.rows == rows and board.to_lists() == lists, f'board {i} differs'
+                assert (cells[i] == (colors[i] > 0)).all() and colors[i].tolist() == lists, f'cells {i} differ'
+                assert board.hash == zobrist.board_hash(rows), f'hash {i} differs'
+                assert (block.shape, block.rotation, block.position) == (shape, rotation, position), \
+                    f'block {i} differs'
+                assert [block.shape for block in queued] == queue and actual_score == score, f'position {i} differs'
+                assert outcome >= 0, f'outcome {i} is negative'
+    return len(expected)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write the positions of played games to a position dataset.')
+    parser.add_argument('path', nargs='?', metavar='FILE', help='the dataset file to write')
+    parser.add_argument('--games', type=int, default=100, help='number of games to play')
+    parser.add_argument('--policy', default='heuristic', help="random, scripted, heuristic or a 'module:Class' path")
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max-pieces', type=int, default=1000, help='pieces after which a game is stopped')
+    parser.add_argument('--mode', choices=('random', 'bag'), default='random', help='block generator mode')
+    parser.add_argument('--width', type=int, default=bitboard.WIDTH, help='columns of the boards')
+    parser.add_argument('--height', type=int, default=bitboard.HEIGHT, help='rows of the boards')
+    parser.add_argument('--colors', action='store_true', help='also write the colors of the cells to FILE.colors')
+    parser.add_argument('--check', action='store_true', help='check that written positions read back unchanged')
+    args = parser.parse_args(argv)
+    if args.check:
+        compared = cross_check(min(args.games, 20), args.seed, args.policy, args.width, args.height)
+        print(f'{compared} positions read back unchanged')
+        return
+    if not args.path:
+        parser.error('a dataset FILE is required')
+    start = time.perf_counter()
+    with DatasetWriter(args.path, args.width, args.height, colors=args.colors) as writer:
+        play(writer, args.games, args.policy, args.seed, args.max_pieces, args.mode)
+    elapsed = time.perf_counter() - start
+    print(f'{writer.count} positions of {writer.games} games in {elapsed:.2f} s, '
+          f'{writer.dtype.itemsize} bytes per position')
+
+if __name__ == '__main__':
+    sys.exit(main())
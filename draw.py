@@ -1,3 +1,6 @@
+import functools
+import math
+import os
 import pygame
 
 white = (255, 255, 255)
@@ -11,6 +14,64 @@ blue = (35,100,255,255)
 yellow = (255,225,0,255)
 purple = (197,69,222,255)
 
+# The number of board cells shown by Renderer, and how close the falling tetrominoe may come to the edges
+# of the viewport before it scrolls
+VIEW_WIDTH = 10
+VIEW_HEIGHT = 20
+VIEW_MARGIN_X = 2
+VIEW_MARGIN_Y = 5
+
+# Ghost tiles are stored in Renderer.tiles under the shape plus GHOST
+GHOST = 10
+
+# Pixels between two boards of the spectator wall, and around them
+WALL_GAP = 6
+
+# The font of the texts, found next to this module whatever the working directory
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fonts', 'tetris-atari.ttf')
+FONT_SIZE = 21
+
+@functools.lru_cache(maxsize=None)
+def get_font(path=FONT_PATH, size=FONT_SIZE):
+    """
+    Loads a font from disk the first time it is asked for, and returns the loaded font afterwards.
+
+    Args:
+        path (str): The path of the font file, or None for the default font of Pygame.
+        size (int): The size of the font.
+
+    Returns:
+        pygame.font.Font: The font.
+    """
+    return pygame.font.Font(path, size)
+
+@functools.lru_cache(maxsize=16)
+def render_text(text):
+    # Render a text in the game font; the fixed titles and the current score stay cached
+    return get_font().render(text, True, white)
+
+def make_tiles():
+    """
+    Pre-renders a tile sprite for every tetrominoe color, and a ghost outline for every tetrominoe.
+
+    Returns:
+        dict: The 18 by 18 tile surfaces by shape, with the ghost tiles under the shape plus GHOST.
+    """
+    tiles = {}
+    for shape in range(1, 9):
+        tile = pygame.Surface((18, 18)).convert()
+        pygame.draw.rect(tile, (13,13,52,255), (0, 0, 18, 18), 0)
+        pygame.draw.rect(tile, get_tetrominoe_color(shape), (1, 1, 16, 16), 0)
+        tiles[shape] = tile
+    for shape in range(1, 8):
+        # The ghost piece is an outline in the color of the tetrominoe, blitted over the empty cell
+        tile = pygame.Surface((18, 18)).convert()
+        tile.set_colorkey(black)
+        tile.fill(black)
+        pygame.draw.rect(tile, get_tetrominoe_color(shape), (1, 1, 16, 16), 2)
+        tiles[GHOST + shape] = tile
+    return tiles
+
 def draw_background(screen):
     """
     Draws the background grid for the Tetris game.
@@ -52,11 +113,7 @@ def draw_board(board, block_queue, screen, score):
         for x, cell in enumerate(row):
             if cell == 0:
                 # Alternate colors for empty cells
-                if count % 2 == 0:
-                    color = (13,23,83,255)
-                else:
-                    color = (13,26,91,255)
-                pygame.draw.rect(screen, color, (x * 18+36, y * 18, 18, 18), 0)
+                pygame.draw.rect(screen, get_empty_color(count), (x * 18+36, y * 18, 18, 18), 0)
             else:
                 # Draw the tile with the corresponding color for filled cells
                 color = get_tetrominoe_color(cell)
@@ -65,15 +122,38 @@ def draw_board(board, block_queue, screen, score):
         count += 1
     
     # Draw the borders of the game board
-    pygame.draw.rect(screen, (39,61,199,255), (28, 0, 4, 360), 0)
-    pygame.draw.rect(screen, (10,12,55,255), (32, 0, 4, 360), 0)
-    pygame.draw.rect(screen, (39,61,199,255), (18*12+4, 0, 4, 360), 0)
-    pygame.draw.rect(screen, (10,12,55,255), (18*12, 0, 4, 360), 0)
+    draw_borders(screen)
 
     # Draw the block queue and the score
     draw_block_queue(block_queue, screen)
     draw_score(screen, score)
+
+def draw_borders(screen):
+    """
+    Draws the borders on both sides of the game board.
+    
+    Args:
+        screen (pygame.Surface): The surface to draw on.
+    """
+    pygame.draw.rect(screen, (39,61,199,255), (28, 0, 4, 360), 0)
+    pygame.draw.rect(screen, (10,12,55,255), (32, 0, 4, 360), 0)
+    pygame.draw.rect(screen, (39,61,199,255), (18*12+4, 0, 4, 360), 0)
+    pygame.draw.rect(screen, (10,12,55,255), (18*12, 0, 4, 360), 0)
+    
+def get_empty_color(count):
+    """
+    Returns the color of an empty board cell, alternating in a checkerboard pattern.
     
+    Args:
+        count (int): The running index of the cell. Only its parity matters, which is that of x + y.
+        
+    Returns:
+        tuple: The color of the empty cell.
+    """
+    if count % 2 == 0:
+        return (13,23,83,255)
+    return (13,26,91,255)
+
 def draw_tile(pos, screen, color=red):
     """
     Draws a single tile on the game board.
@@ -94,9 +174,7 @@ def draw_block_queue(queue, screen):
         queue (list): The queue of upcoming blocks.
         screen (pygame.Surface): The surface to draw on.
     """
-    pygame.draw.rect(screen, (13,26,91,255), (260, 160, 120, 185), 0)
-    pygame.draw.rect(screen, (39,61,199,255), (260, 160, 120, 185), 4)
-    pygame.draw.rect(screen, (10,12,55,255), (264, 164, 112, 177), 4)
+    draw_block_queue_frame(screen)
     count = 0
     for block in queue:
         for y, row in enumerate(block.matrix):
@@ -105,6 +183,17 @@ def draw_block_queue(queue, screen):
                     draw_tile([block.position[0] + x + 10, block.position[1] + y + 10 + 3*count], screen, get_tetrominoe_color(cell))
         count += 1
 
+def draw_block_queue_frame(screen):
+    """
+    Draws the empty frame of the block queue.
+    
+    Args:
+        screen (pygame.Surface): The surface to draw on.
+    """
+    pygame.draw.rect(screen, (13,26,91,255), (260, 160, 120, 185), 0)
+    pygame.draw.rect(screen, (39,61,199,255), (260, 160, 120, 185), 4)
+    pygame.draw.rect(screen, (10,12,55,255), (264, 164, 112, 177), 4)
+
 def draw_score(screen, score=0):
     """
     Draws the current score on the screen.
@@ -113,22 +202,28 @@ def draw_score(screen, score=0):
         screen (pygame.Surface): The surface to draw on.
         score (int): The current score of the game.
     """
+    draw_score_frame(screen)
+    score = render_text(str(score))
+    rect = score.get_rect(topright = (373, 75))
+    screen.blit(score, rect)
+
+def draw_score_frame(screen):
+    """
+    Draws the score panel and its title without the score itself.
+    
+    Args:
+        screen (pygame.Surface): The surface to draw on.
+    """
     pygame.draw.rect(screen, (39,61,199,255), (224, 46, 200, 69), 4)
     pygame.draw.rect(screen, (13,26,91,255), (224, 50, 200, 61), 0)
     pygame.draw.line(screen, (10,12,55,255), (224, 51), (400, 51), 4)
     pygame.draw.line(screen, (10,12,55,255), (224, 108), (400, 108), 4)
 
-    font_path = './fonts/tetris-atari.ttf'
-    font = pygame.font.Font(font_path, 21)
-    title = font.render('SCORE', True, white)
-    score = font.render(str(score), True, white)
-    rect = score.get_rect(topright = (373, 75))
-
+    title = render_text('SCORE')
     pygame.draw.rect(screen, (13,26,91,255), (258, 23, 120, 42), 0)
     pygame.draw.rect(screen, (39,61,199,255), (258, 23, 120, 42), 4)
     pygame.draw.rect(screen, (10,12,55,255), (262, 27, 112, 34), 4)
     screen.blit(title, (269, 32))
-    screen.blit(score, rect)
 
 def draw_filled_rows(screen, rows):
     """
@@ -150,10 +245,7 @@ def draw_game_over(screen):
     Args:
         screen (pygame.Surface): The surface to draw on.
     """
-    font_path = './fonts/tetris-atari.ttf'
-    font = pygame.font.Font(font_path, 21)
-    title = font.render('GAME OVER', True, white)
-    screen.blit(title, (32, 75))
+    screen.blit(render_text('GAME OVER'), (32, 75))
     
 def get_tetrominoe_color(shape: int):
     """
@@ -180,6 +272,8 @@ def get_tetrominoe_color(shape: int):
             return purple
         case 7:
             return light_blue
+        case 8:
+            return grey
         
 def draw_tetrominoe(tetro, screen):
     """
@@ -202,4 +296,362 @@ def print_board(board):
         board (list of list of int): The current state of the game board.
     """
     for row in board:
-        print(" ".join(str(cell) for cell in row))
\ No newline at end of file
+        print(" ".join(str(cell) for cell in row))
+
+class Renderer:
+    """
+    Draws the game incrementally, blitting only what changed since the previous frame.
+
+    The background, the empty board, the borders and the panel frames are baked once into a single
+    surface, every tetrominoe color is pre-rendered as a tile sprite, and the fonts are loaded once, when
+    the renderer is created. Each call to draw() compares
+    the board, the falling tetrominoe, the block queue and the score against the previous frame and
+    returns the rectangles that changed, to be passed to pygame.display.update().
+
+    The screen shows a viewport of VIEW_WIDTH by VIEW_HEIGHT cells. Boards larger than that are scrolled
+    so the falling tetrominoe stays at least a few cells away from the edges of the viewport, and only the
+    visible cells are ever compared or drawn.
+
+    Args:
+        screen (pygame.Surface): The surface to draw on.
+    """
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = pygame.Surface(screen.get_size()).convert()
+        draw_background(self.background)
+        for y in range(VIEW_HEIGHT):
+            for x in range(VIEW_WIDTH):
+                pygame.draw.rect(self.background, get_empty_color(x + y), (x * 18+36, y * 18, 18, 18), 0)
+        draw_borders(self.background)
+        draw_block_queue_frame(self.background)
+        draw_score_frame(self.background)
+        self.tiles = make_tiles()
+        self.score_area = pygame.Rect(228, 54, 172, 52)
+        self.queue_area = pygame.Rect(268, 168, 104, 169)
+        self.overlay_font = get_font(None, 14)
+        # Render the fixed texts now rather than in the middle of the game
+        render_text('GAME OVER')
+        self.overlay_rect = None
+        self.origin = (0, 0)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forces the next frame to be drawn in full, for example after something was drawn over the game.
+        """
+        self.cells = [[-1] * VIEW_WIDTH for _ in range(VIEW_HEIGHT)]
+        self.queue = None
+        self.score = None
+        self.full = True
+
+    def draw(self, board, block_queue, score, block=None, ghost=None):
+        """
+        Draws the changes since the previous frame.
+
+        Args:
+            board (list of list of int): The current state of the game board.
+            block_queue (list): The queue of upcoming blocks.
+            score (int): The current score of the game.
+            block: The falling tetrominoe, or None.
+            ghost (int): The row the falling tetrominoe would land in, to preview it there, or None.
+
+        Returns:
+            list of pygame.Rect: The areas of the screen that were redrawn.
+        """
+        screen = self.screen
+        dirty = []
+        if self.full:
+            screen.blit(self.background, (0, 0))
+            dirty.append(screen.get_rect())
+            self.full = False
+
+        # Overlay the falling tetrominoe on a copy of the visible part of the board
+        vx, vy = self.origin = self.follow(board, block)
+        cells = []
+        for y in range(vy, vy + VIEW_HEIGHT):
+            row = list(board[y][vx:vx + VIEW_WIDTH]) if y < len(board) else []
+            cells.append(row + [0] * (VIEW_WIDTH - len(row)))
+        if block is not None:
+            # The ghost piece goes first, so the falling tetrominoe covers it where they overlap
+            targets = ((ghost, GHOST), (block.position[1], 0)) if ghost is not None else ((block.position[1], 0),)
+            for top, offset in targets:
+                for y, row in enumerate(block.matrix):
+                    for x, cell in enumerate(row):
+                        sx = block.position[0] + x - vx
+                        sy = top + y - vy
+                        if cell > 0 and 0 <= sx < VIEW_WIDTH and 0 <= sy < VIEW_HEIGHT:
+                            cells[sy][sx] = cell + offset
+
+        # Blit the changed cells, merging them into one rectangle per row
+        for y, row in enumerate(cells):
+            last = self.cells[y]
+            if row == last:
+                continue
+            first = None
+            for x, cell in enumerate(row):
+                if cell != last[x]:
+                    pos = (x * 18+36, y * 18)
+                    if cell > GHOST:
+                        screen.blit(self.background, pos, (pos[0], pos[1], 18, 18))
+                        screen.blit(self.tiles[cell], pos)
+                    elif cell > 0:
+                        screen.blit(self.tiles[cell], pos)
+                    else:
+                        screen.blit(self.background, pos, (pos[0], pos[1], 18, 18))
+                    if first is None:
+                        first = x
+                    end = x
+            dirty.append(pygame.Rect(first * 18+36, y * 18, (end - first + 1) * 18, 18))
+        self.cells = cells
+
+        queue = [(block.shape, block.rotation) for block in block_queue]
+        if queue != self.queue:
+            screen.blit(self.background, self.queue_area, self.queue_area)
+            count = 0
+            for block in block_queue:
+                for y, row in enumerate(block.matrix):
+                    for x, cell in enumerate(row):
+                        if cell > 0:
+                            screen.blit(self.tiles[cell], ((block.position[0] + x + 10) * 18+36, (block.position[1] + y + 10 + 3*count) * 18))
+                count += 1
+            dirty.append(self.queue_area)
+            self.queue = queue
+
+        if score != self.score:
+            screen.blit(self.background, self.score_area, self.score_area)
+            text = render_text(str(score))
+            screen.blit(text, text.get_rect(topright = (373, 75)))
+            dirty.append(self.score_area)
+            self.score = score
+        return dirty
+
+    def follow(self, board, block):
+        """
+        Scrolls the viewport just enough to keep the falling tetrominoe inside it, with a margin.
+
+        Args:
+            board: The current state of the game board.
+            block: The falling tetrominoe, or None.
+
+        Returns:
+            tuple of int: The board column and row shown at the top left of the viewport.
+        """
+        vx, vy = self.origin
+        if block is not None:
+            x, y = block.position
+            state = block.state
+            vx = min(vx, x + state.left - VIEW_MARGIN_X)
+            vx = max(vx, x + state.right + 1 + VIEW_MARGIN_X - VIEW_WIDTH)
+            vy = min(vy, y + state.top - VIEW_MARGIN_Y)
+            vy = max(vy, y + state.bottom + 1 + VIEW_MARGIN_Y - VIEW_HEIGHT)
+        vx = max(0, min(vx, len(board[0]) - VIEW_WIDTH))
+        vy = max(0, min(vy, len(board) - VIEW_HEIGHT))
+        return vx, vy
+
+    def draw_filled_rows(self, rows):
+        """
+        Draws the visible filled rows over the board and marks them to be redrawn on the next frame.
+
+        Args:
+            rows (list of int): The list of row indices that are filled.
+
+        Returns:
+            list of pygame.Rect: The areas of the screen that were drawn.
+        """
+        rows = [row - self.origin[1] for row in rows if 0 <= row - self.origin[1] < VIEW_HEIGHT]
+        draw_filled_rows(self.screen, rows)
+        for row in rows:
+            self.cells[row] = [-1] * VIEW_WIDTH
+        return [pygame.Rect(36, row*18, 180, 18) for row in rows]
+
+    def draw_game_over(self):
+        """
+        Draws the 'GAME OVER' message and marks the whole screen to be redrawn on the next frame.
+
+        Returns:
+            list of pygame.Rect: The areas of the screen that were drawn.
+        """
+        draw_game_over(self.screen)
+        self.invalidate()
+        return [self.screen.get_rect()]
+
+    def draw_overlay(self, lines):
+        """
+        Draws lines of text in a box over the top left of the board, such as the profiler overlay, and
+        marks the board cells under it to be redrawn on the next frame.
+
+        Args:
+            lines (list of str): The lines of text.
+
+        Returns:
+            list of pygame.Rect: The areas of the screen that were drawn.
+        """
+        height = self.overlay_font.get_linesize()
+        rect = pygame.Rect(0, 0, 216, height * len(lines) + 4)
+        pygame.draw.rect(self.screen, black, rect, 0)
+        for i, line in enumerate(lines):
+            self.screen.blit(self.overlay_font.render(line, True, white), (2, 2 + i * height))
+        for row in range(min(VIEW_HEIGHT, rect.bottom // 18 + 1)):
+            self.cells[row] = [-1] * VIEW_WIDTH
+        dirty = [rect.union(self.overlay_rect)] if self.overlay_rect else [rect]
+        self.overlay_rect = rect
+        return dirty
+
+    def hide_overlay(self):
+        """
+        Removes the overlay drawn by draw_overlay().
+
+        Returns:
+            list of pygame.Rect: The areas of the screen that were drawn.
+        """
+        rect = self.overlay_rect
+        if rect is None:
+            return []
+        self.screen.blit(self.background, rect, rect)
+        for row in range(min(VIEW_HEIGHT, rect.bottom // 18 + 1)):
+            self.cells[row] = [-1] * VIEW_WIDTH
+        self.overlay_rect = None
+        return [rect]
+
+def block_cells(block, width, height):
+    # Return the (x, y, shape) of the cells of a falling tetrominoe that are on the board
+    if block is None:
+        return ()
+    px, py = block.position
+    return tuple((px + x, py + y, cell) for y, row in enumerate(block.matrix) for x, cell in enumerate(row)
+                 if cell > 0 and 0 <= px + x < width and 0 <= py + y < height)
+
+class SpectatorRenderer:
+    """
+    Draws many games at once, tiled across the screen at a smaller cell size, for demo walls and for
+    watching bot runs.
+
+    The boards are laid out like draw_board() lays out the single board, a checkerboard of empty cells
+    between two borders, with the score underneath. The layout is baked once into a background surface,
+    and the tile sprites of Renderer are scaled down once to the cell size. Each call to draw() skips the
+    boards whose rows, falling tetrominoe and score did not change, compares the others cell by cell
+    against what is on screen, and submits the changed cells of all boards in a single Surface.blits()
+    call. Color rows that are shared with the previous frame, as the rows of a bitboard.Board are, are
+    skipped without comparing their cells.
+
+    Args:
+        screen (pygame.Surface): The surface to draw on.
+        count (int): The number of boards.
+        width (int): The number of columns of every board.
+        height (int): The number of rows of every board.
+    """
+    def __init__(self, screen, count, width=VIEW_WIDTH, height=VIEW_HEIGHT):
+        self.screen = screen
+        self.count = count
+        self.width = width
+        self.height = height
+        self.font = get_font(None, 14)
+        # The score goes under the border of the board
+        label = self.font.get_linesize() + 2
+        # Pick the number of columns that gives the largest cells
+        screen_width, screen_height = screen.get_size()
+        self.cell = 0
+        for columns in range(1, count + 1):
+            lines = math.ceil(count / columns)
+            cell = min((screen_width - WALL_GAP * (columns + 1)) // (columns * width),
+                       (screen_height - WALL_GAP * (lines + 1) - label * lines) // (lines * height))
+            if cell > self.cell:
+                self.cell = cell
+                self.columns = columns
+        if self.cell < 2:
+            raise ValueError(f'a {screen_width}x{screen_height} screen is too small for {count} boards')
+        cell = self.cell
+        self.origins = []
+        self.areas = []
+        self.labels = []
+        for index in range(count):
+            line, column = divmod(index, self.columns)
+            x = WALL_GAP + column * (width * cell + WALL_GAP)
+            y = WALL_GAP + line * (height * cell + label + WALL_GAP)
+            self.origins.append((x, y))
+            self.areas.append(pygame.Rect(x, y, width * cell, height * cell + label))
+            self.labels.append(pygame.Rect(x, y + height * cell + 2, width * cell, label - 2))
+
+        self.background = pygame.Surface(screen.get_size()).convert()
+        self.background.fill((13,13,52,255))
+        for x, y in self.origins:
+            pygame.draw.rect(self.background, (39,61,199,255), (x - 2, y - 2, width * cell + 4, height * cell + 4), 2)
+            for row in range(height):
+                for column in range(width):
+                    pygame.draw.rect(self.background, get_empty_color(column + row),
+                                     (x + column * cell, y + row * cell, cell, cell), 0)
+        self.tiles = {shape: pygame.transform.smoothscale(tile, (cell, cell))
+                      for shape, tile in make_tiles().items() if shape < GHOST}
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Forces the next frame to be drawn in full.
+        """
+        self.drawn = [None] * self.count
+        self.scores = [None] * self.count
+        self.full = True
+
+    def draw(self, games):
+        """
+        Draws the changes since the previous frame.
+
+        Args:
+            games (iterable of tuple): The (board, block, score) of every game, where board holds the color rows,
+                block is the falling tetrominoe or None, and score is the current score.
+
+        Returns:
+            list of pygame.Rect: The areas of the screen that were redrawn, one per changed board.
+        """
+        screen = self.screen
+        background = self.background
+        tiles = self.tiles
+        cell = self.cell
+        width = self.width
+        height = self.height
+        blits = []
+        dirty = []
+        if self.full:
+            blits.append((background, (0, 0)))
+            dirty.append(screen.get_rect())
+            self.full = False
+        for index, (board, block, score) in enumerate(games):
+            rows = tuple(board)
+            falling = block_cells(block, width, height)
+            last = self.drawn[index]
+            if last is None:
+                # The background shows an empty board, so only the filled cells are drawn
+                changed = {(x, y): value for y, row in enumerate(rows) for x, value in enumerate(row) if value}
+            else:
+                last_rows, last_falling = last
+                if rows == last_rows and falling == last_falling and score == self.scores[index]:
+                    continue
+                changed = {}
+                for y, row in enumerate(rows):
+                    old = last_rows[y]
+                    if row is not old and row != old:
+                        for x, value in enumerate(row):
+                            if value != old[x]:
+                                changed[x, y] = value
+                # Uncover the cells under the tetrominoe, unless it is still there
+                for x, y, _ in last_falling:
+                    changed[x, y] = rows[y][x]
+            for x, y, value in falling:
+                changed[x, y] = value
+            self.drawn[index] = (rows, falling)
+
+            ox, oy = self.origins[index]
+            for (x, y), value in changed.items():
+                position = (ox + x * cell, oy + y * cell)
+                if value:
+                    blits.append((tiles[value], position))
+                else:
+                    blits.append((background, position, (position[0], position[1], cell, cell)))
+            if score != self.scores[index]:
+                label = self.labels[index]
+                blits.append((background, label, label))
+                blits.append((self.font.render(str(score), True, white), label))
+                self.scores[index] = score
+            dirty.append(self.areas[index])
+        screen.blits(blits, doreturn=False)
+        return dirty
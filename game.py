@@ -0,0 +1,259 @@
+"""
+Headless Tetris Engine
+This module holds the complete game state and rules, independent of any display. The interactive game in board.py
+is a thin frontend that translates pygame events into actions for a GameState, while tools, tests and bots can
+drive a GameState directly as fast as the CPU allows.
+Modules:
+    - bitboard: Custom module for the bitmask board representation.
+    - tetrominoe: Custom module for tetrominoe shapes and operations.
+    - generator: Custom module for the seeded stream of tetrominoes.
+    - collections: Provides the deque holding the block queue.
+    - random: Picks a seed for games started without one.
+    - zobrist: Custom module for the Zobrist keys of the board and the current block.
+Global Variables:
+    - LEFT, RIGHT, DOWN, ROTATE, RELEASE_DOWN, HARD_DROP: Actions accepted by GameState.step.
+Classes:
+    - GameState: The board, block queue, current block and score of a single game.
+    - Snapshot: The saved state of a game, to be restored with GameState.restore.
+"""
+import collections
+import random
+import bitboard
+import generator
+import tetrominoe
+import zobrist
+
+# Actions understood by GameState.step
+LEFT = tetrominoe.LEFT
+RIGHT = tetrominoe.RIGHT
+DOWN = tetrominoe.DOWN
+ROTATE = 4
+RELEASE_DOWN = 5
+HARD_DROP = 6
+
+# The board and generator snapshots share their data with the game; blocks are saved as (shape, rotation, x, y)
+Snapshot = collections.namedtuple('Snapshot', 'board generator block queue score down lines pieces ticks lost '
+                                              'filled_rows garbage')
+
+class GameState:
+    """
+    The complete state of one game of Tetris.
+
+    The state only changes through step() (player input) and tick() (gravity), so a frontend decides how
+    often those are called. The changed flag is set whenever something visible changes, and a frontend
+    may reset it after drawing. With auto_clear disabled, filled rows stay on the board after a landing until
+    clear_filled_rows() is called, which lets a frontend animate them first.
+
+    Args:
+        seed (int): Seed for the block generator, or None to pick a random seed. The seed is kept in the
+            seed attribute so the game can be reproduced.
+        auto_clear (bool): Whether filled rows are removed as soon as a block lands.
+        mode (str): The mode of the block generator, generator.RANDOM or generator.BAG.
+        pieces (PieceGenerator): A block generator to use instead of creating one from seed and mode.
+        width (int): The number of columns of the board.
+        height (int): The number of rows of the board.
+    """
+    def __init__(self, seed=None, auto_clear=True, mode=generator.RANDOM, pieces=None, width=bitboard.WIDTH,
+                 height=bitboard.HEIGHT):
+        if seed is None and pieces is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.generator = pieces if pieces is not None else generator.PieceGenerator(seed, mode)
+        self.mode = self.generator.mode
+        self.auto_clear = auto_clear
+        self.board = bitboard.Board(width, height)
+        self.block_queue = collections.deque()
+        self.score = 0
+        self.down = 0
+        self.lines = 0
+        self.pieces = 0
+        self.ticks = 0
+        self.lost = False
+        self.filled_rows = []
+        self.garbage = []
+        self.changed = True
+        self.fill_block_queue()
+        self.block = self.new_block()
+
+    def get_random_block(self):
+        # Take the next block from the block generator
+        return self.generator.next()
+
+    def fill_block_queue(self):
+        # Fill the block queue until it holds at least 3 blocks
+        while len(self.block_queue) < 3:
+            self.block_queue.append(self.get_random_block())
+
+    def new_block(self):
+        # Add a new block to the queue and return the next block to be played
+        self.block_queue.append(self.get_random_block())
+        self.pieces += 1
+        block = self.block_queue.popleft()
+        # Blocks are generated for the default width; move them to the spawn column of this board
+        block.position[0] = tetrominoe.spawn_column(block.shape, self.board.width)
+        return block
+
+    def check_filled_rows(self, rows=None):
+        # Find the filled rows among the given rows (all rows by default), bottom row first, and add their score
+        filled_rows = self.board.filled_rows(rows)
+        match len(filled_rows):
+            case 1:
+                self.score += 40
+            case 2:
+                self.score += 100
+            case 3:
+                self.score += 300
+            case 4:
+                self.score += 1200
+        self.lines += len(filled_rows)
+        return filled_rows
+
+    def key(self):
+        # Return the Zobrist hash of the board together with the shape, rotation and position of the current block
+        block = self.block
+        if block is None:
+            return self.board.hash
+        return self.board.hash ^ zobrist.piece_key(block.shape, block.rotation, block.position[0], block.position[1])
+
+    def snapshot(self):
+        """
+        Saves the state of the game, for undo, rewinding or searching ahead. The rows of the board are shared
+        with the snapshot rather than copied, so a snapshot is cheap to take and to keep.
+
+        Returns:
+            Snapshot: The saved state.
+        """
+        block = self.block
+        return Snapshot(self.board.snapshot(), self.generator.snapshot(),
+                        (block.shape, block.rotation, *block.position) if block is not None else None,
+                        tuple(block.shape for block in self.block_queue), self.score, self.down, self.lines,
+                        self.pieces, self.ticks, self.lost, tuple(self.filled_rows), tuple(self.garbage))
+
+    def restore(self, snapshot):
+        """
+        Returns the game to a saved state.
+
+        Args:
+            snapshot (Snapshot): A state saved by snapshot() of this game.
+        """
+        self.board.restore(snapshot.board)
+        self.generator.restore(snapshot.generator)
+        if snapshot.block is None:
+            self.block = None
+        else:
+            shape, rotation, x, y = snapshot.block
+            self.block = tetrominoe.Tetrominoe(shape, [x, y], rotation)
+        self.block_queue = collections.deque(tetrominoe.Tetrominoe(shape, [4, 0], 1) for shape in snapshot.queue)
+        self.score = snapshot.score
+        self.down = snapshot.down
+        self.lines = snapshot.lines
+        self.pieces = snapshot.pieces
+        self.ticks = snapshot.ticks
+        self.lost = snapshot.lost
+        self.filled_rows = list(snapshot.filled_rows)
+        self.garbage = list(snapshot.garbage)
+        self.changed = True
+
+    def landing_row(self):
+        # Return the row the current block would land in if dropped, or None without a block
+        block = self.block
+        if block is None:
+            return None
+        return block.position[1] + block.drop_distance(self.board)
+
+    def receive_garbage(self, count, hole):
+        # Queue garbage rows from an opponent; they are raised before the next block spawns
+        self.garbage.append((count, hole))
+
+    def remove_rows(self, rows):
+        # Remove the given rows from the board and shift the rows above down
+        self.board.remove_rows(rows)
+
+    def is_lost(self):
+        # The game is lost once a block sits in the top row
+        return self.board.rows[0] != 0
+
+    def step(self, action):
+        """
+        Applies one player action to the current block.
+
+        Args:
+            action (int): One of LEFT, RIGHT, DOWN, ROTATE, RELEASE_DOWN or HARD_DROP. HARD_DROP moves the
+                block straight to its landing row and locks it at once, scoring one point per row like DOWN.
+
+        Returns:
+            bool: True if the action was applied.
+        """
+        block = self.block
+        if self.lost or self.filled_rows:
+            return False
+        if action == ROTATE:
+            if block.rotate(self.board):
+                self.changed = True
+        elif action == RELEASE_DOWN:
+            if block.position[1] < self.board.height - 3:
+                self.down = 0
+        elif action == HARD_DROP:
+            distance = block.drop_distance(self.board)
+            block.position[1] += distance
+            self.down += distance
+            self.changed = True
+            self.lock()
+        else:
+            if block.move(action, self.board):
+                self.changed = True
+            if action == DOWN:
+                self.down += 1
+        return True
+
+    def tick(self):
+        """
+        Advances gravity by one row, landing the current block if it cannot fall any further.
+
+        Returns:
+            bool: True if the current block landed.
+        """
+        if self.lost or self.filled_rows:
+            return False
+        self.ticks += 1
+        self.changed = True
+        block = self.block
+        if not block.is_obstructed_down(self.board):
+            block.position[1] += 1
+            return False
+        self.lock()
+        return True
+
+    def lock(self):
+        # Land the current block, score it and bring in the next block. Only the rows
+        # covered by the block can have been filled by it.
+        block = self.block
+        block.land(self.board)
+        self.score += self.down
+        self.down = 0
+        y = block.position[1]
+        self.filled_rows = self.check_filled_rows(range(y + block.state.top, y + block.state.bottom + 1))
+        if self.auto_clear:
+            self.clear_filled_rows()
+        elif self.filled_rows:
+            self.block = None
+        else:
+            self.spawn()
+
+    def clear_filled_rows(self):
+        # Remove the pending filled rows and continue with the next block
+        self.remove_rows(self.filled_rows)
+        self.filled_rows = []
+        self.changed = True
+        self.spawn()
+
+    def spawn(self):
+        # Raise the garbage received meanwhile, then bring in the next block unless the landing ended the game
+        if self.garbage:
+            for count, hole in self.garbage:
+                self.board.add_garbage(count, hole)
+            self.garbage.clear()
+        if self.is_lost():
+            self.lost = True
+        else:
+            self.block = self.new_block()
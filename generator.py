@@ -0,0 +1,125 @@
+"""
+Seeded Piece Generator
+This module produces the stream of tetrominoes of a game. The stream depends only on the seed and the mode, so a game
+can be reproduced exactly, and long sequences can be generated in bulk ahead of time. The pieces it hands out are
+lightweight Tetrominoe instances that share the precomputed orientation tables of their shape.
+Every generated shape is kept in a log of one byte per shape, and the stream is read from the log. A snapshot is
+therefore only the position of the next shape in the log: restoring it rewinds the position, and the shapes after
+it are read from the log again instead of being drawn from a restored random state.
+Modules:
+    - array: Compact arrays of shape identifiers.
+    - random: Implements pseudo-random number generators for various distributions.
+    - tetrominoe: Custom module for tetrominoe shapes and operations.
+Global Variables:
+    - RANDOM: Mode picking every shape at random, but never the same shape twice in a row.
+    - BAG: Mode dealing all seven shapes in a random order before dealing them again.
+Classes:
+    - PieceGenerator: A seeded stream of tetrominoes.
+"""
+import array
+import random
+import tetrominoe
+
+RANDOM = 'random'
+BAG = 'bag'
+
+class PieceGenerator:
+    """
+    A seeded stream of tetrominoes.
+
+    Args:
+        seed: Seed of the stream, or None for an unpredictable stream.
+        mode (str): RANDOM or BAG.
+    """
+    def __init__(self, seed=None, mode=RANDOM):
+        if mode not in (RANDOM, BAG):
+            raise ValueError(f'unknown piece generator mode: {mode}')
+        self.rng = random.Random(seed)
+        self.mode = mode
+        self.shapes = tuple(tetrominoe.SHAPES)
+        self.last = None
+        self.bag = []
+        # Every shape generated so far, and the index in it of the next shape of the stream
+        self.log = array.array('B')
+        self.position = 0
+
+    def generate_shape(self):
+        # Draw the next shape from the random number generator
+        if self.mode == BAG:
+            if not self.bag:
+                self.bag = list(self.shapes)
+                self.rng.shuffle(self.bag)
+            shape = self.bag.pop()
+        elif self.last is None:
+            shape = self.shapes[self.rng.randrange(len(self.shapes))]
+        else:
+            # Pick one of the other shapes directly instead of rejecting repeats
+            index = self.rng.randrange(len(self.shapes) - 1)
+            shape = self.shapes[index]
+            if shape >= self.last:
+                shape = self.shapes[index + 1]
+        self.last = shape
+        self.log.append(shape)
+        return shape
+
+    def next_shape(self):
+        """
+        Returns:
+            int: The next shape of the stream.
+        """
+        position = self.position
+        self.position = position + 1
+        if position < len(self.log):
+            return self.log[position]
+        return self.generate_shape()
+
+    def next(self):
+        """
+        Returns:
+            Tetrominoe: The next tetrominoe of the stream, at its spawn position.
+        """
+        return tetrominoe.Tetrominoe(self.next_shape(), [4, 0], 1)
+
+    def prefetch(self, count):
+        """
+        Generates the next count shapes of the stream ahead of time.
+
+        Args:
+            count (int): The number of shapes to generate.
+        """
+        generate = self.generate_shape
+        for _ in range(self.position + count - len(self.log)):
+            generate()
+
+    def snapshot(self):
+        """
+        Saves the position in the stream. The shapes are kept in the log, so the position is all there is to save.
+
+        Returns:
+            int: The saved position.
+        """
+        return self.position
+
+    def restore(self, snapshot):
+        """
+        Returns to a position saved by snapshot() of this generator.
+
+        Args:
+            snapshot (int): The saved position.
+        """
+        self.position = snapshot
+
+    def sequence(self, count):
+        """
+        Takes the next count shapes of the stream at once.
+
+        Args:
+            count (int): The number of shapes to take.
+
+        Returns:
+            array.array: The shapes as unsigned bytes.
+        """
+        self.prefetch(count)
+        shapes = self.log[self.position:self.position + count]
+        self.position += count
+        return shapes
@@ -0,0 +1,148 @@
+"""
+Multiplayer Load Generator
+Opens many client connections to a server.py instance from a single asyncio event loop, presses random keys on all
+of them at a fixed rate and reconnects each client when its match ends, so the server stays at a constant number of
+sessions. Every received message is decoded, and the message and byte rates are printed periodically. Compare them
+with the ticks per second and busy share printed by the server to find how many sessions it can host.
+Usage:
+    python loadgen.py --clients 2000 --actions 4 --duration 30
+Modules:
+    - asyncio: Runs the connections.
+    - server: Custom module with the wire protocol.
+Classes:
+    - Client: The asyncio protocol of one simulated player.
+    - LoadGenerator: Keeps the clients connected and collects their statistics.
+"""
+import argparse
+import asyncio
+import random
+import game
+import server
+
+class Client(asyncio.Protocol):
+    """
+    One simulated player.
+
+    Args:
+        load (LoadGenerator): The load generator the client reports to.
+    """
+    def __init__(self, load):
+        self.load = load
+        self.transport = None
+        self.buffer = bytearray()
+        self.playing = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.load.clients.add(self)
+
+    def data_received(self, data):
+        load = self.load
+        load.bytes += len(data)
+        self.buffer += data
+        for message in server.decode(self.buffer):
+            kind = message[0]
+            if kind == b'D':
+                load.deltas += 1
+            elif kind == b'S':
+                self.playing = True
+            elif kind == b'E':
+                self.playing = False
+                load.matches += 1
+
+    def connection_lost(self, exc):
+        self.load.clients.discard(self)
+        self.load.reconnect()
+
+class LoadGenerator:
+    """
+    Keeps a number of clients connected to a server and has them press random keys.
+
+    Args:
+        host (str): The address of the server.
+        port (int): The port of the server.
+        clients (int): The number of clients.
+        actions (float): Key presses per second of every playing client.
+    """
+    def __init__(self, host, port, clients, actions):
+        self.host = host
+        self.port = port
+        self.target = clients
+        self.actions = actions
+        self.clients = set()
+        self.connecting = 0
+        self.running = True
+        self.bytes = 0
+        self.deltas = 0
+        self.matches = 0
+        self.rng = random.Random(0)
+
+    def reconnect(self):
+        # Replace a client whose match ended
+        if self.running:
+            asyncio.get_running_loop().create_task(self.connect())
+
+    async def connect(self):
+        self.connecting += 1
+        try:
+            await asyncio.get_running_loop().create_connection(lambda: Client(self), self.host, self.port)
+        finally:
+            self.connecting -= 1
+
+    async def press(self):
+        # Press a random key on every playing client, spread evenly over each interval
+        keys = [bytes((action,)) for action in (game.LEFT, game.RIGHT, game.DOWN, game.ROTATE)]
+        while self.running:
+            clients = [client for client in self.clients if client.playing]
+            batch = max(1, len(clients) // 10)
+            for start in range(0, len(clients), batch):
+                for client in clients[start:start + batch]:
+                    if not client.transport.is_closing():
+                        client.transport.write(self.rng.choice(keys))
+                await asyncio.sleep(1 / self.actions / 10)
+            if not clients:
+                await asyncio.sleep(1 / self.actions)
+
+    async def run(self, duration, report=5.0, ramp=500):
+        """
+        Connects the clients, keeps them playing for a while and prints their statistics.
+
+        Args:
+            duration (float): Seconds to run after all clients were connected.
+            report (float): Seconds between two printed status lines.
+            ramp (int): Clients connected per batch while ramping up.
+        """
+        loop = asyncio.get_running_loop()
+        for start in range(0, self.target, ramp):
+            await asyncio.gather(*(self.connect() for _ in range(min(ramp, self.target - start))))
+        presser = loop.create_task(self.press())
+        begin = loop.time()
+        last = (begin, 0, 0)
+        while loop.time() - begin < duration:
+            await asyncio.sleep(report)
+            now = loop.time()
+            elapsed = now - last[0]
+            print(f'{len(self.clients)} clients, {self.matches} matches ended, '
+                  f'{(self.deltas - last[1]) / elapsed:.0f} deltas/s, '
+                  f'{(self.bytes - last[2]) / elapsed / 1024:.0f} KiB/s in')
+            last = (now, self.deltas, self.bytes)
+        self.running = False
+        presser.cancel()
+        for client in list(self.clients):
+            client.transport.close()
+        await asyncio.sleep(0.1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load a Tetris match server with simulated players.')
+    parser.add_argument('--host', default='127.0.0.1', help='address of the server')
+    parser.add_argument('--port', type=int, default=7777, help='port of the server')
+    parser.add_argument('--clients', type=int, default=1000, help='number of simulated players')
+    parser.add_argument('--actions', type=float, default=4.0, help='key presses per second of every player')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run')
+    parser.add_argument('--report', type=float, default=5.0, help='seconds between status lines')
+    args = parser.parse_args(argv)
+    load = LoadGenerator(args.host, args.port, args.clients, args.actions)
+    asyncio.run(load.run(args.duration, args.report))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Placement Perft
+Counts the boards reachable from a board with a given sequence of tetrominoes, the way chess engines count move
+paths with perft to validate their move generation. After every piece the distinct boards are counted, where
+boards reached by different placement orders are the same board, and the number of placement sequences that
+lead to a board after the last piece is counted too.
+Placements come from bot.Bot, so the counts exercise the movement, rotation and kick rules of the game. Boards are
+identified by their Zobrist hash, and the sequence count is memoized in a transposition table, so every board is
+only expanded once however many sequences reach it. Running with --no-cache shows how much work that saves.
+Usage:
+    python perft.py --depth 3 --pieces TIO
+    python perft.py --depth 4 --seed 7 --board board.txt
+Modules:
+    - argparse: Parses the command line.
+    - bot: Custom module enumerating the placements of a tetrominoe.
+    - generator: Custom module for the seeded stream of tetrominoes.
+    - zobrist: Custom module for the Zobrist hashes and the transposition table.
+Global Variables:
+    - SHAPE_NAMES: The shape of every tetrominoe letter.
+Functions:
+    - parse_board(text, width, height): Reads a board drawn with '.' and '#'.
+    - parse_pieces(text): Reads a sequence of tetrominoe letters.
+    - distinct(rows, shapes, depth): Counts the distinct boards after every piece.
+    - nodes(rows, shapes, depth): Counts the placement sequences of a given length.
+"""
+import argparse
+import sys
+import time
+import bitboard
+import bot
+import generator
+import tetrominoe
+import zobrist
+
+SHAPE_NAMES = {'O': 1, 'L': 2, 'J': 3, 'S': 4, 'Z': 5, 'T': 6, 'I': 7}
+
+def parse_board(text, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    """
+    Reads a board drawn with one line per row, '.' for an empty cell and any other character for a filled
+    one. The drawing is aligned to the bottom of the board.
+
+    Args:
+        text (str): The drawing.
+        width (int): The number of columns of the board.
+        height (int): The number of rows of the board.
+
+    Returns:
+        tuple of int: The row masks of the board.
+    """
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) > height or any(len(line) != width for line in lines):
+        raise ValueError(f'a board has at most {height} rows of {width} cells')
+    rows = [0] * (height - len(lines))
+    for line in lines:
+        rows.append(sum(1 << x for x, cell in enumerate(line) if cell != '.'))
+    return tuple(rows)
+
+def parse_pieces(text):
+    """
+    Args:
+        text (str): Tetrominoe letters such as 'TIOL', or their shape numbers.
+
+    Returns:
+        list of int: The shapes.
+    """
+    shapes = []
+    for letter in text.upper():
+        if letter in SHAPE_NAMES:
+            shapes.append(SHAPE_NAMES[letter])
+        elif letter.isdigit() and 1 <= int(letter) <= 7:
+            shapes.append(int(letter))
+        else:
+            raise ValueError(f'unknown tetrominoe: {letter}')
+    return shapes
+
+def playable(rows, shape, width):
+    # Check if the game goes on with the given block, which spawns unless the top row is filled
+    return rows[0] == 0 and bot.fits(rows, tetrominoe.ORIENTATIONS[shape][0], tetrominoe.spawn_column(shape, width), 0, width)
+
+def distinct(rows, shapes, depth, searcher=None):
+    """
+    Counts the distinct boards reachable after every piece.
+
+    Args:
+        rows (tuple of int): The row masks of the starting board.
+        shapes (list of int): The shapes of the pieces, in order.
+        depth (int): The number of pieces played.
+        searcher (Bot): The bot enumerating the placements.
+
+    Returns:
+        list of int: The number of distinct boards after 0 to depth pieces.
+    """
+    searcher = searcher or bot.Bot()
+    level = {zobrist.board_hash(rows): rows}
+    counts = [1]
+    for shape in shapes[:depth]:
+        following = {}
+        for key, board in level.items():
+            if playable(board, shape, searcher.width):
+                for placement in searcher.placements(board, shape, key=key):
+                    following.setdefault(placement.key, placement.rows)
+        level = following
+        counts.append(len(level))
+    return counts
+
+def nodes(rows, shapes, depth, searcher=None, table=None):
+    """
+    Counts the sequences of placements of the given pieces.
+
+    Args:
+        rows (tuple of int): The row masks of the starting board.
+        shapes (list of int): The shapes of the pieces, in order.
+        depth (int): The number of pieces played.
+        searcher (Bot): The bot enumerating the placements.
+        table (TranspositionTable): Memoizes the count of every (board, piece index); None disables memoizing.
+
+    Returns:
+        int: The number of placement sequences of length depth.
+    """
+    searcher = searcher or bot.Bot()
+
+    def count(rows, key, index):
+        if index == depth:
+            return 1
+        if table is not None:
+            cached = table.get((key, index))
+            if cached is not None:
+                return cached
+        total = 0
+        if playable(rows, shapes[index], searcher.width):
+            for placement in searcher.placements(rows, shapes[index], key=key):
+                total += count(placement.rows, placement.key, index + 1)
+        if table is not None:
+            table.put((key, index), total)
+        return total
+
+    return count(rows, zobrist.board_hash(rows), 0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count the boards reachable with a sequence of tetrominoes.')
+    parser.add_argument('--depth', type=int, default=3, help='number of pieces to play')
+    parser.add_argument('--pieces', help="tetrominoe letters such as 'TIOL' (default: drawn from --seed)")
+    parser.add_argument('--seed', type=int, default=0, help='seed of the block generator if --pieces is not given')
+    parser.add_argument('--mode', choices=(generator.RANDOM, generator.BAG), default=generator.RANDOM,
+                        help='block generator mode if --pieces is not given')
+    parser.add_argument('--board', metavar='FILE', help="starting board drawn with '.' and '#' (default: empty)")
+    parser.add_argument('--width', type=int, default=bitboard.WIDTH, help='columns of the board')
+    parser.add_argument('--height', type=int, default=bitboard.HEIGHT, help='rows of the board')
+    parser.add_argument('--table-size', type=int, default=1 << 20, help='entries of the transposition table')
+    parser.add_argument('--no-cache', action='store_true', help='count without caching, to measure what it saves')
+    args = parser.parse_args(argv)
+    if args.pieces:
+        shapes = parse_pieces(args.pieces)
+    else:
+        shapes = list(generator.PieceGenerator(args.seed, args.mode).sequence(args.depth))
+    if len(shapes) < args.depth:
+        parser.error(f'--pieces needs at least {args.depth} tetrominoes')
+    rows = (0,) * args.height
+    if args.board:
+        with open(args.board) as file:
+            rows = parse_board(file.read(), args.width, args.height)
+    names = {shape: name for name, shape in SHAPE_NAMES.items()}
+    print(f"pieces {''.join(names[shape] for shape in shapes[:args.depth])}")
+
+    start = time.perf_counter()
+    if args.no_cache:
+        searcher = bot.Bot(cache_size=0, width=args.width)
+        table = None
+    else:
+        searcher = bot.Bot(cache_size=args.table_size, width=args.width)
+        table = zobrist.TranspositionTable(args.table_size)
+        for depth, count in enumerate(distinct(rows, shapes, args.depth, searcher)):
+            print(f'depth {depth}: {count} distinct boards')
+    total = nodes(rows, shapes, args.depth, searcher, table)
+    elapsed = time.perf_counter() - start
+    cache = searcher.placement_cache
+    print(f'depth {args.depth}: {total} placement sequences')
+    print(f'{cache.misses} placement searches, {cache.hits} cached, '
+          f'{table.hits if table is not None else 0} transpositions in {elapsed:.2f} s')
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Main Loop Profiler
+This module times the phases of the main loop, such as event handling, gravity and drawing, with the
+high-resolution performance counter. The most recent timings of every phase are kept in fixed-size ring buffers, so
+profiling can stay on for a whole session without growing, and can be summarized for an on-screen overlay or
+exported to CSV or JSON.
+Modules:
+    - array: Provides the storage of the ring buffers.
+    - csv, json: Write the exported timings.
+    - time: Provides the performance counter.
+Classes:
+    - RingBuffer: A fixed-size buffer of the most recent timings.
+    - Profiler: The timings of the phases and frames of the main loop.
+"""
+import array
+import csv
+import json
+import time
+
+class RingBuffer:
+    """
+    Keeps the most recent values, overwriting the oldest once it is full.
+
+    Args:
+        size (int): The number of values kept.
+    """
+    def __init__(self, size):
+        self.values = array.array('q', bytes(8 * size))
+        self.size = size
+        self.index = 0
+        self.count = 0
+
+    def append(self, value):
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def latest(self):
+        # Return the kept values, oldest first
+        if self.count < self.size:
+            return self.values[:self.count].tolist()
+        return self.values[self.index:].tolist() + self.values[:self.index].tolist()
+
+def percentile(values, q):
+    # Return the q-quantile of a sorted list by the nearest-rank method
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+class Profiler:
+    """
+    Records how long every phase of each frame takes.
+
+    A frame is started with begin_frame() and ended with end_frame(). Within a frame, every phase is
+    timed by calling start() before it and stop(name, started) after it. Timings are in nanoseconds.
+
+    Args:
+        size (int): The number of frames kept per ring buffer.
+        clock: Function returning the current time in nanoseconds.
+    """
+    def __init__(self, size=600, clock=time.perf_counter_ns):
+        self.size = size
+        self.clock = clock
+        self.phases = {}
+        self.frames = RingBuffer(size)
+        self.frame_start = None
+        self.previous_start = None
+        self.intervals = RingBuffer(size)
+
+    def start(self):
+        return self.clock()
+
+    def stop(self, name, started):
+        buffer = self.phases.get(name)
+        if buffer is None:
+            buffer = self.phases[name] = RingBuffer(self.size)
+        buffer.append(self.clock() - started)
+
+    def begin_frame(self):
+        now = self.clock()
+        if self.previous_start is not None:
+            self.intervals.append(now - self.previous_start)
+        self.previous_start = now
+        self.frame_start = now
+
+    def end_frame(self):
+        if self.frame_start is not None:
+            self.frames.append(self.clock() - self.frame_start)
+            self.frame_start = None
+
+    def summary(self):
+        """
+        Returns:
+            dict: The loop rate, the p50 and p99 work time per frame, and the mean and p99 time of every
+                phase, all in milliseconds except the rate.
+        """
+        frames = sorted(self.frames.latest())
+        intervals = self.intervals.latest()
+        result = {
+            'fps': len(intervals) * 1e9 / sum(intervals) if intervals else 0.0,
+            'frame_p50': percentile(frames, 0.5) / 1e6,
+            'frame_p99': percentile(frames, 0.99) / 1e6,
+            'phases': {},
+        }
+        # Copied first, since another thread may be adding phases
+        for name, buffer in list(self.phases.items()):
+            values = sorted(buffer.latest())
+            result['phases'][name] = {
+                'mean': sum(values) / len(values) / 1e6 if values else 0.0,
+                'p99': percentile(values, 0.99) / 1e6,
+            }
+        return result
+
+    def overlay_lines(self):
+        """
+        Returns:
+            list of str: The summary formatted as lines of text for an overlay.
+        """
+        summary = self.summary()
+        lines = [f"{summary['fps']:.0f} loops/s  p50 {summary['frame_p50']:.2f}  p99 {summary['frame_p99']:.2f} ms"]
+        for name, phase in summary['phases'].items():
+            lines.append(f"{name:<9} {phase['mean']:.3f}  p99 {phase['p99']:.3f} ms")
+        return lines
+
+    def export(self, path):
+        """
+        Writes the recorded timings to a file, as JSON if the path ends with '.json' and as CSV otherwise.
+        The CSV has one row per phase and frame, the JSON holds the summary and the raw timings.
+
+        Args:
+            path (str): The path of the file.
+        """
+        columns = {'frame': self.frames.latest()}
+        for name, buffer in self.phases.items():
+            columns[name] = buffer.latest()
+        if path.endswith('.json'):
+            with open(path, 'w') as file:
+                json.dump({'summary': self.summary(), 'timings_ns': columns}, file, indent=2)
+            return
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['phase', 'index', 'ns'])
+            for name, values in columns.items():
+                for index, value in enumerate(values):
+                    writer.writerow([name, index, value])
@@ -0,0 +1,232 @@
+"""
+Replay Recording and Playback
+This module records games as the seed of their block generator plus the player actions, and plays them back headless
+as fast as the CPU allows, checking that the replayed game ends with the recorded board and score.
+
+A replay is a fixed header followed by the final board and the action records. Every record stores the number of
+gravity ticks since the previous record and the action in a single unsigned LEB128 varint, (delta << 3) | action,
+so a typical record takes one byte. An archive is simply replays written one after another; ReplayArchive maps an
+archive into memory and reads replays from it without loading the whole file.
+Usage:
+    python replay.py ARCHIVE...
+Modules:
+    - mmap: Maps archives into memory.
+    - struct: Packs the replay header.
+    - game: Custom module holding the headless game state and rules.
+    - generator: Custom module for the seeded stream of tetrominoes.
+Global Variables:
+    - HEADER: The struct of the replay header.
+Classes:
+    - ReplayError: Raised for malformed replays and replays that do not reproduce.
+    - Recorder: Drives a GameState and records what happened to it.
+    - Replay: A decoded replay header with its undecoded records.
+    - ReplayArchive: A memory-mapped file of replays.
+Functions:
+    - play(replay): Replays a game headless and verifies its outcome.
+"""
+import mmap
+import struct
+import sys
+import time
+import game
+import generator
+
+# magic, version, mode, width, height, seed, ticks, score, lines, record count, record bytes
+HEADER = struct.Struct('<4sBBBHqIIIII')
+MAGIC = b'TRPL'
+VERSION = 1
+MODES = (generator.RANDOM, generator.BAG)
+
+class ReplayError(ValueError):
+    pass
+
+def pack_rows(rows, width):
+    # Pack the row masks of a board into bytes
+    size = (width + 7) // 8
+    return b''.join(row.to_bytes(size, 'little') for row in rows)
+
+def unpack_rows(data, width, height):
+    # Unpack the row masks of a board from bytes
+    size = (width + 7) // 8
+    return [int.from_bytes(data[y * size:(y + 1) * size], 'little') for y in range(height)]
+
+class Recorder:
+    """
+    Drives a GameState like a frontend would, recording every applied action.
+
+    Args:
+        state (GameState): The game to record. It must have been created from a seed.
+    """
+    def __init__(self, state):
+        if not isinstance(state.seed, int):
+            raise ReplayError('only games created from an integer seed can be recorded')
+        self.state = state
+        self.records = bytearray()
+        self.count = 0
+        self.last_tick = state.ticks
+
+    def step(self, action):
+        # Apply an action to the game and record it if it was applied
+        applied = self.state.step(action)
+        if applied:
+            value = (self.state.ticks - self.last_tick) << 3 | action
+            while value > 0x7F:
+                self.records.append(value & 0x7F | 0x80)
+                value >>= 7
+            self.records.append(value)
+            self.count += 1
+            self.last_tick = self.state.ticks
+        return applied
+
+    def tick(self):
+        # Advance gravity; ticks are implied by the tick counter stored in the records
+        return self.state.tick()
+
+    def snapshot(self):
+        # Save the game together with the length of the recording
+        return self.state.snapshot(), len(self.records), self.count, self.last_tick
+
+    def restore(self, snapshot):
+        # Rewind the game and drop the records made since the snapshot, so the replay follows the rewound game
+        state, size, self.count, self.last_tick = snapshot
+        self.state.restore(state)
+        del self.records[size:]
+
+    def to_bytes(self):
+        """
+        Returns:
+            bytes: The replay of the game so far.
+        """
+        state = self.state
+        board = state.board
+        header = HEADER.pack(MAGIC, VERSION, MODES.index(state.mode), len(board[0]), len(board), state.seed,
+                             state.ticks, state.score, state.lines, self.count, len(self.records))
+        return header + pack_rows(board.rows, len(board[0])) + bytes(self.records)
+
+    def save(self, path, append=True):
+        """
+        Writes the replay to a file, appending it to the archive there by default.
+
+        Args:
+            path (str): The path of the file.
+            append (bool): Whether to append to an existing archive instead of overwriting it.
+        """
+        with open(path, 'ab' if append else 'wb') as file:
+            file.write(self.to_bytes())
+
+class Replay:
+    """
+    A replay decoded from a buffer, without decoding its records yet.
+
+    Args:
+        buffer: A bytes-like object holding the replay.
+        offset (int): The position of the replay in the buffer.
+    """
+    def __init__(self, buffer, offset=0):
+        if len(buffer) - offset < HEADER.size:
+            raise ReplayError(f'truncated replay header at offset {offset}')
+        (magic, version, mode, self.width, self.height, self.seed, self.ticks, self.score,
+         self.lines, self.count, length) = HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ReplayError(f'not a replay at offset {offset}')
+        self.mode = MODES[mode]
+        start = offset + HEADER.size
+        board_size = self.height * ((self.width + 7) // 8)
+        self.rows = unpack_rows(buffer[start:start + board_size], self.width, self.height)
+        start += board_size
+        self.data = buffer[start:start + length]
+        if len(self.data) != length:
+            raise ReplayError(f'truncated replay records at offset {offset}')
+        self.size = start + length - offset
+
+    def records(self):
+        """
+        Yields:
+            tuple of int: The (tick, action) of every record.
+        """
+        tick = 0
+        value = 0
+        shift = 0
+        for byte in self.data:
+            value |= (byte & 0x7F) << shift
+            if byte & 0x80:
+                shift += 7
+                continue
+            tick += value >> 3
+            yield tick, value & 7
+            value = 0
+            shift = 0
+
+class ReplayArchive:
+    """
+    A file of replays mapped into memory. Iterating the archive yields its Replay objects.
+
+    Args:
+        path (str): The path of the archive.
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __iter__(self):
+        offset = 0
+        while offset < len(self.buffer):
+            replay = Replay(self.buffer, offset)
+            yield replay
+            offset += replay.size
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def play(replay):
+    """
+    Replays a game headless and checks that it ends with the recorded board and score.
+
+    Args:
+        replay (Replay): The replay to play.
+
+    Returns:
+        GameState: The replayed game.
+
+    Raises:
+        ReplayError: If the replayed game does not match the recording.
+    """
+    state = game.GameState(replay.seed, mode=replay.mode, width=replay.width, height=replay.height)
+    for tick, action in replay.records():
+        while state.ticks < tick and not state.lost:
+            state.tick()
+        if not state.step(action):
+            raise ReplayError(f'action {action} at tick {tick} could not be applied')
+    while state.ticks < replay.ticks and not state.lost:
+        state.tick()
+    if state.score != replay.score or state.lines != replay.lines or list(state.board.rows) != replay.rows:
+        raise ReplayError(f'replay of seed {replay.seed} diverged: score {state.score} instead of {replay.score}')
+    return state
+
+def main(paths):
+    count = 0
+    failures = 0
+    ticks = 0
+    start = time.perf_counter()
+    for path in paths:
+        with ReplayArchive(path) as archive:
+            for replay in archive:
+                count += 1
+                try:
+                    ticks += play(replay).ticks
+                except ReplayError as error:
+                    failures += 1
+                    print(f'{path}: {error}')
+    elapsed = time.perf_counter() - start
+    print(f'{count} replays, {failures} failed, {ticks / max(elapsed, 1e-9):.0f} ticks/s')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
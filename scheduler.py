@@ -0,0 +1,92 @@
+"""
+Fixed-Timestep Scheduler
+This module paces the main loop: the simulation advances in fixed ticks that do not depend on how fast the machine
+is, rendering is capped to a maximum frame rate and skipped when nothing changed, and the loop sleeps until the
+next deadline instead of spinning.
+Modules:
+    - time: Provides the clock and sleep used for pacing.
+Classes:
+    - Scheduler: Decides when to tick and when to render, and measures the achieved rates.
+"""
+import time
+
+class Scheduler:
+    """
+    Paces a fixed-timestep loop.
+
+    Each pass of the loop asks due_ticks() how many simulation ticks to run, asks frame_due() whether to
+    render, and then calls sleep(). If the loop falls behind by more than max_ticks ticks, the missed time
+    is dropped rather than simulated in a burst.
+
+    Args:
+        tick_rate (float): Simulation ticks per second.
+        frame_rate (float): Maximum frames rendered per second.
+        max_ticks (int): Maximum ticks run by a single call to due_ticks().
+        clock: Function returning the current time in seconds.
+        sleeper: Function sleeping for a number of seconds.
+    """
+    def __init__(self, tick_rate=60, frame_rate=60, max_ticks=5, clock=time.perf_counter, sleeper=time.sleep):
+        self.tick_interval = 1 / tick_rate
+        self.frame_interval = 1 / frame_rate
+        self.max_ticks = max_ticks
+        self.clock = clock
+        self.sleeper = sleeper
+        now = clock()
+        self.next_tick = now
+        self.next_frame = now
+        self.ticks = 0
+        self.frames = 0
+        self.tick_rate = 0.0
+        self.frame_rate = 0.0
+        self.window_start = now
+        self.window_ticks = 0
+        self.window_frames = 0
+
+    def due_ticks(self):
+        """
+        Returns:
+            int: The number of simulation ticks to run now.
+        """
+        now = self.clock()
+        count = 0
+        while now >= self.next_tick and count < self.max_ticks:
+            self.next_tick += self.tick_interval
+            count += 1
+        if now >= self.next_tick:
+            self.next_tick = now + self.tick_interval
+        self.ticks += count
+        self.window_ticks += count
+        self.measure(now)
+        return count
+
+    def frame_due(self, changed=True):
+        """
+        Args:
+            changed (bool): Whether anything changed since the last rendered frame.
+
+        Returns:
+            bool: True if a frame should be rendered now.
+        """
+        now = self.clock()
+        if not changed or now < self.next_frame:
+            return False
+        self.next_frame = max(self.next_frame + self.frame_interval, now)
+        self.frames += 1
+        self.window_frames += 1
+        return True
+
+    def measure(self, now):
+        # Update the measured rates about once per second
+        elapsed = now - self.window_start
+        if elapsed >= 1:
+            self.tick_rate = self.window_ticks / elapsed
+            self.frame_rate = self.window_frames / elapsed
+            self.window_start = now
+            self.window_ticks = 0
+            self.window_frames = 0
+
+    def sleep(self):
+        # Sleep until the next tick is due
+        delay = self.next_tick - self.clock()
+        if delay > 0:
+            self.sleeper(delay)
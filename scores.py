@@ -0,0 +1,267 @@
+"""
+Score Store
+This module keeps the results of finished games in a local SQLite database: the seed, policy, score, cleared lines,
+pieces, gravity ticks and duration of every game, along with when it finished. Recording a game only puts it on a
+queue; a background writer thread takes whatever has queued up and inserts it in one transaction, so neither the
+game loop nor a batch run ever waits for the disk, and a burst of results costs one commit instead of one each.
+Leaderboards read the score indexes, so the top games overall or of one policy are found without visiting the
+rest of the table. The per-policy aggregates are kept in a summary table that the writer updates in the same
+transaction as the games, so they cost one row per policy however many games were played.
+The database runs in WAL mode, so leaderboards can be read while the writer is inserting.
+Usage:
+    python simulate.py --games 100000 --policy heuristic --db scores.db
+    python scores.py scores.db --top 10 --policy heuristic
+Modules:
+    - argparse: Parses the command line.
+    - collections: Provides the namedtuple of games.
+    - queue: Passes the results to the writer thread.
+    - sqlite3: Stores the games.
+    - threading: Runs the writer.
+    - time: Stamps the games with the time they finished.
+Global Variables:
+    - SCHEMA: The tables and indexes of the database.
+Classes:
+    - Game: A finished game, as read back from the database.
+    - ScoreStore: Records games in the background and reads the leaderboards.
+"""
+import argparse
+import collections
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    finished REAL NOT NULL,
+    policy TEXT NOT NULL,
+    seed INTEGER,
+    score INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    pieces INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS games_score ON games (score DESC);
+CREATE INDEX IF NOT EXISTS games_policy_score ON games (policy, score DESC);
+CREATE TABLE IF NOT EXISTS policies (
+    policy TEXT PRIMARY KEY,
+    games INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    pieces INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    best INTEGER NOT NULL
+);
+'''
+
+INSERT = ('INSERT INTO games (finished, policy, seed, score, lines, pieces, ticks, duration) '
+          'VALUES (?, ?, ?, ?, ?, ?, ?, ?)')
+
+# Add the totals of a batch to the summary row of a policy
+UPSERT = '''
+INSERT INTO policies (policy, games, score, lines, pieces, duration, best) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (policy) DO UPDATE SET
+    games = games + excluded.games,
+    score = score + excluded.score,
+    lines = lines + excluded.lines,
+    pieces = pieces + excluded.pieces,
+    duration = duration + excluded.duration,
+    best = max(best, excluded.best)
+'''
+
+Game = collections.namedtuple('Game', 'id finished policy seed score lines pieces ticks duration')
+
+class ScoreStore:
+    """
+    A database of finished games. Games are recorded from any thread without blocking and written by a
+    background thread; leaderboards can be read from any thread.
+
+    Args:
+        path (str): The database file, created if missing.
+        batch_size (int): The most games written in one transaction.
+    """
+    def __init__(self, path, batch_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = queue.Queue()
+        self.error = None
+        self.written = 0
+        # Create the tables before returning, so the leaderboards can be read right away
+        self.reader = self.connect(check_same_thread=False)
+        self.reader.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.writer = threading.Thread(target=self.write, name='score-writer', daemon=True)
+        self.writer.start()
+
+    def connect(self, **kwargs):
+        connection = sqlite3.connect(self.path, **kwargs)
+        connection.execute('PRAGMA journal_mode = WAL')
+        # In WAL mode a crash can lose the last transactions but never corrupts the database
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    def record(self, score, lines, pieces, ticks=0, duration=0.0, seed=None, policy='human'):
+        """
+        Queues a finished game to be written. Never blocks.
+
+        Args:
+            score (int): The final score.
+            lines (int): The number of cleared lines.
+            pieces (int): The number of pieces played.
+            ticks (int): The number of gravity ticks the game lasted.
+            duration (float): The wall clock length of the game in seconds.
+            seed (int): The seed of the game, or None if it cannot be replayed.
+            policy (str): Who played the game: 'human' or the name of a policy.
+        """
+        self.pending.put([(time.time(), policy, seed, score, lines, pieces, ticks, duration)])
+
+    def record_many(self, games, policy):
+        """
+        Queues many finished games of one policy with a single put. Never blocks.
+
+        Args:
+            games (iterable of tuple): The (seed, score, lines, pieces, ticks, duration) of every game.
+            policy (str): The name of the policy that played them.
+        """
+        finished = time.time()
+        self.pending.put([(finished, policy) + tuple(game) for game in games])
+
+    def write(self):
+        # Writer thread: insert whatever has queued up in one transaction, until close() queues None
+        connection = self.connect()
+        pending = self.pending
+        running = True
+        while running:
+            batches = [pending.get()]
+            size = len(batches[0] or ())
+            while size < self.batch_size:
+                try:
+                    batch = pending.get_nowait()
+                except queue.Empty:
+                    break
+                batches.append(batch)
+                size += len(batch or ())
+            rows = [row for batch in batches if batch for row in batch]
+            running = None not in batches
+            try:
+                with connection:
+                    connection.executemany(INSERT, rows)
+                    connection.executemany(UPSERT, summarize(rows))
+                self.written += len(rows)
+            except sqlite3.Error as error:
+                # Keep the first error for flush() and close() to raise, and drop the batch
+                self.error = self.error or error
+            for _ in batches:
+                pending.task_done()
+        connection.close()
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def flush(self):
+        """
+        Waits until every game recorded so far is written.
+
+        Raises:
+            sqlite3.Error: If a batch could not be written.
+        """
+        self.pending.join()
+        self.check()
+
+    def close(self):
+        """
+        Writes the remaining games and stops the writer.
+
+        Raises:
+            sqlite3.Error: If a batch could not be written.
+        """
+        if self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+        self.reader.close()
+        self.check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.reader.execute(sql, parameters).fetchall()
+
+    def leaderboard(self, limit=10, policy=None):
+        """
+        Args:
+            limit (int): The number of games.
+            policy (str): Only rank the games of this policy, or None for all games.
+
+        Returns:
+            list of Game: The games with the highest scores, best first; ties go to the earlier game.
+        """
+        if policy is None:
+            rows = self.query('SELECT * FROM games ORDER BY score DESC, id LIMIT ?', (limit,))
+        else:
+            rows = self.query('SELECT * FROM games WHERE policy = ? ORDER BY score DESC, id LIMIT ?',
+                              (policy, limit))
+        return [Game(*row) for row in rows]
+
+    def policy_stats(self):
+        """
+        Returns:
+            dict: For every policy, its number of games, best score and mean score, lines, pieces and duration.
+        """
+        stats = {}
+        for policy, games, score, lines, pieces, duration, best in self.query('SELECT * FROM policies ORDER BY policy'):
+            stats[policy] = {
+                'games': games,
+                'best': best,
+                'score': score / games,
+                'lines': lines / games,
+                'pieces': pieces / games,
+                'duration': duration / games,
+            }
+        return stats
+
+    def plan(self, sql, parameters=()):
+        # Return SQLite's query plan of a statement, to check that it is served by an index
+        return [row[-1] for row in self.query('EXPLAIN QUERY PLAN ' + sql, parameters)]
+
+def summarize(rows):
+    # Total the games of a batch per policy, as parameters of UPSERT
+    totals = {}
+    for _, policy, _, score, lines, pieces, _, duration in rows:
+        total = totals.get(policy)
+        if total is None:
+            totals[policy] = [policy, 1, score, lines, pieces, duration, score]
+        else:
+            total[1] += 1
+            total[2] += score
+            total[3] += lines
+            total[4] += pieces
+            total[5] += duration
+            total[6] = max(total[6], score)
+    return totals.values()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show the leaderboard and policy statistics of a score database.')
+    parser.add_argument('path', metavar='DB', help='the score database')
+    parser.add_argument('--top', type=int, default=10, help='number of games on the leaderboard')
+    parser.add_argument('--policy', help='only rank the games of this policy')
+    args = parser.parse_args(argv)
+    with ScoreStore(args.path) as store:
+        print(f"{'rank':>4} {'score':>8} {'lines':>6} {'pieces':>7} {'seconds':>8}  policy (seed)")
+        for rank, game in enumerate(store.leaderboard(args.top, args.policy), 1):
+            print(f'{rank:>4} {game.score:>8} {game.lines:>6} {game.pieces:>7} {game.duration:>8.1f}  '
+                  f'{game.policy} ({game.seed})')
+        print()
+        for policy, stats in store.policy_stats().items():
+            print(f"{policy}: {stats['games']} games, best {stats['best']}, mean score {stats['score']:.1f}, "
+                  f"lines {stats['lines']:.1f}, pieces {stats['pieces']:.1f}, {stats['duration']:.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+"""
+Multiplayer Server
+This module hosts head-to-head matches over TCP on a single asyncio event loop. Every connection is paired with the
+next waiting one into a match; both players get the same block sequence, and clearing two or more rows at once
+sends garbage rows to the opponent. All games run on one fixed-timestep ticker, and the sessions are spread over a
+timing wheel with one slot per tick of the gravity interval, so each tick only advances the games whose gravity is
+due instead of visiting every session.
+State goes out as deltas: after every tick, each game that changed sends only its score, its falling block and the
+rows that differ from what its clients last received, to both players of its match. Everything a client should
+receive during a tick is collected in one buffer and written with a single call.
+Protocol:
+    - Client to server: one byte per action, as accepted by GameState.step.
+    - START: 'S', the player index and the seed of the match.
+    - DELTA: 'D', the player index, the server tick, score, lines, the falling block (shape, rotation, x, y) and
+      the number of changed rows, followed by (y, mask) for every changed row. A shape of 0 means no block.
+    - END: 'E' and the index of the winner. The server closes the connection afterwards.
+Usage:
+    python server.py --port 7777
+Modules:
+    - asyncio: Runs the connections and the ticker.
+    - struct: Packs the messages.
+    - bitboard: Custom module for the bitmask board representation.
+    - game: Custom module holding the headless game state and rules.
+    - generator: Custom module for the seeded stream of tetrominoes.
+    - scheduler: Custom module pacing the ticker with a fixed timestep.
+Global Variables:
+    - START, DELTA, ROW, END: The structs of the messages.
+Classes:
+    - Session: A connected player and their game.
+    - Match: Two sessions playing against each other.
+    - Connection: The asyncio protocol of a client connection.
+    - Server: Pairs players, ticks their games and broadcasts the deltas.
+Functions:
+    - decode(buffer): Splits received bytes into messages, for clients.
+"""
+import argparse
+import asyncio
+import random
+import struct
+import time
+import bitboard
+import game
+import generator
+import scheduler
+
+TICK_RATE = 60
+GRAVITY_TICKS = 60
+MAX_BUFFERED = 1 << 20
+
+START = struct.Struct('<cBq')
+DELTA = struct.Struct('<cBIIHBBbbB')
+ROW = struct.Struct('<BH')
+END = struct.Struct('<cB')
+
+ACTIONS = frozenset((game.LEFT, game.RIGHT, game.DOWN, game.ROTATE, game.RELEASE_DOWN, game.HARD_DROP))
+
+def garbage_rows(lines):
+    # The number of garbage rows sent for clearing lines at once
+    return lines if lines >= 4 else lines - 1
+
+def decode(buffer):
+    """
+    Splits the bytes received from the server into messages.
+
+    Args:
+        buffer (bytearray): The received bytes. Decoded messages are removed from it.
+
+    Returns:
+        list of tuple: The messages, as unpacked by their struct, with the changed rows of a delta as a
+            list of (y, mask) appended.
+    """
+    messages = []
+    offset = 0
+    while offset < len(buffer):
+        kind = buffer[offset:offset + 1]
+        if kind == b'D':
+            if len(buffer) - offset < DELTA.size:
+                break
+            message = DELTA.unpack_from(buffer, offset)
+            end = offset + DELTA.size + message[-1] * ROW.size
+            if len(buffer) < end:
+                break
+            rows = [ROW.unpack_from(buffer, at) for at in range(offset + DELTA.size, end, ROW.size)]
+            messages.append(message + (rows,))
+            offset = end
+        elif kind in (b'S', b'E'):
+            size = START.size if kind == b'S' else END.size
+            if len(buffer) - offset < size:
+                break
+            messages.append((START if kind == b'S' else END).unpack_from(buffer, offset))
+            offset += size
+        else:
+            raise ValueError(f'unknown message {kind!r}')
+    del buffer[:offset]
+    return messages
+
+class Session:
+    """
+    A connected player, their game and what their clients last received of it.
+
+    Args:
+        connection (Connection): The connection of the player.
+    """
+    __slots__ = ('connection', 'state', 'match', 'index', 'slot', 'sent_rows', 'sent_block', 'sent_score',
+                 'frame', 'out')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.state = None
+        self.match = None
+        self.index = 0
+        self.slot = 0
+        self.sent_rows = [0] * bitboard.HEIGHT
+        self.sent_block = None
+        self.sent_score = None
+        # Reused for every delta of this game and every batch sent to this client
+        self.frame = bytearray(DELTA.size + bitboard.HEIGHT * ROW.size)
+        self.out = bytearray()
+
+    def encode_delta(self, tick):
+        # Pack the changes since the last delta into self.frame and return its length, or 0 if nothing changed
+        state = self.state
+        block = state.block
+        current = (block.shape, block.rotation, block.position[0], block.position[1]) if block else (0, 0, 0, 0)
+        frame = self.frame
+        count = 0
+        sent = self.sent_rows
+        for y, mask in enumerate(state.board.rows):
+            if sent[y] != mask:
+                ROW.pack_into(frame, DELTA.size + count * ROW.size, y, mask)
+                sent[y] = mask
+                count += 1
+        if not count and current == self.sent_block and state.score == self.sent_score:
+            return 0
+        self.sent_block = current
+        self.sent_score = state.score
+        DELTA.pack_into(frame, 0, b'D', self.index, tick, state.score, state.lines, *current, count)
+        return DELTA.size + count * ROW.size
+
+class Match:
+    """
+    Two sessions playing the same block sequence against each other.
+
+    Args:
+        sessions (tuple of Session): The two players.
+        seed (int): The seed of the block sequence and of the garbage holes.
+    """
+    def __init__(self, sessions, seed):
+        self.sessions = sessions
+        self.seed = seed
+        self.holes = random.Random(seed)
+        for index, session in enumerate(sessions):
+            session.match = self
+            session.index = index
+            session.state = game.GameState(seed, mode=generator.BAG)
+
+    def opponent(self, session):
+        return self.sessions[1 - session.index]
+
+class Connection(asyncio.Protocol):
+    """
+    The protocol of one client connection, forwarding its actions to the server.
+
+    Args:
+        server (Server): The server hosting the connection.
+    """
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.session = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.session = Session(self)
+        self.server.join(self.session)
+
+    def data_received(self, data):
+        self.server.receive(self.session, data)
+
+    def connection_lost(self, exc):
+        self.server.leave(self.session)
+
+class Server:
+    """
+    Hosts matches and runs all their games on one ticker.
+
+    Args:
+        tick_rate (int): Ticks per second.
+        gravity_ticks (int): Ticks between two gravity steps of a game.
+        seed (int): Seed of the match seeds, or None for random matches.
+    """
+    def __init__(self, tick_rate=TICK_RATE, gravity_ticks=GRAVITY_TICKS, seed=None):
+        self.tick_rate = tick_rate
+        self.gravity_ticks = gravity_ticks
+        self.seeds = random.Random(seed)
+        self.waiting = None
+        self.sessions = set()
+        self.wheel = [set() for _ in range(gravity_ticks)]
+        self.next_slot = 0
+        self.dirty = set()
+        self.outgoing = set()
+        # Sessions whose game was lost since the last tick, ended once their last delta is sent
+        self.ended = []
+        self.tick = 0
+        self.matches = 0
+        self.bytes_sent = 0
+        self.busy = 0.0
+
+    def join(self, session):
+        # Pair a new session with the waiting one, or let it wait
+        self.sessions.add(session)
+        if self.waiting is None:
+            self.waiting = session
+            return
+        match = Match((self.waiting, session), self.seeds.getrandbits(63))
+        self.waiting = None
+        self.matches += 1
+        for player in match.sessions:
+            # Spread the games over the timing wheel so gravity is due for a few of them every tick
+            player.slot = self.next_slot
+            self.next_slot = (self.next_slot + 1) % self.gravity_ticks
+            self.wheel[player.slot].add(player)
+            player.out += START.pack(b'S', player.index, match.seed)
+            self.dirty.add(player)
+            self.outgoing.add(player)
+
+    def leave(self, session):
+        # Forget a disconnected session; a running match is won by the opponent
+        self.sessions.discard(session)
+        if self.waiting is session:
+            self.waiting = None
+        if session.match is not None:
+            self.end(session.match, 1 - session.index)
+
+    def receive(self, session, data):
+        # Apply the actions sent by a client
+        if session.match is None:
+            return
+        state = session.state
+        for action in data:
+            if action not in ACTIONS:
+                session.connection.transport.close()
+                return
+            lines = state.lines
+            if state.step(action):
+                self.dirty.add(session)
+                # A hard drop lands the block right away
+                if self.landed(session, lines):
+                    return
+
+    def end(self, match, winner):
+        # Tell both players who won, then disconnect them
+        for session in match.sessions:
+            self.wheel[session.slot].discard(session)
+            self.dirty.discard(session)
+            session.match = None
+            session.out += END.pack(b'E', winner)
+            self.send(session)
+            session.connection.transport.close()
+
+    def landed(self, session, lines):
+        """
+        Applies what a landing means for the match: clearing two or more rows at once sends garbage to the
+        opponent, and a lost game is queued to end the match after the tick.
+
+        Args:
+            session (Session): The session whose block may have landed.
+            lines (int): The cleared lines of the game before the landing.
+
+        Returns:
+            bool: True if the game is lost.
+        """
+        state = session.state
+        cleared = state.lines - lines
+        if cleared >= 2:
+            match = session.match
+            match.opponent(session).state.receive_garbage(garbage_rows(cleared),
+                                                           match.holes.randrange(state.board.width))
+        if state.lost and session not in self.ended:
+            self.ended.append(session)
+        return state.lost
+
+    def send(self, session):
+        # Write everything collected for a client this tick in one call
+        transport = session.connection.transport
+        if transport.is_closing():
+            return
+        transport.write(session.out)
+        self.bytes_sent += len(session.out)
+        session.out.clear()
+        if transport.get_write_buffer_size() > MAX_BUFFERED:
+            # Drop clients that do not keep up instead of buffering without bound
+            transport.close()
+
+    def step(self):
+        """
+        Runs one tick: advances the games whose gravity is due and sends the deltas of every changed game.
+        """
+        self.tick += 1
+        slot = self.wheel[self.tick % self.gravity_ticks]
+        for session in slot:
+            state = session.state
+            lines = state.lines
+            if state.tick():
+                self.landed(session, lines)
+            self.dirty.add(session)
+        for session in self.dirty:
+            length = session.encode_delta(self.tick)
+            if length:
+                frame = memoryview(session.frame)[:length]
+                for player in session.match.sessions:
+                    player.out += frame
+                    self.outgoing.add(player)
+        self.dirty.clear()
+        for session in self.outgoing:
+            if session.out:
+                self.send(session)
+        self.outgoing.clear()
+        ended = self.ended
+        self.ended = []
+        for session in ended:
+            if session.match is not None:
+                self.end(session.match, 1 - session.index)
+
+    async def run(self, host='127.0.0.1', port=7777, report=5.0):
+        """
+        Serves connections and ticks the games until cancelled.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on.
+            report (float): Seconds between two printed status lines, or 0 for none.
+        """
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: Connection(self), host, port)
+        clock = scheduler.Scheduler(self.tick_rate, self.tick_rate, clock=loop.time)
+        last_report = loop.time()
+        last_bytes = 0
+        async with server:
+            while True:
+                started = time.perf_counter()
+                for _ in range(clock.due_ticks()):
+                    self.step()
+                self.busy += time.perf_counter() - started
+                now = loop.time()
+                if report and now - last_report >= report:
+                    print(f'{len(self.sessions)} sessions, {self.matches} matches, '
+                          f'{clock.tick_rate:.1f} ticks/s, {self.busy / (now - last_report):.0%} busy, '
+                          f'{(self.bytes_sent - last_bytes) / (now - last_report) / 1024:.0f} KiB/s out')
+                    last_report = now
+                    last_bytes = self.bytes_sent
+                    self.busy = 0.0
+                await asyncio.sleep(max(0.0, clock.next_tick - loop.time()))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Host Tetris matches over TCP.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=7777, help='port to listen on')
+    parser.add_argument('--gravity', type=int, default=GRAVITY_TICKS, help='ticks between two gravity steps')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the match seeds')
+    parser.add_argument('--report', type=float, default=5.0, help='seconds between status lines, 0 for none')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(Server(gravity_ticks=args.gravity, seed=args.seed).run(args.host, args.port, args.report))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Simulation Thread
+This module runs the game on its own thread at a fixed tick rate, so a slow frame on the render thread never delays
+input handling, gravity or animations. After every tick that changed something, the simulation publishes an
+immutable Frame holding everything needed to draw the game into a double buffer, and the render thread draws the
+latest published frame, skipping any it was too slow to show.
+Input crosses the other way through a queue. Queueing an action wakes the simulation up, which applies it and
+publishes a frame right away instead of at the next tick. Every action is stamped with the time it arrived on the
+render thread, and the simulation records how long each action waited before being applied, while the render thread
+records how long it took until a frame showing it was on screen.
+Modules:
+    - collections: Provides the namedtuple of frames and the deque of undo snapshots.
+    - queue: Passes the input to the simulation thread.
+    - threading: Runs the simulation and guards the double buffer.
+    - animation: Custom module for timed animations.
+    - profiler: Custom module timing the ticks and the input latency.
+    - scheduler: Custom module pacing the ticks with a fixed timestep.
+    - tetrominoe: Custom module for the copies of the blocks in a frame.
+Global Variables:
+    - UNDO: The input rewinding the game to the spawn of the block that landed last.
+Classes:
+    - Frame: An immutable snapshot of what the game looks like.
+    - DoubleBuffer: Hands the latest frame from the simulation to the render thread.
+    - Simulation: The thread running the game.
+"""
+import collections
+import queue
+import threading
+import animation
+import profiler
+import scheduler
+import tetrominoe
+
+UNDO = -1
+
+# The board is a tuple of color rows, which are never modified, and the blocks are copies owned by the frame.
+# score, lines, pieces and ticks are the counters of the game, so the render thread never reads the GameState.
+# input_time is the arrival time of the latest input applied before the frame, or None.
+Frame = collections.namedtuple('Frame', 'board block queue score lines pieces ghost phase filled_rows ticks '
+                                        'input_time')
+
+class DoubleBuffer:
+    """
+    Two frame slots: the simulation fills the back slot and then swaps it to the front, where the render
+    thread reads it. Frames are immutable, so the reader never sees a frame being written.
+    """
+    def __init__(self):
+        self.slots = [None, None]
+        self.front = 0
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def publish(self, frame):
+        back = 1 - self.front
+        self.slots[back] = frame
+        with self.condition:
+            self.front = back
+            self.version += 1
+            self.condition.notify_all()
+
+    def latest(self):
+        """
+        Returns:
+            tuple: The latest frame and its version, which grows with every published frame.
+        """
+        with self.condition:
+            return self.slots[self.front], self.version
+
+    def wait(self, version, timeout):
+        """
+        Waits until a frame newer than the given version is published, or the timeout passes.
+
+        Args:
+            version (int): The version of the frame the caller already has.
+            timeout (float): The longest wait in seconds.
+
+        Returns:
+            tuple: The latest frame and its version.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.slots[self.front], self.version
+
+class Simulation(threading.Thread):
+    """
+    Runs a game on its own thread: applies the queued input, advances gravity and the row clearing and
+    game over animations at a fixed tick rate, and publishes a Frame whenever something changed.
+
+    Args:
+        recorder (Recorder): The replay.Recorder through which all input and gravity reach the game. Its game
+            must not clear rows automatically, so the row clearing animation can play.
+        tick_rate (int): Ticks per second.
+        gravity_ticks (int): Ticks between two gravity steps.
+        undo_limit (int): Number of blocks that can be rewound.
+    """
+    def __init__(self, recorder, tick_rate=60, gravity_ticks=60, undo_limit=100):
+        super().__init__(name='simulation', daemon=True)
+        self.recorder = recorder
+        self.state = recorder.state
+        self.tick_rate = tick_rate
+        self.gravity_ticks = gravity_ticks
+        self.inputs = queue.SimpleQueue()
+        self.buffer = DoubleBuffer()
+        self.prof = profiler.Profiler()
+        self.stopped = threading.Event()
+        self.wakeup = threading.Event()
+        self.clock = scheduler.Scheduler(tick_rate, tick_rate)
+        self.gravity = 0
+        self.playing = None
+        self.input_time = None
+        # Snapshots of the game taken whenever a block spawned, to rewind to
+        self.history = collections.deque([recorder.snapshot()], maxlen=undo_limit)
+        self.remembered = self.state.pieces
+        self.publish()
+
+    def send(self, action, stamp):
+        """
+        Queues an action and wakes the simulation up to apply it. Safe to call from any thread.
+
+        Args:
+            action (int): An action accepted by GameState.step, or UNDO.
+            stamp (int): The arrival time of the input, from the clock of the profiler.
+        """
+        self.inputs.put((stamp, action))
+        self.wakeup.set()
+
+    def stop(self):
+        # Ask the thread to finish after the current tick and wait for it
+        self.stopped.set()
+        self.wakeup.set()
+        self.join()
+
+    def run(self):
+        while not self.stopped.is_set():
+            for _ in range(self.clock.due_ticks()):
+                self.tick()
+            # Sleep until the next tick, but wake up for input, so it is applied and shown without waiting for a tick
+            self.wakeup.wait(max(0.0, self.clock.next_tick - self.clock.clock()))
+            self.wakeup.clear()
+            if self.handle_input() or self.state.changed:
+                self.publish()
+                self.state.changed = False
+
+    def remember(self):
+        # Save the game whenever a new block spawned, so UNDO can rewind to it
+        if self.state.pieces != self.remembered:
+            self.history.append(self.recorder.snapshot())
+            self.remembered = self.state.pieces
+
+    def undo(self):
+        # Rewind to the spawn of the block that landed last, along with the recording
+        state = self.state
+        if state.block is not None and not state.lost and len(self.history) > 1:
+            self.history.pop()
+        self.recorder.restore(self.history[-1])
+        self.remembered = state.pieces
+        self.playing = None
+
+    def handle_input(self):
+        # Apply the queued input, returning whether the game was rewound
+        prof = self.prof
+        rewound = False
+        while True:
+            try:
+                stamp, action = self.inputs.get_nowait()
+            except queue.Empty:
+                break
+            if action == UNDO:
+                self.undo()
+                rewound = True
+            else:
+                self.recorder.step(action)
+                self.remember()
+            prof.stop('input', stamp)
+            self.input_time = stamp
+        return rewound
+
+    def tick(self):
+        """
+        Runs one tick of the game.
+        """
+        prof = self.prof
+        state = self.state
+        prof.begin_frame()
+        changed = self.handle_input()
+        if self.playing is not None:
+            started = prof.start()
+            if self.playing.update(1000 / self.tick_rate):
+                self.playing = None
+                state.clear_filled_rows()
+                self.remember()
+            prof.stop('animation', started)
+        else:
+            self.gravity += 1
+            if self.gravity >= self.gravity_ticks:
+                self.gravity = 0
+                started = prof.start()
+                self.recorder.tick()
+                self.remember()
+                prof.stop('gravity', started)
+            if state.filled_rows:
+                self.playing = animation.Animation(animation.ROW_CLEARED)
+            elif state.lost:
+                self.playing = animation.Animation(animation.GAME_OVER, loop=True)
+        if self.playing is not None and self.playing.changed:
+            self.playing.changed = False
+            changed = True
+        if changed or state.changed:
+            self.publish()
+            state.changed = False
+        prof.end_frame()
+
+    def publish(self):
+        # Publish a frame of the current game
+        state = self.state
+        block = state.block
+        if block is not None:
+            block = tetrominoe.Tetrominoe(block.shape, list(block.position), block.rotation)
+        self.buffer.publish(Frame(
+            tuple(state.board.colors),
+            block,
+            tuple(tetrominoe.Tetrominoe(queued.shape, list(queued.position), queued.rotation)
+                  for queued in state.block_queue),
+            state.score,
+            state.lines,
+            state.pieces,
+            state.landing_row(),
+            self.playing.phase if self.playing is not None else None,
+            tuple(state.filled_rows),
+            state.ticks,
+            self.input_time,
+        ))
@@ -0,0 +1,256 @@
+"""
+Batch Simulation Runner
+This module plays many headless games across a pool of worker processes and reports throughput together with the
+distributions of score, cleared lines and game length. Every game gets its own seed, so a run can be reproduced, and
+games are played by a pluggable policy. Results come back from the workers in chunks and are folded into fixed-size
+histograms, so memory stays flat no matter how many games are played. With --db, every game is also recorded in a
+score database (see scores), whose writer thread stores the results while the workers keep playing.
+Usage:
+    python simulate.py --games 10000 --policy heuristic --workers 8
+    python simulate.py --games 100000 --policy heuristic --db scores.db
+Modules:
+    - argparse: Parses the command line.
+    - concurrent.futures: Provides the process pool.
+    - game: Custom module holding the headless game state and rules.
+    - bot: Custom module with the heuristic bot.
+    - scores: Custom module storing the results, imported with --db only.
+Global Variables:
+    - POLICIES: The built-in policies by name.
+Classes:
+    - RandomPolicy, ScriptedPolicy, HeuristicPolicy: The built-in policies.
+    - Distribution: A streaming histogram of non-negative values.
+Functions:
+    - load_policy(name): Returns the policy class for a name or a 'module:Class' path.
+    - run_chunk(policy, first_seed, count, max_pieces, mode, width, height): Plays a chunk of games in a worker.
+    - simulate(...): Plays the games and returns the aggregated statistics.
+"""
+import argparse
+import concurrent.futures
+import importlib
+import json
+import math
+import os
+import random
+import time
+import bitboard
+import bot
+import game
+
+class RandomPolicy:
+    # Presses a random key before every gravity step
+    actions = (game.LEFT, game.RIGHT, game.DOWN, game.ROTATE)
+
+    def play(self, state, rng):
+        state.step(rng.choice(self.actions))
+        state.tick()
+
+class ScriptedPolicy:
+    # Rotates and moves every block to a column that cycles across the board, then drops it
+    def play(self, state, rng):
+        count = state.pieces
+        for _ in range(count % 4):
+            state.step(game.ROTATE)
+        target = count * 3 % state.board.width
+        block = state.block
+        direction = game.LEFT if block.position[0] > target else game.RIGHT
+        while block.position[0] != target:
+            x = block.position[0]
+            state.step(direction)
+            if block.position[0] == x:
+                break
+        state.step(game.HARD_DROP)
+
+class HeuristicPolicy:
+    # Plays every block to the placement picked by bot.Bot
+    def __init__(self):
+        self.bot = None
+
+    def play(self, state, rng):
+        if self.bot is None:
+            self.bot = bot.Bot(width=state.board.width)
+        if not self.bot.play(state):
+            state.tick()
+
+POLICIES = {
+    'random': RandomPolicy,
+    'scripted': ScriptedPolicy,
+    'heuristic': HeuristicPolicy,
+}
+
+def load_policy(name):
+    """
+    Returns the policy class for a built-in policy name or a 'module:Class' path.
+
+    A policy class is created once per chunk of games and has a play(state, rng) method, which must
+    advance the game by at least one gravity step.
+    """
+    if name in POLICIES:
+        return POLICIES[name]
+    module, _, attribute = name.partition(':')
+    if not attribute:
+        raise ValueError(f'unknown policy: {name}')
+    return getattr(importlib.import_module(module), attribute)
+
+def run_chunk(policy, first_seed, count, max_pieces, mode, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    """
+    Plays a chunk of games in a worker process.
+
+    Returns:
+        list of tuple: The (seed, score, lines, pieces, ticks, duration) of every game, with the duration in seconds.
+    """
+    player = load_policy(policy)()
+    results = []
+    for seed in range(first_seed, first_seed + count):
+        started = time.perf_counter()
+        state = game.GameState(seed, mode=mode, width=width, height=height)
+        rng = random.Random(seed)
+        while not state.lost and state.pieces < max_pieces:
+            player.play(state, rng)
+        results.append((seed, state.score, state.lines, state.pieces, state.ticks, time.perf_counter() - started))
+    return results
+
+class Distribution:
+    """
+    A streaming histogram of non-negative values.
+
+    Values are counted in buckets about one percent wide, so quantiles are accurate to about one
+    percent while memory only grows with the logarithm of the largest value.
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+
+    def add(self, value):
+        bucket = int(math.log(value + 1, 1.01))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def quantile(self, q):
+        # Return the lower bound of the bucket holding the q-quantile
+        target = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen > target:
+                return max(self.minimum, min(self.maximum, round(1.01 ** bucket - 1)))
+        return self.maximum
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.total / self.count,
+            'min': self.minimum,
+            'p10': self.quantile(0.1),
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': self.maximum,
+        }
+
+def simulate(games, policy='random', workers=None, seed=0, chunk=100, max_pieces=1000, mode='random',
+             width=bitboard.WIDTH, height=bitboard.HEIGHT, store=None):
+    """
+    Plays games across a process pool.
+
+    Args:
+        games (int): The number of games to play.
+        policy (str): A built-in policy name or a 'module:Class' path.
+        workers (int): The number of worker processes, one per CPU by default.
+        seed (int): The seed of the first game; game i is played with seed + i.
+        chunk (int): The number of games sent to a worker at once.
+        max_pieces (int): The number of pieces after which a game is stopped.
+        mode (str): The mode of the block generator.
+        width (int): The number of columns of the boards.
+        height (int): The number of rows of the boards.
+        store (ScoreStore): A scores.ScoreStore recording every game, or None.
+
+    Returns:
+        dict: Throughput and the score, lines and pieces distributions.
+    """
+    load_policy(policy)
+    workers = workers or os.cpu_count() or 1
+    distributions = {'score': Distribution(), 'lines': Distribution(), 'pieces': Distribution()}
+    pieces = 0
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        chunks = ((first, min(chunk, games - first)) for first in range(0, games, chunk))
+        pending = set()
+        while True:
+            # Keep a bounded number of chunks in flight so results are consumed as they arrive
+            for first, count in chunks:
+                pending.add(pool.submit(run_chunk, policy, seed + first, count, max_pieces, mode, width, height))
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                break
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                results = future.result()
+                if store is not None:
+                    store.record_many(results, policy)
+                for _, score, lines, length, _, _ in results:
+                    distributions['score'].add(score)
+                    distributions['lines'].add(lines)
+                    distributions['pieces'].add(length)
+                    pieces += length
+    elapsed = time.perf_counter() - start
+    return {
+        'games': games,
+        'policy': policy,
+        'workers': workers,
+        'seconds': elapsed,
+        'games_per_second': games / elapsed,
+        'pieces_per_second': pieces / elapsed,
+        'score': distributions['score'].summary(),
+        'lines': distributions['lines'].summary(),
+        'pieces': distributions['pieces'].summary(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play headless Tetris games in parallel and report statistics.')
+    parser.add_argument('--games', type=int, default=1000, help='number of games to play')
+    parser.add_argument('--policy', default='random', help="random, scripted, heuristic or a 'module:Class' path")
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--chunk', type=int, default=100, help='games sent to a worker at once')
+    parser.add_argument('--max-pieces', type=int, default=1000, help='pieces after which a game is stopped')
+    parser.add_argument('--mode', choices=('random', 'bag'), default='random', help='block generator mode')
+    parser.add_argument('--width', type=int, default=bitboard.WIDTH, help='columns of the board')
+    parser.add_argument('--height', type=int, default=bitboard.HEIGHT, help='rows of the board')
+    parser.add_argument('--db', metavar='FILE', help='record every game in the score database FILE')
+    parser.add_argument('--json', action='store_true', help='print the statistics as JSON')
+    args = parser.parse_args(argv)
+    if args.games < 1:
+        parser.error('--games must be at least 1')
+    store = None
+    if args.db:
+        import scores
+        store = scores.ScoreStore(args.db)
+    try:
+        stats = simulate(args.games, args.policy, args.workers, args.seed, args.chunk, args.max_pieces, args.mode,
+                         args.width, args.height, store)
+    finally:
+        if store is not None:
+            store.close()
+    if args.json:
+        print(json.dumps(stats, indent=2))
+        return
+    print(f"{stats['games']} games with {stats['workers']} workers in {stats['seconds']:.2f} s: "
+          f"{stats['games_per_second']:.1f} games/s, {stats['pieces_per_second']:.0f} pieces/s")
+    for name in ('score', 'lines', 'pieces'):
+        summary = stats[name]
+        print(f"{name:>6}: mean {summary['mean']:.1f}  min {summary['min']}  p10 {summary['p10']}  "
+              f"p50 {summary['p50']}  p90 {summary['p90']}  p99 {summary['p99']}  max {summary['max']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Spectator Wall
+This module shows many live games in one window, for demo walls and for watching bot runs. Every game is played by a
+policy of the simulate module and restarted with the next seed once it is lost. The games take turns on a timing
+wheel: on every tick, only the games in the slot of that tick make a move, so the work is spread evenly over the
+ticks instead of all games moving at once.
+Drawing goes through draw.SpectatorRenderer, which only redraws the boards that changed and submits all their cells
+in one batch, so all boards can stay active at the full frame rate. The window title shows the achieved frame rate
+and the time spent drawing.
+Usage:
+    python spectator.py --games 64 --policy heuristic
+    python spectator.py --games 16 --policy random --rate 30 --size 1024x768
+Modules:
+    - argparse: Parses the command line.
+    - random: Provides the random stream of every game.
+    - sys: Provides access to some variables used or maintained by the interpreter.
+    - bitboard: Custom module for the bitmask board representation.
+    - game: Custom module holding the headless game state and rules.
+    - profiler: Custom module timing the drawing.
+    - scheduler: Custom module pacing the moves and capping the frame rate.
+    - simulate: Custom module with the policies playing the games.
+    - pygame, draw: Imported by open_window() only.
+Global Variables:
+    - TICK_RATE, FRAME_RATE: Ticks per second and the cap on rendered frames per second.
+Classes:
+    - Wall: The games shown on the wall and the policies playing them.
+Functions:
+    - open_window(size, count, width, height): Opens the window and creates the renderer.
+    - main(argv): Shows the wall.
+"""
+import argparse
+import random
+import sys
+import bitboard
+import game
+import profiler
+import scheduler
+import simulate
+
+TICK_RATE = 60
+FRAME_RATE = 60
+
+class Wall:
+    """
+    A set of games played by a policy, each restarted with a new seed once it is lost.
+
+    Args:
+        count (int): The number of games.
+        policy (str): A built-in policy name or a 'module:Class' path, as accepted by simulate.load_policy().
+        seed (int): The seed of the first game; every new game takes the next seed.
+        interval (int): Ticks between two moves of a game.
+        mode (str): The mode of the block generator.
+        width (int): The number of columns of the boards.
+        height (int): The number of rows of the boards.
+    """
+    def __init__(self, count, policy='heuristic', seed=0, interval=12, mode='random', width=bitboard.WIDTH,
+                 height=bitboard.HEIGHT):
+        self.policy = simulate.load_policy(policy)
+        self.interval = interval
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.next_seed = seed
+        self.ticks = 0
+        self.games = [self.new_game() for _ in range(count)]
+        self.players = [self.policy() for _ in range(count)]
+
+    def new_game(self):
+        # Start a game with the next seed, along with its random stream
+        seed = self.next_seed
+        self.next_seed += 1
+        return game.GameState(seed, mode=self.mode, width=self.width, height=self.height), random.Random(seed)
+
+    def tick(self):
+        """
+        Lets the games in the slot of the current tick make a move.
+        """
+        for index in range(self.ticks % self.interval, len(self.games), self.interval):
+            state, rng = self.games[index]
+            if state.lost:
+                self.games[index] = self.new_game()
+            else:
+                self.players[index].play(state, rng)
+        self.ticks += 1
+
+    def frames(self):
+        """
+        Returns:
+            list of tuple: The (board, block, score) of every game, as taken by draw.SpectatorRenderer.draw().
+        """
+        return [(state.board.colors, state.block, state.score) for state, _ in self.games]
+
+def open_window(size, count, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    """
+    Initializes the parts of Pygame the wall uses, opens the window and creates the renderer.
+
+    Args:
+        size (tuple of int): The width and height of the window.
+        count (int): The number of boards.
+        width (int): The number of columns of the boards.
+        height (int): The number of rows of the boards.
+
+    Returns:
+        draw.SpectatorRenderer: The renderer of the window.
+    """
+    import pygame
+    import draw
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode(size)
+    pygame.display.set_caption('Tetris')
+    return draw.SpectatorRenderer(screen, count, width, height)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Watch many Tetris games played by a policy at once.')
+    parser.add_argument('--games', type=int, default=64, help='number of boards on the wall')
+    parser.add_argument('--policy', default='heuristic', help="random, scripted, heuristic or a 'module:Class' path")
+    parser.add_argument('--rate', type=float, default=5, help='moves per second of every game')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--mode', choices=('random', 'bag'), default='random', help='block generator mode')
+    parser.add_argument('--size', default='1280x720', help='size of the window as WIDTHxHEIGHT')
+    parser.add_argument('--width', type=int, default=bitboard.WIDTH, help='columns of the boards')
+    parser.add_argument('--height', type=int, default=bitboard.HEIGHT, help='rows of the boards')
+    args = parser.parse_args(argv)
+    try:
+        size = tuple(int(value) for value in args.size.lower().split('x'))
+    except ValueError:
+        size = ()
+    if len(size) != 2:
+        parser.error(f'invalid window size: {args.size}')
+
+    renderer = open_window(size, args.games, args.width, args.height)
+    import pygame
+    wall = Wall(args.games, args.policy, args.seed, max(1, round(TICK_RATE / args.rate)), args.mode, args.width,
+                args.height)
+    clock = scheduler.Scheduler(TICK_RATE, FRAME_RATE)
+    prof = profiler.Profiler()
+    changed = True
+    running = True
+    while running:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+        for _ in range(clock.due_ticks()):
+            wall.tick()
+            changed = True
+        if clock.frame_due(changed):
+            prof.begin_frame()
+            started = prof.start()
+            pygame.display.update(renderer.draw(wall.frames()))
+            prof.stop('draw', started)
+            prof.end_frame()
+            changed = False
+            if clock.frames % FRAME_RATE == 0:
+                pygame.display.set_caption(f"Tetris - {args.games} games, {clock.frame_rate:.0f} fps, "
+                                           f"draw {prof.summary()['phases']['draw']['mean']:.2f} ms")
+        clock.sleep()
+    pygame.quit()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Tests of clearing rows from a bitboard.Board, compared against boards rebuilt from scratch.
+"""
+import random
+import bitboard
+import game
+import tetrominoe
+import zobrist
+
+def build(lines, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    # Build a board from scratch from a drawing aligned to the bottom, with '.' for empty cells and the color digit
+    # for filled ones
+    board = bitboard.Board(width, height)
+    top = height - len(lines)
+    for y, line in enumerate(lines, top):
+        colors = tuple(0 if cell == '.' else int(cell) for cell in line)
+        board.rows[y] = sum(1 << x for x, cell in enumerate(colors) if cell)
+        board.colors[y] = colors
+    for x in range(width):
+        filled = [y for y in range(height) if board.rows[y] >> x & 1]
+        board.heights[x] = height - filled[0] if filled else 0
+    board.hash = zobrist.board_hash(board.rows)
+    return board
+
+def assert_same(board, expected):
+    assert board.rows == expected.rows
+    assert list(board.colors) == list(expected.colors)
+    assert board.heights == expected.heights
+    assert board.hash == expected.hash
+
+STACK = [
+    '.....2....',  # 12
+    '..1..2....',  # 13
+    '3.1..2..4.',  # 14
+    '3....2..4.',  # 15
+    '1111111111',  # 16
+    '2222222222',  # 17
+    '33.33.3333',  # 18
+    '4444444444',  # 19
+]
+
+def test_remove_non_adjacent_rows():
+    board = build(STACK)
+    board.remove_rows([19, 17, 16])
+    assert_same(board, build(STACK[:4] + STACK[6:7]))
+
+def test_remove_four_rows():
+    lines = ['.5........', '.5.....6..'] + ['7777777777'] * 4
+    board = build(lines)
+    board.remove_rows(board.filled_rows())
+    assert_same(board, build(lines[:2]))
+
+def test_remove_rows_emptying_columns():
+    # Columns 0 and 9 only have cells in the removed rows, so their heights drop to 0
+    lines = ['2222222222', '.33333333.', '4444444444', '.55555555.']
+    board = build(lines)
+    board.remove_rows([18, 16])
+    assert_same(board, build([lines[1], lines[3]]))
+    assert board.heights[0] == board.heights[9] == 0
+
+def test_remove_random_rows():
+    rng = random.Random(0)
+    for _ in range(200):
+        lines = []
+        for _ in range(rng.randrange(1, bitboard.HEIGHT)):
+            if rng.random() < 0.4:
+                lines.append(str(rng.randrange(1, 9)) * bitboard.WIDTH)
+            else:
+                lines.append(''.join(str(rng.randrange(1, 9)) if rng.random() < 0.5 else '.'
+                                     for _ in range(bitboard.WIDTH)))
+        board = build(lines)
+        filled = board.filled_rows()
+        board.remove_rows(filled)
+        top = bitboard.HEIGHT - len(lines)
+        assert_same(board, build([line for y, line in enumerate(lines, top) if y not in filled]))
+
+def test_lock_clears_non_adjacent_rows():
+    # A vertical I block dropped into column 0 fills rows 19 and 17 but not 18
+    lines = ['..........', '.1111111..', '.222222222', '..33333333', '.444444444']
+    state = game.GameState(0)
+    state.board = build(lines)
+    state.block = tetrominoe.Tetrominoe(7, [-2, 0], 2)
+    state.step(game.HARD_DROP)
+    assert state.lines == 2
+    assert_same(state.board, build(['71111111..', '7.33333333']))
+
+def test_snapshot_restore_random():
+    # Rewind games to random earlier snapshots and check them against deep copies taken at the same time
+    import copy
+    rng = random.Random(1)
+    for seed in range(5):
+        state = game.GameState(seed, height=rng.choice((20, 30)), mode=rng.choice(('random', 'bag')))
+        saved = []
+        for _ in range(300):
+            if state.lost:
+                break
+            if rng.random() < 0.3:
+                saved.append((state.snapshot(), copy.deepcopy(state)))
+            if saved and rng.random() < 0.1:
+                snapshot, expected = rng.choice(saved)
+                state.restore(snapshot)
+                board = state.board
+                assert board.rows == expected.board.rows
+                assert board.colors == expected.board.colors
+                assert board.heights == expected.board.heights
+                assert board.hash == expected.board.hash == zobrist.board_hash(board.rows)
+                assert [block.shape for block in state.block_queue] == [block.shape for block in expected.block_queue]
+                assert state.generator.sequence(20) == copy.deepcopy(expected.generator).sequence(20)
+                state.restore(snapshot)
+            action = rng.choice((game.LEFT, game.RIGHT, game.ROTATE, game.DOWN, game.HARD_DROP))
+            state.step(action)
+            state.tick()
+            if rng.random() < 0.05:
+                state.receive_garbage(rng.randrange(1, 3), rng.randrange(state.board.width))
@@ -0,0 +1,69 @@
+"""
+Tests of the match server, driven without sockets through fake transports.
+"""
+import bitboard
+import game
+import server
+import tetrominoe
+
+class Transport:
+    # Collects what the server writes to a client
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def get_write_buffer_size(self):
+        return 0
+
+def connect(host):
+    # Connect a client to the server and return its session
+    connection = server.Connection(host)
+    connection.connection_made(Transport())
+    return connection.session
+
+def start_match():
+    host = server.Server(seed=0)
+    first = connect(host)
+    second = connect(host)
+    host.step()
+    return host, first, second
+
+def messages(session):
+    return server.decode(session.connection.transport.data)
+
+def test_hard_drop_clear_sends_garbage():
+    host, first, second = start_match()
+    state = first.state
+    # Four garbage rows open in column 0, filled by a vertical I block dropped into it
+    state.board.add_garbage(4, 0)
+    state.block = tetrominoe.Tetrominoe(7, [-2, 0], 2)
+    host.receive(first, bytes([game.HARD_DROP]))
+    assert state.lines == 4
+    assert second.state.garbage and second.state.garbage[0][0] == server.garbage_rows(4)
+    assert first.match is not None
+
+def test_hard_drop_top_out_ends_match():
+    host, first, second = start_match()
+    state = first.state
+    state.board.add_garbage(bitboard.HEIGHT - 2, 0)
+    for _ in range(bitboard.HEIGHT):
+        if state.lost:
+            break
+        host.receive(first, bytes([game.HARD_DROP]))
+    assert state.lost
+    # The match ends on the next tick, after the final delta is sent
+    assert first.match is not None
+    host.step()
+    for session in (first, second):
+        assert session.match is None
+        assert session.connection.transport.closed
+        assert messages(session)[-1] == (b'E', 1)
@@ -0,0 +1,14 @@
+"""
+Tests of the vector environment, stepped in lockstep with one GameState per game by vecenv.cross_check.
+"""
+import generator
+import vecenv
+
+def test_cross_check_default_board():
+    assert vecenv.cross_check(envs=8, steps=300, seed=0) > 0
+
+def test_cross_check_small_board():
+    assert vecenv.cross_check(envs=8, steps=300, seed=1, width=6, height=12) > 0
+
+def test_cross_check_bag():
+    assert vecenv.cross_check(envs=8, steps=300, seed=2, mode=generator.BAG) > 0
@@ -1,180 +1,229 @@
-import pygame
+import collections
+import bitboard
 
-class Tetrominoe: 
-    def __init__(self, shape="O", position=[4, 0], rotation=1, matrix=[[1, 1], [1, 1]]):
-        # Initialize the Tetrominoe with shape, position, rotation, and matrix
+# Directions understood by Tetrominoe.move
+LEFT = 1
+RIGHT = 2
+DOWN = 3
+
+O = [[1, 1],
+     [1, 1]]
+
+L = [[0, 0, 2],
+     [2, 2, 2],
+     [0, 0, 0]]
+
+J = [[3, 0, 0],
+     [3, 3, 3],
+     [0, 0, 0]]
+
+S = [[0, 4, 4],
+     [4, 4, 0],
+     [0, 0, 0]]
+
+Z = [[5, 5, 0],
+     [0, 5, 5],
+     [0, 0, 0]]
+
+T = [[0, 6, 0],
+     [6, 6, 6],
+     [0, 0, 0]]
+
+I = [[0, 0, 0, 0],
+     [7, 7, 7, 7],
+     [0, 0, 0, 0],
+     [0, 0, 0, 0]]
+
+SHAPES = {1: O, 2: L, 3: J, 4: S, 5: Z, 6: T, 7: I}
+
+# One orientation of a shape. Each mask has bit 0 at the leftmost filled column (left),
+# so a mask lines up with the board when shifted left by position[0] + left. The profile
+# holds (dx, dy) of the lowest filled cell of every column of the shape.
+Orientation = collections.namedtuple('Orientation', 'matrix masks left right top bottom profile')
+
+def rotate_matrix(matrix):
+    # Return the matrix rotated 90 degrees clockwise
+    n = len(matrix)
+    return tuple(tuple(matrix[n - 1 - j][i] for j in range(n)) for i in range(n))
+
+def make_orientation(matrix):
+    # Precompute the row masks of the matrix and the extent of its filled cells
+    cells = [(x, y) for y, row in enumerate(matrix) for x, cell in enumerate(row) if cell > 0]
+    left = min(x for x, y in cells)
+    masks = []
+    for y, row in enumerate(matrix):
+        mask = 0
+        for x, cell in enumerate(row):
+            if cell > 0:
+                mask |= 1 << (x - left)
+        if mask:
+            masks.append((y, mask))
+    lowest = {}
+    for x, y in cells:
+        lowest[x] = max(y, lowest.get(x, y))
+    return Orientation(matrix, tuple(masks), left, max(x for x, y in cells),
+                       min(y for x, y in cells), max(y for x, y in cells), tuple(sorted(lowest.items())))
+
+def make_kicks(old, new):
+    # List the offsets to try after rotating from old to new. The first candidate that
+    # is inside the board is used: the rotated piece is pushed back by the smallest
+    # distance it can stick out of the board beyond where the old orientation was.
+    kicks = [(0, 0)]
+    kicks += [(-d, 0) for d in range(1, new.right - old.right + 1)]
+    kicks += [(d, 0) for d in range(1, old.left - new.left + 1)]
+    kicks += [(0, -d) for d in range(1, new.bottom - old.bottom + 1)]
+    kicks += [(0, d) for d in range(1, old.top - new.top + 1)]
+    return tuple(kicks)
+
+def build_tables():
+    # Compute the four orientations and the kicks between them for every shape
+    orientations = {}
+    kicks = {}
+    for shape, matrix in SHAPES.items():
+        states = []
+        matrix = tuple(tuple(row) for row in matrix)
+        for _ in range(4):
+            states.append(make_orientation(matrix))
+            matrix = rotate_matrix(matrix)
+        orientations[shape] = tuple(states)
+        kicks[shape] = tuple(make_kicks(states[r], states[(r + 1) % 4]) for r in range(4))
+    return orientations, kicks
+
+# ORIENTATIONS[shape][rotation - 1] and KICKS[shape][rotation - 1], where KICKS holds the
+# offsets for rotating clockwise out of that rotation
+ORIENTATIONS, KICKS = build_tables()
+
+def spawn_column(shape, width=bitboard.WIDTH):
+    # Return the column a new block spawns at: left of center, moved inwards on boards too narrow for it
+    state = ORIENTATIONS[shape][0]
+    return max(-state.left, min(width // 2 - 1, width - 1 - state.right))
+
+class Tetrominoe:
+    # Instances only hold their own position; the shape data is shared through ORIENTATIONS
+    __slots__ = ('shape', 'position', 'rotation', 'state')
+
+    def __init__(self, shape=1, position=[4, 0], rotation=1):
+        # Initialize the Tetrominoe with shape, position and rotation
         self.shape = shape
         self.position = position
         self.rotation = rotation
-        self.matrix = matrix
-    
-    def is_in_bounds(self):
-        # Check if the Tetrominoe is within the game board boundaries
-        for y, row in enumerate(self.matrix):
-            for x, cell in enumerate(row):
-                if cell > 0:
-                    if self.position[0] + x < 0 or self.position[0] + x >= 10: 
-                        return False
-                    if self.position[1] + y >= 20 or self.position[1] + y < 0:
-                        return False
-        return True
+        self.state = ORIENTATIONS[shape][rotation - 1]
+
+    @property
+    def matrix(self):
+        return self.state.matrix
+
+    def is_in_bounds(self, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+        # Check if the Tetrominoe is within the boundaries of a board of the given size
+        x, y = self.position
+        state = self.state
+        return (x + state.left >= 0 and x + state.right < width
+                and y + state.top >= 0 and y + state.bottom < height)
+
+    def collides(self, board, x, y):
+        # Check if the Tetrominoe would overlap filled cells at the given in-bounds position
+        rows = board.rows
+        shift = x + self.state.left
+        for dy, mask in self.state.masks:
+            if rows[y + dy] & (mask << shift):
+                return True
+        return False
 
     def is_obstructed_down(self, board):
         # Check if the Tetrominoe is obstructed from moving down
-        for y, row in enumerate(self.matrix):
-            for x, cell in enumerate(row):
-                if cell > 0:
-                    if self.position[1] + y + 1 >= 20:
-                        return True
-                    elif board[self.position[1] + y + 1][self.position[0] + x] > 0:
-                        return True
-        return False
-    
+        x, y = self.position
+        if y + self.state.bottom + 1 >= board.height:
+            return True
+        return self.collides(board, x, y + 1)
+
     def is_obstructed_right(self, board):
         # Check if the Tetrominoe is obstructed from moving right
-        for y, row in enumerate(self.matrix):
-            for x, cell in enumerate(row):
-                if cell > 0:
-                    if self.position[0] + x + 1 >= 10:
-                        return True
-                    elif board[self.position[1] + y][self.position[0] + x + 1] > 0:
-                        return True
-        return False
-    
+        x, y = self.position
+        if x + self.state.right + 1 >= board.width:
+            return True
+        return self.collides(board, x + 1, y)
+
     def is_obstructed_left(self, board):
         # Check if the Tetrominoe is obstructed from moving left
-        for y, row in enumerate(self.matrix):
-            for x, cell in enumerate(row):
-                if cell > 0:
-                    if self.position[0] + x - 1 < 0:
-                        return True
-                    if board[self.position[1] + y][self.position[0] + x - 1] > 0:
-                        return True
-        return False
-    
-    def move(self, key, board):
-        # Move the Tetrominoe based on the key input if not obstructed
-        old = self.position.copy()
-        
-        if key == pygame.K_LEFT:  
+        x, y = self.position
+        if x + self.state.left - 1 < 0:
+            return True
+        return self.collides(board, x - 1, y)
+
+    def drop_distance(self, board):
+        # Return how many rows the Tetrominoe can fall, from the column heights of the board and the
+        # bottom profile of its orientation instead of stepping down row by row
+        x, y = self.position
+        heights = board.heights
+        floor = board.height - 1
+        distance = floor
+        for dx, dy in self.state.profile:
+            # Rows between the lowest cell of this column and the top filled cell below it
+            gap = floor - heights[x + dx] - y - dy
+            if gap < 0:
+                # The Tetrominoe is tucked under an overhang of this column, so the skyline does
+                # not bound its fall; step down instead
+                distance = 0
+                while y + distance + self.state.bottom < floor and not self.collides(board, x, y + distance + 1):
+                    distance += 1
+                return distance
+            if gap < distance:
+                distance = gap
+        return distance
+
+    def move(self, direction, board):
+        # Move the Tetrominoe in the given direction if not obstructed, returning whether it moved
+        if direction == LEFT:
             if not self.is_obstructed_left(board):
                 self.position[0] -= 1
-        if key == pygame.K_RIGHT: 
+                return True
+        if direction == RIGHT:
             if not self.is_obstructed_right(board):
-                self.position[0] += 1      
-        if key == pygame.K_DOWN: 
+                self.position[0] += 1
+                return True
+        if direction == DOWN:
             if not self.is_obstructed_down(board):
                 self.position[1] += 1
+                return True
+        return False
 
     def land(self, board):
         # Place the Tetrominoe on the board when it lands
-        for y, row in enumerate(self.matrix):
-            for x, cell in enumerate(row):
-                if cell > 0:
-                    board[self.position[1] + y][self.position[0] + x] = cell
-        
-    def rotate_adjust_position(self):
-        # Adjust the position of the Tetrominoe after rotation to keep it within bounds
-        # I shape
-        if self.shape == 7:
-            if self.rotation == 2:
-                if self.position[0] >= 7:
-                    self.position[0] -= 1
-                if self.position[0] <= -1:
-                    self.position[0] += 2
-            if self.rotation == 4:
-                if self.position[0] >= 7:
-                    self.position[0] -= 2
-                if self.position[0] <= -1:
-                    self.position[0] += 1
-            if self.rotation == 1:
-                if self.position[1] == 17:
-                    self.position[1] -= 1
-                if self.position[1] >= 18:
-                    self.position[1] -= 2
-            if self.rotation == 3:
-                if self.position[1] >= 17:
-                    self.position[1] -= 1
-        # L shape
-        if self.shape == 2:
-            if self.rotation == 4:
-                if self.position[0] >= 8:
-                    self.position[0] -= 1
-            if self.rotation == 2:
-                if self.position[0] <= -1:
-                    self.position[0] += 1
-            if self.rotation == 1:
-                if self.position[1] >= 18:
-                    self.position[1] -= 1
-        # J shape
-        if self.shape == 3:
-            if self.rotation == 4:
-                if self.position[0] >= 8:
-                    self.position[0] -= 1
-            if self.rotation == 2:
-                if self.position[0] <= -1:
-                    self.position[0] += 1
-            if self.rotation == 1:
-                if self.position[1] >= 18:
-                    self.position[1] -= 1
-        # S shape
-        if self.shape == 4:
-            if self.rotation == 4:
-                if self.position[0] >= 8:
-                    self.position[0] -= 1
-            if self.rotation == 2:
-                if self.position[0] <= -1:
-                    self.position[0] += 1
-            if self.rotation == 1:
-                if self.position[1] >= 18:
-                    self.position[1] -= 1
-        # Z shape
-        if self.shape == 5:
-            if self.rotation == 4:
-                if self.position[0] >= 8:
-                    self.position[0] -= 1
-            if self.rotation == 2:
-                if self.position[0] <= -1:
-                    self.position[0] += 1
-            if self.rotation == 1:
-                if self.position[1] >= 18:
-                    self.position[1] -= 1
-        # T shape
-        if self.shape == 6:
-            if self.rotation == 4:
-                if self.position[0] >= 8:
-                    self.position[0] -= 1
-            if self.rotation == 2:
-                if self.position[0] <= -1:
-                    self.position[0] += 1
-            if self.rotation == 1:
-                if self.position[1] >= 18:
-                    self.position[1] -= 1  
-        self.rotation += 1
-        if self.rotation > 4:
-            self.rotation = 1
-    
-    def rotate90(self):
-        # Rotate the Tetrominoe 90 degrees clockwise
-        mat = self.matrix
-        n = len(mat)
-        for i in range(n // 2):
-            for j in range(i, n - i - 1):
-                temp = mat[i][j]
-                mat[i][j] = mat[n - 1 - j][i]                # Move P4 to P1
-                mat[n - 1 - j][i] = mat[n - 1 - i][n - 1 - j]  # Move P3 to P4
-                mat[n - 1 - i][n - 1 - j] = mat[j][n - 1 - i]  # Move P2 to P3
-                mat[j][n - 1 - i] = temp                      # Move P1 to P2
-        self.rotate_adjust_position()
+        board.place(self)
+
+    def rotate90(self, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+        # Rotate the Tetrominoe 90 degrees clockwise and kick it back inside a board of the given size
+        kicks = KICKS[self.shape][self.rotation - 1]
+        self.rotation = self.rotation % 4 + 1
+        self.state = ORIENTATIONS[self.shape][self.rotation - 1]
+        x, y = self.position
+        for dx, dy in kicks:
+            self.position[0] = x + dx
+            self.position[1] = y + dy
+            if self.is_in_bounds(width, height):
+                return
+        self.position[0] = x
+        self.position[1] = y
 
     def check_rotation(self, board):
         # Check if the Tetrominoe can rotate without obstruction
-        for y, row in enumerate(self.matrix):
-                for x, cell in enumerate(row):
-                    if cell > 0 and (self.position[1] + y >= 20 or board[self.position[1] + y][self.position[0] + x] > 1):   
-                        return False
-        return True
-    
+        if not self.is_in_bounds(board.width, board.height):
+            return False
+        return not self.collides(board, self.position[0], self.position[1])
+
+    def rotate(self, board):
+        # Rotate the Tetrominoe 90 degrees clockwise, undoing the rotation if it is obstructed
+        rotation = self.rotation
+        x, y = self.position
+        self.rotate90(board.width, board.height)
+        if self.check_rotation(board):
+            return True
+        self.rotation = rotation
+        self.state = ORIENTATIONS[self.shape][rotation - 1]
+        self.position[0] = x
+        self.position[1] = y
+        return False
+
     def to_string(self):
         # Print the Tetrominoe's shape, position, and rotation
         print(str(self.shape) + " " + str(self.position) + " " + str(self.rotation))
@@ -0,0 +1,346 @@
+"""
+Vectorized Environments
+This module steps many games in lockstep for reinforcement learning, in the style of a Gym vector environment. The
+boards of all games are one NumPy array of shape (N, height, width) holding the color of every cell, and the falling
+blocks are parallel arrays of shape, rotation and position. Every step applies the action of each game, gravity,
+landing, line detection and clearing to all games at once with array operations on the orientation and kick tables of
+the tetrominoe module, so nothing loops over Tetrominoe objects.
+The rules are those of game.GameState with automatic line clearing: an action of a step is applied like
+GameState.step, followed by one GameState.tick. Every game draws its blocks from its own generator.PieceGenerator,
+so a game and the GameState created with the same seed play exactly the same, which cross_check() verifies.
+Usage:
+    python vecenv.py --envs 4096 --steps 1000
+    python vecenv.py --check
+Modules:
+    - numpy: Holds the boards and the block state of all games.
+    - bitboard: Custom module for the default board dimensions.
+    - game: Custom module holding the scalar game state and rules, and the actions.
+    - generator: Custom module for the seeded stream of tetrominoes.
+    - tetrominoe: Custom module for the orientation and kick tables.
+Global Variables:
+    - NOOP: The action leaving the block alone for a step.
+    - CELLS: The (dx, dy) of the four cells of every shape and rotation.
+    - LINE_SCORES: The score of clearing 0 to 4 rows at once.
+Classes:
+    - VectorEnv: A batch of games stepped together.
+Functions:
+    - cross_check(envs, steps, seed, mode, width, height): Compares VectorEnv with GameState.
+"""
+import argparse
+import time
+import numpy as np
+import bitboard
+import game
+import generator
+import tetrominoe
+
+NOOP = 0
+STREAM = 64
+
+def build_tables():
+    # Lay the orientation and kick tables out as arrays indexed by [shape, rotation - 1]
+    cells = np.zeros((8, 4, 4, 2), dtype=np.int64)
+    extent = np.zeros((4, 8, 4), dtype=np.int64)
+    width = max(len(kicks) for shapes in tetrominoe.KICKS.values() for kicks in shapes)
+    kicks = np.zeros((8, 4, width, 2), dtype=np.int64)
+    kick_count = np.zeros((8, 4), dtype=np.int64)
+    for shape, states in tetrominoe.ORIENTATIONS.items():
+        for r, state in enumerate(states):
+            cells[shape, r] = [(x, y) for y, row in enumerate(state.matrix) for x, cell in enumerate(row) if cell > 0]
+            extent[:, shape, r] = (state.left, state.right, state.top, state.bottom)
+            offsets = tetrominoe.KICKS[shape][r]
+            kicks[shape, r, :len(offsets)] = offsets
+            kick_count[shape, r] = len(offsets)
+    return cells, extent, kicks, kick_count
+
+CELLS, (LEFT, RIGHT, TOP, BOTTOM), KICKS, KICK_COUNT = build_tables()
+LINE_SCORES = np.array([0, 40, 100, 300, 1200], dtype=np.int64)
+
+class VectorEnv:
+    """
+    A batch of games stepped together with array operations.
+
+    The observation is a read-only view of the boards, shared with the environment rather than copied, so it
+    changes with every step. The falling blocks are not part of the boards; they are in the shape, rotation,
+    x and y arrays, and the next three shapes of every game are returned by queue().
+
+    Args:
+        num_envs (int): The number of games.
+        seed (int): Game i starts with seed + i; games started by a reset continue with seed + num_envs, and so on.
+        mode (str): The mode of the block generators, generator.RANDOM or generator.BAG.
+        width (int): The number of columns of the boards.
+        height (int): The number of rows of the boards.
+        auto_reset (bool): Whether lost games are reset at the end of the step that lost them.
+    """
+    def __init__(self, num_envs, seed=0, mode=generator.RANDOM, width=bitboard.WIDTH, height=bitboard.HEIGHT,
+                 auto_reset=True):
+        self.num_envs = num_envs
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.auto_reset = auto_reset
+        self.next_seed = seed
+        self.boards = np.zeros((num_envs, height, width), dtype=np.uint8)
+        self.observation = self.boards.view()
+        self.observation.flags.writeable = False
+        self.seeds = np.zeros(num_envs, dtype=np.int64)
+        self.shape = np.zeros(num_envs, dtype=np.int64)
+        self.rotation = np.ones(num_envs, dtype=np.int64)
+        self.x = np.zeros(num_envs, dtype=np.int64)
+        self.y = np.zeros(num_envs, dtype=np.int64)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+        self.down = np.zeros(num_envs, dtype=np.int64)
+        self.lines = np.zeros(num_envs, dtype=np.int64)
+        self.pieces = np.zeros(num_envs, dtype=np.int64)
+        self.ticks = np.zeros(num_envs, dtype=np.int64)
+        self.lost = np.zeros(num_envs, dtype=bool)
+        # The upcoming shapes of every game; stream[i, j] is piece offset[i] + j of game i, counting from 0
+        self.generators = [None] * num_envs
+        self.stream = np.zeros((num_envs, STREAM), dtype=np.int64)
+        self.offset = np.zeros(num_envs, dtype=np.int64)
+        self.spawn_columns = np.array([0] + [tetrominoe.spawn_column(shape, width) for shape in range(1, 8)])
+        self.rows = np.arange(height)
+        self.reset()
+
+    def reset(self, indices=None):
+        """
+        Starts new games, each with the next seed.
+
+        Args:
+            indices (array of int): The games to reset, or None for all of them.
+
+        Returns:
+            numpy.ndarray: The observation.
+        """
+        indices = np.arange(self.num_envs) if indices is None else np.asarray(indices, dtype=np.int64)
+        for i in indices:
+            pieces = generator.PieceGenerator(self.next_seed, self.mode)
+            self.generators[i] = pieces
+            self.seeds[i] = self.next_seed
+            self.stream[i] = pieces.sequence(STREAM)
+            self.next_seed += 1
+        self.boards[indices] = 0
+        for counter in (self.score, self.down, self.lines, self.pieces, self.ticks, self.offset):
+            counter[indices] = 0
+        self.lost[indices] = False
+        self.spawn(indices)
+        return self.observation
+
+    def queue(self):
+        """
+        Returns:
+            numpy.ndarray: The next three shapes of every game, of shape (N, 3).
+        """
+        start = self.pieces - self.offset
+        return np.take_along_axis(self.stream, start[:, None] + np.arange(3), axis=1)
+
+    def fits(self, indices, rotation, x, y):
+        # Check if the blocks of the given games are inside the board and free at the given rotation and position
+        shape = self.shape[indices]
+        r = rotation - 1
+        inside = ((x + LEFT[shape, r] >= 0) & (x + RIGHT[shape, r] < self.width)
+                  & (y + TOP[shape, r] >= 0) & (y + BOTTOM[shape, r] < self.height))
+        result = inside.copy()
+        inside = np.flatnonzero(inside)
+        if len(inside):
+            cells = CELLS[shape[inside], r[inside]]
+            xs = x[inside, None] + cells[..., 0]
+            ys = y[inside, None] + cells[..., 1]
+            result[inside] = ~self.boards[indices[inside, None], ys, xs].any(axis=1)
+        return result
+
+    def move(self, indices, dx, dy):
+        # Move the blocks of the given games by one cell where they are not obstructed
+        rotation = self.rotation[indices]
+        moved = indices[self.fits(indices, rotation, self.x[indices] + dx, self.y[indices] + dy)]
+        self.x[moved] += dx
+        self.y[moved] += dy
+        return moved
+
+    def rotate(self, indices):
+        # Rotate the blocks clockwise with the first kick that is inside the board, where the result is free
+        shape = self.shape[indices]
+        r = self.rotation[indices] - 1
+        kicks = KICKS[shape, r]
+        x = self.x[indices, None] + kicks[..., 0]
+        y = self.y[indices, None] + kicks[..., 1]
+        rotated = r + 1 & 3
+        new_shape = shape[:, None]
+        inside = ((np.arange(kicks.shape[1]) < KICK_COUNT[shape, r][:, None])
+                  & (x + LEFT[new_shape, rotated[:, None]] >= 0)
+                  & (x + RIGHT[new_shape, rotated[:, None]] < self.width)
+                  & (y + TOP[new_shape, rotated[:, None]] >= 0)
+                  & (y + BOTTOM[new_shape, rotated[:, None]] < self.height))
+        # Without a kick inside the board the block stays in place, which then fails the check below
+        first = inside.argmax(axis=1)
+        kicked = inside.any(axis=1)
+        x = np.where(kicked, x[np.arange(len(indices)), first], self.x[indices])
+        y = np.where(kicked, y[np.arange(len(indices)), first], self.y[indices])
+        ok = self.fits(indices, rotated + 1, x, y)
+        indices = indices[ok]
+        self.rotation[indices] = rotated[ok] + 1
+        self.x[indices] = x[ok]
+        self.y[indices] = y[ok]
+
+    def drop_distance(self, indices):
+        # Return how many rows the blocks can fall: the fewest empty rows below any of their cells
+        cells = CELLS[self.shape[indices], self.rotation[indices] - 1]
+        xs = self.x[indices, None] + cells[..., 0]
+        ys = self.y[indices, None] + cells[..., 1]
+        columns = self.boards[indices[:, None], :, xs] != 0
+        below = columns & (self.rows > ys[..., None])
+        first = np.where(below.any(axis=2), below.argmax(axis=2), self.height)
+        return (first - ys - 1).min(axis=1)
+
+    def lock(self, indices):
+        # Land the blocks of the given games, clear their filled rows, score them and spawn the next blocks
+        if not len(indices):
+            return
+        shape = self.shape[indices]
+        cells = CELLS[shape, self.rotation[indices] - 1]
+        xs = self.x[indices, None] + cells[..., 0]
+        ys = self.y[indices, None] + cells[..., 1]
+        self.boards[indices[:, None], ys, xs] = shape[:, None]
+        self.score[indices] += self.down[indices]
+        self.down[indices] = 0
+        filled = (self.boards[indices] != 0).all(axis=2)
+        counts = filled.sum(axis=1)
+        self.score[indices] += LINE_SCORES[counts]
+        self.lines[indices] += counts
+        cleared = counts > 0
+        if cleared.any():
+            games = indices[cleared]
+            # Sort the filled rows to the top, keeping the order of the others, and empty them
+            order = np.argsort(~filled[cleared], axis=1, kind='stable')
+            boards = np.take_along_axis(self.boards[games], order[:, :, None], axis=1)
+            boards[self.rows < counts[cleared][:, None]] = 0
+            self.boards[games] = boards
+        self.spawn(indices)
+
+    def spawn(self, indices):
+        # Bring in the next block of every given game, unless its top row is filled, which loses the game
+        lost = self.boards[indices, 0].any(axis=1)
+        self.lost[indices[lost]] = True
+        indices = indices[~lost]
+        start = self.pieces[indices] - self.offset[indices]
+        for i in indices[start + 4 > STREAM]:
+            # Keep enough of the stream for the block and the queue, drawing more shapes from the generator
+            kept = self.pieces[i] - self.offset[i]
+            self.stream[i, :STREAM - kept] = self.stream[i, kept:]
+            self.stream[i, STREAM - kept:] = self.generators[i].sequence(kept)
+            self.offset[i] += kept
+        shape = self.stream[indices, self.pieces[indices] - self.offset[indices]]
+        self.shape[indices] = shape
+        self.rotation[indices] = 1
+        self.x[indices] = self.spawn_columns[shape]
+        self.y[indices] = 0
+        self.pieces[indices] += 1
+
+    def step(self, actions):
+        """
+        Applies one action to every game, followed by one gravity step.
+
+        Args:
+            actions (array of int): NOOP or one of the actions of game.GameState.step, per game.
+
+        Returns:
+            tuple: The observation, the score gained by every game, whether every game was lost, and a dict of
+                the score, lines and pieces of every lost game, taken before it was reset.
+        """
+        actions = np.asarray(actions)
+        before = self.score.copy()
+        playing = ~self.lost
+        for action, dx, dy in ((game.LEFT, -1, 0), (game.RIGHT, 1, 0), (game.DOWN, 0, 1)):
+            indices = np.flatnonzero(playing & (actions == action))
+            self.move(indices, dx, dy)
+            if action == game.DOWN:
+                self.down[indices] += 1
+        self.rotate(np.flatnonzero(playing & (actions == game.ROTATE)))
+        indices = np.flatnonzero(playing & (actions == game.RELEASE_DOWN))
+        self.down[indices[self.y[indices] < self.height - 3]] = 0
+        indices = np.flatnonzero(playing & (actions == game.HARD_DROP))
+        distance = self.drop_distance(indices)
+        self.y[indices] += distance
+        self.down[indices] += distance
+        self.lock(indices)
+
+        # Gravity
+        indices = np.flatnonzero(~self.lost)
+        self.ticks[indices] += 1
+        landed = np.setdiff1d(indices, self.move(indices, 0, 1), assume_unique=True)
+        self.lock(landed)
+
+        rewards = self.score - before
+        dones = self.lost.copy()
+        info = {'score': self.score[dones], 'lines': self.lines[dones], 'pieces': self.pieces[dones]}
+        if self.auto_reset and dones.any():
+            self.reset(np.flatnonzero(dones))
+        return self.observation, rewards, dones, info
+
+def cross_check(envs=64, steps=2000, seed=0, mode=generator.RANDOM, width=bitboard.WIDTH, height=bitboard.HEIGHT):
+    """
+    Plays random actions on a VectorEnv and on one GameState per game with the same seeds, and compares
+    the boards, blocks, queues, scores and counters after every step.
+
+    Returns:
+        int: The number of steps compared over all games.
+
+    Raises:
+        AssertionError: If a game differs from its GameState.
+    """
+    env = VectorEnv(envs, seed, mode, width, height, auto_reset=False)
+    states = [game.GameState(seed + i, mode=mode, width=width, height=height) for i in range(envs)]
+    rng = np.random.default_rng(seed)
+    compared = 0
+    for step in range(steps):
+        actions = rng.integers(0, game.HARD_DROP + 1, envs)
+        # Hard drops end a block at once, so keep them rare enough for the other actions to matter
+        actions[(actions == game.HARD_DROP) & (rng.random(envs) < 0.8)] = NOOP
+        env.step(actions)
+        queue = env.queue()
+        for i, state in enumerate(states):
+            if state.lost:
+                continue
+            if actions[i] != NOOP:
+                state.step(int(actions[i]))
+            state.tick()
+            block = state.block
+            expected = (state.score, state.lines, state.pieces, state.ticks, state.lost,
+                        block.shape, block.rotation, block.position[0], block.position[1],
+                        [block.shape for block in state.block_queue])
+            actual = (env.score[i], env.lines[i], env.pieces[i], env.ticks[i], env.lost[i],
+                      env.shape[i], env.rotation[i], env.x[i], env.y[i], queue[i].tolist())
+            assert expected == actual, f'game {i} differs at step {step}: {actual} instead of {expected}'
+            assert (env.boards[i] == np.array(state.board.colors)).all(), f'board {i} differs at step {step}'
+            compared += 1
+        if all(state.lost for state in states):
+            break
+    return compared
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Step many Tetris games in lockstep with random actions.')
+    parser.add_argument('--envs', type=int, default=1024, help='number of games')
+    parser.add_argument('--steps', type=int, default=1000, help='steps to run')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--mode', choices=(generator.RANDOM, generator.BAG), default=generator.RANDOM,
+                        help='block generator mode')
+    parser.add_argument('--width', type=int, default=bitboard.WIDTH, help='columns of the boards')
+    parser.add_argument('--height', type=int, default=bitboard.HEIGHT, help='rows of the boards')
+    parser.add_argument('--check', action='store_true', help='compare the games with the scalar engine instead')
+    args = parser.parse_args(argv)
+    if args.check:
+        compared = cross_check(min(args.envs, 64), args.steps, args.seed, args.mode, args.width, args.height)
+        print(f'{compared} game steps match the scalar engine')
+        return
+    env = VectorEnv(args.envs, args.seed, args.mode, args.width, args.height)
+    rng = np.random.default_rng(args.seed)
+    actions = rng.integers(0, game.ROTATE + 1, (args.steps, args.envs))
+    games = 0
+    start = time.perf_counter()
+    for step in range(args.steps):
+        games += env.step(actions[step])[2].sum()
+    elapsed = time.perf_counter() - start
+    print(f'{args.envs * args.steps / elapsed:.0f} game steps/s, {games} games ended in {elapsed:.2f} s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Zobrist Hashing
+This module gives every cell of the board and every state of a tetrominoe a fixed random 64-bit key. The hash of a
+board is the XOR of the keys of its filled cells, so placing a tetrominoe only XORs in the keys of its four cells,
+and removing rows only has to rehash the rows that moved. Boards with equal hashes are, barring a collision with a
+chance of about one in 2**64, the same board, which lets search code cache positions by a single integer.
+Keys are derived from the cell coordinates with the splitmix64 mixer rather than drawn from a random stream, so they
+are the same in every process and for any board size.
+Functions:
+    - row_hash(y, mask): The hash of the filled cells of one row.
+    - board_hash(rows): The hash of a whole board given its row masks.
+    - piece_key(shape, rotation, x, y): The key of a tetrominoe state.
+Classes:
+    - TranspositionTable: A bounded least recently used cache keyed by hash.
+"""
+import collections
+
+MASK64 = (1 << 64) - 1
+CHUNK = 8
+CHUNK_MASK = (1 << CHUNK) - 1
+
+def splitmix64(value):
+    # Mix an integer into a well distributed 64-bit key
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+def cell_key(x, y):
+    return splitmix64(y << 20 | x)
+
+# Per row, tables of the XOR of the cell keys of every CHUNK-bit slice of a row mask, built on first use
+tables = {}
+
+def row_tables(y, chunks):
+    # Return the chunk tables of a row, covering at least the given number of chunks
+    row = tables.setdefault(y, [])
+    while len(row) < chunks:
+        first = len(row) * CHUNK
+        table = [0] * (1 << CHUNK)
+        for bits in range(1, 1 << CHUNK):
+            low = (bits & -bits).bit_length() - 1
+            table[bits] = table[bits & (bits - 1)] ^ cell_key(first + low, y)
+        row.append(table)
+    return row
+
+def row_hash(y, mask):
+    """
+    Args:
+        y (int): The index of the row.
+        mask (int): The mask of the filled cells of the row.
+
+    Returns:
+        int: The XOR of the keys of the filled cells.
+    """
+    row = tables.get(y)
+    if row is None or mask >> (len(row) * CHUNK):
+        row = row_tables(y, (mask.bit_length() + CHUNK - 1) // CHUNK)
+    value = 0
+    i = 0
+    while mask:
+        value ^= row[i][mask & CHUNK_MASK]
+        mask >>= CHUNK
+        i += 1
+    return value
+
+def board_hash(rows, start=0):
+    """
+    Args:
+        rows (sequence of int): The row masks of a board.
+        start (int): The index of the first row that may be filled; the rows above it are skipped.
+
+    Returns:
+        int: The hash of the board.
+    """
+    value = 0
+    for y in range(start, len(rows)):
+        mask = rows[y]
+        if mask:
+            value ^= row_hash(y, mask)
+    return value
+
+def piece_key(shape, rotation, x, y):
+    """
+    Returns:
+        int: The key of a tetrominoe of the given shape, rotation and position, to be XORed with a board hash.
+    """
+    return splitmix64(1 << 62 | shape << 40 | rotation << 32 | (x & 0xFFFF) << 16 | (y & 0xFFFF))
+
+class TranspositionTable:
+    """
+    A cache of positions keyed by their hash, dropping the least recently used entry once it is full.
+
+    Args:
+        capacity (int): The number of entries kept.
+    """
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entries = self.entries
+        value = entries.get(key, self)
+        if value is self:
+            self.misses += 1
+            return default
+        entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        entries = self.entries
+        entries[key] = value
+        entries.move_to_end(key)
+        if len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries